@@ -0,0 +1,196 @@
+"""Alert rules and their evaluation against batches of price snapshots.
+
+A rule watches one book, every book in a watchlist, or (with neither set)
+the whole catalog:
+
+    price_change      price moved by more than `threshold` dollars
+    price_change_pct  price moved by more than `threshold` percent
+    price_below       price dropped below `threshold` (fires on the crossing)
+    rating_change     rating moved by `threshold` stars or more
+    reviews_spike     review count grew by more than `threshold` in one snapshot
+
+evaluate_alerts() loads a batch of changes into a temp table and checks
+it against every rule in one query. Each change becomes a threshold range
+per rule type, looked up on the (scope, rule_type, threshold) indexes, so
+the cost follows the number of changes and the scopes covering them, not
+rules x updates. A book covered by several rules that produce the same
+message gets one notification.
+"""
+
+RULE_TYPES = ['price_change', 'price_change_pct', 'price_below', 'rating_change', 'reviews_spike']
+
+# Catalog-wide rules created with the table; they match the thresholds
+# update_price used before rules existed (a price move of more than $0.50,
+# a rating move of 0.3 stars or more).
+DEFAULT_RULES = [
+    ('price_change', 0.5),
+    ('rating_change', 0.3),
+]
+
+# Deltas are rounded before comparing, so a 4.2 -> 4.5 rating counts as 0.3.
+DELTA_PRECISION = 6
+
+def alert_rules_statements():
+    """Statements that create alert_rules, its indexes and the default rules"""
+    types = ', '.join(f"'{rule_type}'" for rule_type in RULE_TYPES)
+    return [
+        f'''CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            watchlist_id INTEGER,
+            rule_type TEXT NOT NULL CHECK (rule_type IN ({types})),
+            threshold REAL NOT NULL CHECK (threshold >= 0),
+            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (book_id IS NULL OR watchlist_id IS NULL)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_alert_rules_book ON alert_rules (book_id, rule_type, threshold)',
+        'CREATE INDEX IF NOT EXISTS idx_alert_rules_watchlist ON alert_rules (watchlist_id, rule_type, threshold)',
+        '''CREATE INDEX IF NOT EXISTS idx_alert_rules_catalog ON alert_rules (rule_type, threshold)
+        WHERE book_id IS NULL AND watchlist_id IS NULL''',
+        # Finds the watchlists containing a changed book.
+        'CREATE INDEX IF NOT EXISTS idx_watchlist_books_book ON watchlist_books (book_id)',
+        '''CREATE TRIGGER IF NOT EXISTS books_delete_alert_rules AFTER DELETE ON books
+        BEGIN
+            DELETE FROM alert_rules WHERE book_id = OLD.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS watchlists_delete_alert_rules AFTER DELETE ON watchlists
+        BEGIN
+            DELETE FROM alert_rules WHERE watchlist_id = OLD.id;
+        END''',
+        *(f"INSERT INTO alert_rules (rule_type, threshold) VALUES ('{rule_type}', {threshold})"
+          for rule_type, threshold in DEFAULT_RULES),
+    ]
+
+def validate_rule(data):
+    """(rule_type, threshold, book_id, watchlist_id) from a request body; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    rule_type = data.get('rule_type')
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"rule_type must be one of: {', '.join(RULE_TYPES)}")
+    threshold = data.get('threshold')
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or threshold < 0:
+        raise ValueError('threshold must be a non-negative number')
+    if rule_type == 'price_below' and threshold == 0:
+        raise ValueError('price_below needs a threshold above 0')
+    book_id = data.get('book_id')
+    watchlist_id = data.get('watchlist_id')
+    for name, value in (('book_id', book_id), ('watchlist_id', watchlist_id)):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f'{name} must be an integer')
+    if book_id is not None and watchlist_id is not None:
+        raise ValueError('A rule applies to a book or a watchlist, not both')
+    return rule_type, float(threshold), book_id, watchlist_id
+
+CHANGES_TABLE = '''
+    CREATE TEMP TABLE IF NOT EXISTS alert_changes (
+        seq INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        old_price REAL, new_price REAL,
+        old_rating REAL, new_rating REAL,
+        old_reviews INTEGER, new_reviews INTEGER
+    )
+'''
+
+# One row per change and rule type it could trigger: a rule of that type
+# fires when above < threshold <= upto, and a change rule other than
+# rating_change only when its threshold is below the delta. That turns rule matching into range seeks
+# on the (scope, rule_type, threshold) indexes, so rules that don't fire
+# are never read.
+CANDIDATES_TABLE = '''
+    CREATE TEMP TABLE IF NOT EXISTS alert_candidates (
+        seq INTEGER NOT NULL,
+        book_id INTEGER NOT NULL,
+        rule_type TEXT NOT NULL,
+        above REAL NOT NULL,
+        upto REAL NOT NULL
+    )
+'''
+
+CANDIDATES_SQL = f'''
+    INSERT INTO temp.alert_candidates (seq, book_id, rule_type, above, upto)
+    SELECT seq, book_id, 'price_change', -1, round(abs(new_price - old_price), {DELTA_PRECISION})
+    FROM temp.alert_changes WHERE old_price <> 0 AND new_price <> 0
+    UNION ALL
+    SELECT seq, book_id, 'price_change_pct', -1,
+           round(abs(new_price - old_price) * 100.0 / old_price, {DELTA_PRECISION})
+    FROM temp.alert_changes WHERE old_price > 0 AND new_price IS NOT NULL
+    UNION ALL
+    SELECT seq, book_id, 'price_below', new_price, coalesce(old_price, 9e999)
+    FROM temp.alert_changes WHERE new_price IS NOT NULL
+    UNION ALL
+    SELECT seq, book_id, 'rating_change', -1, round(abs(new_rating - old_rating), {DELTA_PRECISION})
+    FROM temp.alert_changes WHERE old_rating <> 0 AND new_rating <> 0
+    UNION ALL
+    SELECT seq, book_id, 'reviews_spike', -1, new_reviews - old_reviews
+    FROM temp.alert_changes WHERE new_reviews > old_reviews
+'''
+
+# The rules that can apply to candidate c, one entry per scope. CROSS JOIN
+# keeps SQLite from reordering the joins: temp tables have no statistics,
+# and starting from the rules would visit every one of them. Catalog-wide
+# rules get the partial index by name; otherwise the planner walks the
+# watchlist_id IS NULL range, i.e. every per-book rule.
+RULE_SCOPES = [
+    'alert_rules r WHERE r.book_id = c.book_id',
+    '''watchlist_books wb CROSS JOIN alert_rules r
+       WHERE wb.book_id = c.book_id AND r.watchlist_id = wb.watchlist_id''',
+    '''alert_rules r INDEXED BY idx_alert_rules_catalog
+       WHERE r.book_id IS NULL AND r.watchlist_id IS NULL''',
+]
+RULE_MATCHES = '''r.rule_type = c.rule_type AND r.threshold > c.above AND r.threshold <= c.upto
+    AND (r.threshold < c.upto OR c.rule_type IN ('price_below', 'rating_change'))'''
+
+# Rules of the same type produce the same message, so one matching rule is
+# enough (an EXISTS seek); price targets each get their own message.
+ANY_RULE_MATCHES = ' OR '.join(f'EXISTS (SELECT 1 FROM {scope} AND {RULE_MATCHES})'
+                               for scope in RULE_SCOPES)
+MATCHING_PRICE_TARGETS = ' UNION '.join(f'''
+        SELECT c.seq, c.rule_type, r.threshold
+        FROM temp.alert_candidates c CROSS JOIN {scope}
+          AND c.rule_type = 'price_below' AND {RULE_MATCHES}''' for scope in RULE_SCOPES)
+
+EVALUATE_SQL = f'''
+    WITH fired AS (
+        SELECT c.seq, c.rule_type, NULL AS target
+        FROM temp.alert_candidates c
+        WHERE c.rule_type <> 'price_below' AND ({ANY_RULE_MATCHES})
+        UNION {MATCHING_PRICE_TARGETS}
+    )
+    SELECT f.seq, a.book_id, f.rule_type,
+        CASE f.rule_type
+            WHEN 'price_change' THEN printf('Price %s: $%.2f → $%.2f',
+                IIF(a.new_price > a.old_price, 'increase', 'decrease'), a.old_price, a.new_price)
+            WHEN 'price_change_pct' THEN printf('Price %s %.1f%%: $%.2f → $%.2f',
+                IIF(a.new_price > a.old_price, 'up', 'down'),
+                abs(a.new_price - a.old_price) * 100.0 / a.old_price, a.old_price, a.new_price)
+            WHEN 'price_below' THEN printf('Price below $%.2f target: $%.2f', f.target, a.new_price)
+            WHEN 'rating_change' THEN printf('Rating %s: %.1f → %.1f',
+                IIF(a.new_rating > a.old_rating, 'increased', 'decreased'), a.old_rating, a.new_rating)
+            WHEN 'reviews_spike' THEN printf('Reviews up by %d: %d → %d',
+                a.new_reviews - a.old_reviews, a.old_reviews, a.new_reviews)
+        END AS message
+    FROM fired f
+    JOIN temp.alert_changes a ON a.seq = f.seq
+    ORDER BY f.seq, f.rule_type, f.target DESC
+'''
+
+def evaluate_alerts(cursor, changes):
+    """Notification rows (seq, book_id, notification_type, message) for a batch of changes.
+
+    `changes` holds (seq, book_id, old_price, new_price, old_rating,
+    new_rating, old_reviews, new_reviews) tuples; seq identifies the
+    change in the caller's batch and must be unique within it. Runs on the
+    caller's transaction and doesn't write to notifications.
+    """
+    if not changes:
+        return []
+    cursor.execute(CHANGES_TABLE)
+    cursor.execute(CANDIDATES_TABLE)
+    try:
+        cursor.executemany('INSERT INTO temp.alert_changes VALUES (?, ?, ?, ?, ?, ?, ?, ?)', changes)
+        cursor.execute(CANDIDATES_SQL)
+        return [tuple(row) for row in cursor.execute(EVALUATE_SQL)]
+    finally:
+        cursor.execute('DELETE FROM temp.alert_changes')
+        cursor.execute('DELETE FROM temp.alert_candidates')
@@ -1,31 +1,40 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Blueprint, Flask, Response, current_app, render_template, request, jsonify, send_file, url_for
 import sqlite3
-from datetime import datetime, timedelta
-import requests
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from datetime import datetime, timedelta, timezone
 import io
 import json
 import os
-from database import init_db, get_db_connection
-import numpy as np
-from sklearn.linear_model import LinearRegression
+import base64
+import zlib
+import database
+from database import init_db, init_app, get_db, get_catalog_version
+from price_updates import apply_price_updates
+from catalog_import import ImportFormatError, import_books, read_rows, open_text, detect_format
+from category_stats import update_book_stats, competitor_stats, primary_category
+from exports import export_query, iter_csv, encode_stream
+from reports import get_books_report, report_cache_stats
+from export_jobs import ExportError, submit_export, get_export, get_export_file
+from price_rollups import RESOLUTIONS, DEFAULT_POINTS, MAX_POINTS, parse_range, fetch_points, choose_resolution, lttb
+from alerts import validate_rule
+from book_search import match_query, search_books
+from dashboard import dashboard_stats, dashboard_data, recent_notifications
+from watchlist_analytics import watchlist_analytics
+from watchlist_membership import parse_book_ids, add_books, remove_books, move_books, book_watchlists
+from events import subscribe, stream, notify_changes
+from google_books import search_volumes, search_cache_stats
+from http_client import outbound_stats
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', os.urandom(24).hex())
+# pandas/numpy (pricing, forecasting), reportlab (report_pdf) and requests
+# (http_client) are only imported by the code paths that use them, so a
+# worker doesn't load them until the first request that needs them.
 
-init_db()
+bp = Blueprint('kdp', __name__)
 
-GOOGLE_BOOKS_API = "https://www.googleapis.com/books/v1/volumes"
-
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/search-book', methods=['POST'])
+@bp.route('/api/search-book', methods=['POST'])
 def search_book():
     data = request.json
     query = data.get('query', '')
@@ -34,51 +43,13 @@ def search_book():
         return jsonify({'error': 'Query is required'}), 400
     
     try:
-        params = {'q': query, 'maxResults': 10}
-        response = requests.get(GOOGLE_BOOKS_API, params=params, timeout=10)
-        response.raise_for_status()
-        
-        books_data = response.json()
-        results = []
-        
-        if 'items' in books_data:
-            for item in books_data['items']:
-                volume_info = item.get('volumeInfo', {})
-                sale_info = item.get('saleInfo', {})
-                
-                isbn = None
-                if 'industryIdentifiers' in volume_info:
-                    for identifier in volume_info['industryIdentifiers']:
-                        if identifier['type'] in ['ISBN_13', 'ISBN_10']:
-                            isbn = identifier['identifier']
-                            break
-                
-                price = None
-                if sale_info.get('saleability') == 'FOR_SALE':
-                    price = sale_info.get('listPrice', {}).get('amount')
-                
-                book = {
-                    'isbn': isbn or item.get('id'),
-                    'title': volume_info.get('title', 'Unknown Title'),
-                    'author': ', '.join(volume_info.get('authors', ['Unknown Author'])),
-                    'price': price,
-                    'rating': volume_info.get('averageRating'),
-                    'reviews_count': volume_info.get('ratingsCount'),
-                    'page_count': volume_info.get('pageCount'),
-                    'category': ', '.join(volume_info.get('categories', [])),
-                    'publisher': volume_info.get('publisher'),
-                    'published_date': volume_info.get('publishedDate'),
-                    'description': volume_info.get('description', ''),
-                    'thumbnail_url': volume_info.get('imageLinks', {}).get('thumbnail')
-                }
-                results.append(book)
-        
+        results = search_volumes(query, get_db())
         return jsonify({'books': results})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/add-book', methods=['POST'])
+@bp.route('/api/add-book', methods=['POST'])
 def add_book():
     data = request.json
     
@@ -87,7 +58,7 @@ def add_book():
         if not data.get(field):
             return jsonify({'error': f'{field} is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     try:
@@ -112,6 +83,13 @@ def add_book():
         
         book_id = cursor.lastrowid
         
+        update_book_stats(conn, book_id, None, {
+            'current_price': data.get('price'),
+            'rating': data.get('rating'),
+            'page_count': data.get('page_count'),
+            'category': data.get('category')
+        })
+        
         if data.get('price') is not None:
             cursor.execute('''
                 INSERT INTO price_history (book_id, price, rating, reviews_count)
@@ -119,38 +97,170 @@ def add_book():
             ''', (book_id, data.get('price'), data.get('rating'), data.get('reviews_count')))
         
         conn.commit()
+        notify_changes(conn)
         return jsonify({'success': True, 'book_id': book_id})
     
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Book already exists'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
 
-@app.route('/api/books', methods=['GET'])
+BOOK_FIELDS = ['id', 'isbn', 'title', 'author', 'current_price', 'rating', 'reviews_count',
+               'page_count', 'category', 'publisher', 'published_date', 'description',
+               'thumbnail_url', 'added_date', 'last_updated']
+MAX_PAGE_SIZE = 500
+DEFAULT_SEARCH_LIMIT = 50
+
+def encode_cursor(sort_key, book_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_key, book_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    sort_key, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return sort_key, int(book_id)
+
+def parse_fields(fields):
+    """Columns for a ?fields= projection (always including id); raises ValueError on unknown ones"""
+    if not fields:
+        return BOOK_FIELDS
+    columns = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [c for c in columns if c not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    return columns
+
+def finish_page(books, limit):
+    """(books, next_cursor) from newest-first rows fetched with limit + 1 and an `_added_date` key"""
+    next_cursor = None
+    if limit and len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(books[-1]['_added_date'], books[-1]['id'])
+    for book in books:
+        del book['_added_date']
+    return books, next_cursor
+
+def parse_timestamp(value):
+    # SQLite CURRENT_TIMESTAMP values are UTC
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/api/books', methods=['GET'])
 def get_books():
-    conn = get_db_connection()
+    try:
+        columns = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM books ORDER BY added_date DESC')
-    books = [dict(row) for row in cursor.fetchall()]
+    # Any write to books bumps the catalog version, so an unchanged catalog
+    # is answered with 304 before a single book row is read.
+    version, last_updated = get_catalog_version(conn)
+    etag = f'books-{version}-{zlib.crc32(request.query_string):08x}'
+    last_modified = parse_timestamp(last_updated)
+    if is_not_modified(etag, last_modified):
+        return with_validators(Response(status=304), etag, last_modified)
+    
+    sql = f'SELECT {", ".join(columns)}, added_date AS _added_date FROM books'
+    params = []
+    if after:
+        sql += ' WHERE (added_date, id) < (?, ?)'
+        params.extend(after)
+    sql += ' ORDER BY added_date DESC, id DESC'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+    
+    cursor.execute(sql, params)
+    books, next_cursor = finish_page([dict(row) for row in cursor.fetchall()], limit)
+    
+    response = jsonify({'books': books, 'next_cursor': next_cursor})
+    return with_validators(response, etag, last_modified)
+
+@bp.route('/api/books/search', methods=['GET'])
+def search_catalog():
+    query = match_query(request.args.get('q', ''))
+    if not query:
+        return jsonify({'error': 'q must contain at least one word'}), 400
     
-    conn.close()
-    return jsonify({'books': books})
+    try:
+        columns = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    conn = get_db()
+    version, last_updated = get_catalog_version(conn)
+    etag = f'search-{version}-{zlib.crc32(request.query_string):08x}'
+    last_modified = parse_timestamp(last_updated)
+    if is_not_modified(etag, last_modified):
+        return with_validators(Response(status=304), etag, last_modified)
+    
+    books = search_books(conn, query, columns, limit + 1, after)
+    
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(books[-1]['_rank'], books[-1]['id'])
+    for book in books:
+        del book['_rank']
+    
+    response = jsonify({'books': books, 'next_cursor': next_cursor})
+    return with_validators(response, etag, last_modified)
 
-@app.route('/api/book/<int:book_id>', methods=['GET'])
+@bp.route('/api/book/<int:book_id>', methods=['GET'])
 def get_book(book_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
     book = cursor.fetchone()
     
     if not book:
-        conn.close()
         return jsonify({'error': 'Book not found'}), 404
     
+    # Charts use /api/book/<id>/history; history=0 skips the raw snapshots.
+    if request.args.get('history') == '0':
+        return jsonify({'book': dict(book)})
+    
     cursor.execute('''
         SELECT * FROM price_history 
         WHERE book_id = ? 
@@ -158,82 +268,164 @@ def get_book(book_id):
     ''', (book_id,))
     history = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
     return jsonify({'book': dict(book), 'history': history})
 
-@app.route('/api/book/<int:book_id>', methods=['DELETE'])
+@bp.route('/api/book/<int:book_id>/history', methods=['GET'])
+def get_book_history(book_id):
+    resolution = request.args.get('resolution', 'auto')
+    if resolution not in ('auto', 'raw', *RESOLUTIONS):
+        return jsonify({'error': f'Unknown resolution: {resolution}'}), 400
+    
+    try:
+        points = min(max(int(request.args.get('points', DEFAULT_POINTS)), 3), MAX_POINTS)
+        start, end = parse_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'points must be a number and from/to dates YYYY-MM-DD'}), 400
+    
+    conn = get_db()
+    if not conn.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone():
+        return jsonify({'error': 'Book not found'}), 404
+    
+    if resolution == 'auto':
+        resolution = choose_resolution(conn, book_id, points, start, end)
+    history = fetch_points(conn, book_id, resolution, start, end)
+    total = len(history)
+    if total > points:
+        history = lttb(history, points)
+    
+    return jsonify({
+        'book_id': book_id,
+        'resolution': resolution,
+        'total': total,
+        'downsampled': total > points,
+        'history': history
+    })
+
+@bp.route('/api/book/<int:book_id>', methods=['DELETE'])
 def delete_book(book_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
+    cursor.execute('SELECT current_price, rating, page_count, category FROM books WHERE id = ?', (book_id,))
+    book = cursor.fetchone()
+    
     cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
+    if book:
+        update_book_stats(conn, book_id, book, None)
     conn.commit()
-    conn.close()
+    notify_changes(conn)
     
     return jsonify({'success': True})
 
-@app.route('/api/update-price/<int:book_id>', methods=['POST'])
+@bp.route('/api/update-price/<int:book_id>', methods=['POST'])
 def update_price(book_id):
-    data = request.json
-    new_price = data.get('price')
-    new_rating = data.get('rating')
-    new_reviews = data.get('reviews_count')
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT current_price, rating FROM books WHERE id = ?', (book_id,))
-    book = cursor.fetchone()
-    
-    if not book:
-        conn.close()
-        return jsonify({'error': 'Book not found'}), 404
-    
-    old_price = book['current_price']
-    old_rating = book['rating']
-    
-    cursor.execute('''
-        UPDATE books 
-        SET current_price = ?, rating = ?, reviews_count = ?, last_updated = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (new_price, new_rating, new_reviews, book_id))
-    
-    cursor.execute('''
-        INSERT INTO price_history (book_id, price, rating, reviews_count)
-        VALUES (?, ?, ?, ?)
-    ''', (book_id, new_price, new_rating, new_reviews))
-    
-    if old_price and new_price and abs(old_price - new_price) > 0.5:
-        change_type = 'increase' if new_price > old_price else 'decrease'
-        message = f"Price {change_type}: ${old_price:.2f} → ${new_price:.2f}"
-        cursor.execute('''
-            INSERT INTO notifications (book_id, message, notification_type)
-            VALUES (?, ?, ?)
-        ''', (book_id, message, 'price_change'))
-    
-    if old_rating and new_rating and abs(old_rating - new_rating) >= 0.3:
-        change_type = 'increased' if new_rating > old_rating else 'decreased'
-        message = f"Rating {change_type}: {old_rating:.1f} → {new_rating:.1f}"
-        cursor.execute('''
-            INSERT INTO notifications (book_id, message, notification_type)
-            VALUES (?, ?, ?)
-        ''', (book_id, message, 'rating_change'))
-    
-    conn.commit()
-    conn.close()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    conn = get_db()
+    result = apply_price_updates(conn, [{
+        'book_id': book_id,
+        'price': data.get('price'),
+        'rating': data.get('rating'),
+        'reviews_count': data.get('reviews_count')
+    }])[0]
+    
+    if 'error' in result:
+        return jsonify({'error': result['error']}), 404 if result['error'] == 'Book not found' else 400
+    notify_changes(conn)
     
     return jsonify({'success': True})
 
-@app.route('/api/pricing-suggestion/<int:book_id>', methods=['GET'])
+@bp.route('/api/update-prices', methods=['POST'])
+def update_prices():
+    if request.mimetype == 'application/x-ndjson':
+        try:
+            updates = [json.loads(line) for line in request.stream if line.strip()]
+        except ValueError as e:
+            return jsonify({'error': f'Invalid NDJSON: {e}'}), 400
+    else:
+        updates = request.get_json(silent=True)
+    
+    if not isinstance(updates, list):
+        return jsonify({'error': 'Expected a JSON array or NDJSON stream of updates'}), 400
+    
+    conn = get_db()
+    results = apply_price_updates(conn, updates)
+    updated = sum(1 for r in results if r.get('success'))
+    notify_changes(conn)
+    
+    return jsonify({
+        'updated': updated,
+        'failed': len(results) - updated,
+        'results': results
+    })
+
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+@bp.route('/api/import', methods=['POST'])
+def import_catalog():
+    # Either a multipart upload in `file` or the file as the request body,
+    # which is parsed as it arrives.
+    upload = request.files.get('file')
+    name = upload.filename if upload else None
+    fmt = (request.args.get('format') or detect_format(name)
+           or IMPORT_CONTENT_TYPES.get(upload.mimetype if upload else request.mimetype))
+    if fmt is None:
+        return jsonify({'error': 'Pass format=csv or format=ndjson'}), 400
+    compressed = (request.args.get('gzip', 'false').lower() in ('1', 'true')
+                  or (name or '').lower().endswith('.gz'))
+    
+    conn = get_db()
+    try:
+        text = open_text(upload.stream if upload else request.stream, compressed)
+        report = import_books(conn, read_rows(text, fmt))
+    except ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except (UnicodeDecodeError, OSError, EOFError) as e:
+        # Chunks before the unreadable part are already imported.
+        return jsonify({'error': f'Could not read the upload: {e}'}), 400
+    notify_changes(conn)
+    
+    return jsonify(report)
+
+@bp.route('/api/enrich', methods=['POST'])
+def enrich_isbns():
+    # Looked up in the background by this worker; poll GET /api/enrich.
+    # enrich pulls in requests, which workers otherwise load on first use.
+    from enrich import enqueue_isbns, enrichment_status, start_enrichment
+    data = request.get_json(silent=True) or {}
+    isbns = data.get('isbns')
+    if not isinstance(isbns, list) or not isbns:
+        return jsonify({'error': 'isbns must be a non-empty list'}), 400
+    
+    conn = get_db()
+    result = enqueue_isbns(conn, isbns)
+    start_enrichment(database=current_app.config['DATABASE'])
+    result.update(enrichment_status(conn), running=True)
+    
+    return jsonify(result), 202
+
+@bp.route('/api/enrich', methods=['GET'])
+def get_enrichment():
+    from enrich import enrichment_status, enrichment_running
+    status = enrichment_status(get_db())
+    status['running'] = enrichment_running() or status['counts']['claimed'] > 0
+    return jsonify(status)
+
+@bp.route('/api/pricing-suggestion/<int:book_id>', methods=['GET'])
 def get_pricing_suggestion(book_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
     book = cursor.fetchone()
     
     if not book:
-        conn.close()
         return jsonify({'error': 'Book not found'}), 404
     
     book_dict = dict(book)
@@ -241,17 +433,11 @@ def get_pricing_suggestion(book_id):
     page_count = book_dict.get('page_count', 0)
     rating = book_dict.get('rating', 0)
     
-    cursor.execute('''
-        SELECT current_price, rating, page_count, 
-               (julianday('now') - julianday(published_date)) as days_since_pub
-        FROM books 
-        WHERE category LIKE ? AND current_price IS NOT NULL AND id != ?
-    ''', (f'%{category.split(",")[0] if category else ""}%', book_id))
+    # Competitors are the other priced books sharing the first category,
+    # read from the precomputed aggregates rather than scanned.
+    competitors = competitor_stats(conn, primary_category(category), book_dict)
     
-    competitors = cursor.fetchall()
-    conn.close()
-    
-    if not competitors:
+    if not competitors['book_count']:
         base_price = 2.99
         if page_count > 300:
             base_price = 4.99
@@ -270,12 +456,9 @@ def get_pricing_suggestion(book_id):
             }
         })
     
-    prices = [c['current_price'] for c in competitors if c['current_price']]
-    ratings = [c['rating'] for c in competitors if c['rating']]
-    page_counts = [c['page_count'] for c in competitors if c['page_count']]
-    
-    avg_price = np.mean(prices) if prices else 2.99
-    avg_rating = np.mean(ratings) if ratings else 4.0
+    has_ratings = competitors['rating_count'] > 0
+    avg_price = competitors['price_sum'] / competitors['price_count']
+    avg_rating = competitors['rating_sum'] / competitors['rating_count'] if has_ratings else 4.0
     
     suggested_price = avg_price
     
@@ -285,8 +468,8 @@ def get_pricing_suggestion(book_id):
         elif rating < avg_rating - 0.5:
             suggested_price *= 0.90
     
-    if page_count and page_counts:
-        avg_pages = np.mean(page_counts)
+    if page_count and competitors['pages_count']:
+        avg_pages = competitors['pages_sum'] / competitors['pages_count']
         if page_count > avg_pages * 1.3:
             suggested_price *= 1.1
         elif page_count < avg_pages * 0.7:
@@ -299,15 +482,98 @@ def get_pricing_suggestion(book_id):
         'min_price': round(suggested_price * 0.85, 2),
         'max_price': round(suggested_price * 1.15, 2),
         'analysis': {
-            'competitor_count': len(competitors),
+            'competitor_count': competitors['book_count'],
             'avg_competitor_price': round(avg_price, 2),
-            'avg_competitor_rating': round(avg_rating, 2) if ratings else None,
-            'price_range': f"${min(prices):.2f} - ${max(prices):.2f}",
+            'avg_competitor_rating': round(avg_rating, 2) if has_ratings else None,
+            'price_range': f"${competitors['price_min']:.2f} - ${competitors['price_max']:.2f}",
             'reasoning': 'Based on competitor analysis in same category'
         }
     })
 
-@app.route('/api/profit-calculator', methods=['POST'])
+@bp.route('/api/pricing-suggestions', methods=['GET'])
+def get_pricing_suggestions():
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), MAX_PAGE_SIZE)
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT * FROM pricing_suggestions
+        WHERE book_id > ?
+        ORDER BY book_id
+        LIMIT ?
+    ''', (after_id, limit))
+    suggestions = [dict(row) for row in cursor.fetchall()]
+    
+    next_after_id = suggestions[-1]['book_id'] if len(suggestions) == limit else None
+    return jsonify({'suggestions': suggestions, 'next_after_id': next_after_id})
+
+@bp.route('/api/pricing-suggestions', methods=['POST'])
+def recompute_pricing_suggestions():
+    from pricing import reprice_catalog
+    conn = get_db()
+    report = reprice_catalog(conn)
+    return jsonify({'success': True, **report})
+
+@bp.route('/api/book/<int:book_id>/forecast', methods=['GET'])
+def get_book_forecast(book_id):
+    from forecasting import MAX_HORIZON_DAYS, get_trend, forecast
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_HORIZON_DAYS)
+    
+    conn = get_db()
+    if not conn.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone():
+        return jsonify({'error': 'Book not found'}), 404
+    
+    trend = get_trend(conn, book_id)
+    if not trend:
+        return jsonify({'book_id': book_id, 'trend': None, 'forecast': []})
+    
+    return jsonify({'book_id': book_id, 'trend': trend, 'forecast': forecast(trend, days)})
+
+@bp.route('/api/forecasts', methods=['GET'])
+def get_forecasts():
+    from forecasting import MAX_HORIZON_DAYS, project
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_HORIZON_DAYS)
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), MAX_PAGE_SIZE)
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT t.*, b.current_price, b.rating
+        FROM price_trends t
+        JOIN books b ON b.id = t.book_id
+        WHERE t.book_id > ?
+        ORDER BY t.book_id
+        LIMIT ?
+    ''', (after_id, limit))
+    forecasts = []
+    for row in cursor.fetchall():
+        price, rating = project(row, days)
+        forecasts.append({
+            'book_id': row['book_id'],
+            'current_price': row['current_price'],
+            'current_rating': row['rating'],
+            'forecast_price': price,
+            'forecast_rating': rating,
+            'price_slope': row['price_slope'],
+            'rating_slope': row['rating_slope'],
+            'samples': row['samples']
+        })
+    
+    next_after_id = forecasts[-1]['book_id'] if len(forecasts) == limit else None
+    return jsonify({'days': days, 'forecasts': forecasts, 'next_after_id': next_after_id})
+
+@bp.route('/api/forecasts', methods=['POST'])
+def refit_forecasts():
+    from forecasting import fit_trends
+    conn = get_db()
+    report = fit_trends(conn, refit=request.args.get('all', 'false').lower() in ('1', 'true'))
+    return jsonify({'success': True, **report})
+
+@bp.route('/api/profit-calculator', methods=['POST'])
 def calculate_profit():
     data = request.json
     price = data.get('price', 0)
@@ -383,9 +649,9 @@ def calculate_profit():
             }
         })
 
-@app.route('/api/watchlists', methods=['GET'])
+@bp.route('/api/watchlists', methods=['GET'])
 def get_watchlists():
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -397,11 +663,10 @@ def get_watchlists():
     ''')
     
     watchlists = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     return jsonify({'watchlists': watchlists})
 
-@app.route('/api/watchlist', methods=['POST'])
+@bp.route('/api/watchlist', methods=['POST'])
 def create_watchlist():
     data = request.json
     name = data.get('name')
@@ -410,7 +675,7 @@ def create_watchlist():
     if not name:
         return jsonify({'error': 'Name is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     try:
@@ -426,12 +691,10 @@ def create_watchlist():
     
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Watchlist with this name already exists'}), 400
-    finally:
-        conn.close()
 
-@app.route('/api/watchlist/<int:watchlist_id>/books', methods=['GET'])
+@bp.route('/api/watchlist/<int:watchlist_id>/books', methods=['GET'])
 def get_watchlist_books(watchlist_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -443,11 +706,18 @@ def get_watchlist_books(watchlist_id):
     ''', (watchlist_id,))
     
     books = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     return jsonify({'books': books})
 
-@app.route('/api/watchlist/<int:watchlist_id>/add-book', methods=['POST'])
+@bp.route('/api/watchlist/<int:watchlist_id>/analytics', methods=['GET'])
+def get_watchlist_analytics(watchlist_id):
+    conn = get_db()
+    if not conn.execute('SELECT 1 FROM watchlists WHERE id = ?', (watchlist_id,)).fetchone():
+        return jsonify({'error': 'Watchlist not found'}), 404
+    
+    return jsonify(watchlist_analytics(conn, watchlist_id))
+
+@bp.route('/api/watchlist/<int:watchlist_id>/add-book', methods=['POST'])
 def add_book_to_watchlist(watchlist_id):
     data = request.json
     book_id = data.get('book_id')
@@ -455,7 +725,7 @@ def add_book_to_watchlist(watchlist_id):
     if not book_id:
         return jsonify({'error': 'Book ID is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     try:
@@ -469,12 +739,10 @@ def add_book_to_watchlist(watchlist_id):
     
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Book already in watchlist'}), 400
-    finally:
-        conn.close()
 
-@app.route('/api/watchlist/<int:watchlist_id>/remove-book/<int:book_id>', methods=['DELETE'])
+@bp.route('/api/watchlist/<int:watchlist_id>/remove-book/<int:book_id>', methods=['DELETE'])
 def remove_book_from_watchlist(watchlist_id, book_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -483,55 +751,163 @@ def remove_book_from_watchlist(watchlist_id, book_id):
     ''', (watchlist_id, book_id))
     
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True})
 
-@app.route('/api/watchlist/<int:watchlist_id>', methods=['DELETE'])
+def watchlist_exists(conn, watchlist_id):
+    return conn.execute('SELECT 1 FROM watchlists WHERE id = ?', (watchlist_id,)).fetchone() is not None
+
+@bp.route('/api/watchlist/<int:watchlist_id>/add-books', methods=['POST'])
+def add_books_to_watchlist(watchlist_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        book_ids = parse_book_ids(data.get('book_ids'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db()
+    if not watchlist_exists(conn, watchlist_id):
+        return jsonify({'error': 'Watchlist not found'}), 404
+
+    return jsonify(add_books(conn, watchlist_id, book_ids))
+
+@bp.route('/api/watchlist/<int:watchlist_id>/remove-books', methods=['POST'])
+def remove_books_from_watchlist(watchlist_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        book_ids = parse_book_ids(data.get('book_ids'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db()
+    if not watchlist_exists(conn, watchlist_id):
+        return jsonify({'error': 'Watchlist not found'}), 404
+
+    return jsonify(remove_books(conn, watchlist_id, book_ids))
+
+@bp.route('/api/watchlist/<int:watchlist_id>/move-books', methods=['POST'])
+def move_watchlist_books(watchlist_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        book_ids = parse_book_ids(data.get('book_ids'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    target_id = data.get('to_watchlist_id')
+    if isinstance(target_id, bool) or not isinstance(target_id, int):
+        return jsonify({'error': 'to_watchlist_id must be an integer'}), 400
+    if target_id == watchlist_id:
+        return jsonify({'error': 'Books are already in this watchlist'}), 400
+
+    conn = get_db()
+    for wid in (watchlist_id, target_id):
+        if not watchlist_exists(conn, wid):
+            return jsonify({'error': f'Watchlist {wid} not found'}), 404
+
+    return jsonify(move_books(conn, watchlist_id, target_id, book_ids))
+
+@bp.route('/api/watchlists/membership', methods=['GET', 'POST'])
+def get_watchlist_membership():
+    # ?book_ids=1,2,3, or a JSON body for lists too long for a URL.
+    if request.method == 'POST':
+        value = (request.get_json(silent=True) or {}).get('book_ids')
+    else:
+        value = request.args.get('book_ids', '')
+    try:
+        book_ids = parse_book_ids(value)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'books': book_watchlists(get_db(), book_ids)})
+
+@bp.route('/api/watchlist/<int:watchlist_id>', methods=['DELETE'])
 def delete_watchlist(watchlist_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('DELETE FROM watchlists WHERE id = ?', (watchlist_id,))
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True})
 
-@app.route('/api/notifications', methods=['GET'])
+@bp.route('/api/notifications', methods=['GET'])
 def get_notifications():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT n.*, b.title, b.author
-        FROM notifications n
-        JOIN books b ON n.book_id = b.id
-        ORDER BY n.created_date DESC
-        LIMIT 50
-    ''')
-    
-    notifications = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    conn = get_db()
+    notifications = recent_notifications(conn)
     
     return jsonify({'notifications': notifications})
 
-@app.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
+@bp.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
 def mark_notification_read(notification_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('UPDATE notifications SET is_read = 1 WHERE id = ?', (notification_id,))
     conn.commit()
-    conn.close()
+    notify_changes(conn)
     
     return jsonify({'success': True})
 
-@app.route('/export/csv')
+@bp.route('/api/alert-rules', methods=['GET'])
+def get_alert_rules():
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    sql = 'SELECT * FROM alert_rules'
+    filters, params = [], []
+    for column in ('book_id', 'watchlist_id'):
+        value = request.args.get(column, type=int)
+        if value is not None:
+            filters.append(f'{column} = ?')
+            params.append(value)
+    if filters:
+        sql += ' WHERE ' + ' AND '.join(filters)
+    cursor.execute(sql + ' ORDER BY id', params)
+    
+    rules = [dict(row) for row in cursor.fetchall()]
+    
+    return jsonify({'rules': rules})
+
+@bp.route('/api/alert-rules', methods=['POST'])
+def create_alert_rule():
+    try:
+        rule_type, threshold, book_id, watchlist_id = validate_rule(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    if book_id is not None and not cursor.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone():
+        return jsonify({'error': 'Book not found'}), 404
+    if watchlist_id is not None and not cursor.execute('SELECT 1 FROM watchlists WHERE id = ?',
+                                                       (watchlist_id,)).fetchone():
+        return jsonify({'error': 'Watchlist not found'}), 404
+    
+    cursor.execute('''
+        INSERT INTO alert_rules (rule_type, threshold, book_id, watchlist_id)
+        VALUES (?, ?, ?, ?)
+    ''', (rule_type, threshold, book_id, watchlist_id))
+    rule_id = cursor.lastrowid
+    conn.commit()
+    
+    return jsonify({'success': True, 'rule_id': rule_id})
+
+@bp.route('/api/alert-rules/<int:rule_id>', methods=['DELETE'])
+def delete_alert_rule(rule_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM alert_rules WHERE id = ?', (rule_id,))
+    conn.commit()
+    
+    return jsonify({'success': True})
+
+@bp.route('/export/csv')
 def view_csv_export():
-    conn = get_db_connection()
+    import pandas as pd
+    conn = get_db()
     df = pd.read_sql_query('SELECT * FROM books', conn)
-    conn.close()
     
     html_table = df.to_html(classes='csv-table', index=False, border=0)
     return render_template('export_view.html', 
@@ -539,167 +915,178 @@ def view_csv_export():
                          content=html_table,
                          filename=f'kdp_books_{datetime.now().strftime("%Y%m%d")}.csv')
 
-@app.route('/export/pdf')
+@bp.route('/export/pdf')
 def view_pdf_export():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT title, author, current_price, rating, category FROM books')
-    books = cursor.fetchall()
-    conn.close()
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title = Paragraph("KDP Books Price Tracker Report", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-    
-    date_para = Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal'])
-    elements.append(date_para)
-    elements.append(Spacer(1, 20))
-    
-    data = [['Title', 'Author', 'Price', 'Rating', 'Category']]
-    
-    for book in books:
-        data.append([
-            book['title'][:30],
-            book['author'][:25],
-            f"${book['current_price']:.2f}" if book['current_price'] else 'N/A',
-            f"{book['rating']:.1f}" if book['rating'] else 'N/A',
-            book['category'][:20] if book['category'] else 'N/A'
-        ])
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    
-    # Convert PDF to base64 for embedding
-    import base64
-    pdf_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-    
     return render_template('export_view.html', 
                          export_type='PDF',
-                         content=pdf_base64,
+                         content=url_for('.download_pdf', inline=1),
                          filename=f'kdp_books_{datetime.now().strftime("%Y%m%d")}.pdf')
 
-@app.route('/api/export/csv', methods=['GET'])
+@bp.route('/api/export/csv', methods=['GET'])
 def download_csv():
-    conn = get_db_connection()
-    df = pd.read_sql_query('SELECT * FROM books', conn)
-    conn.close()
-    
-    output = io.BytesIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
+    dataset = request.args.get('dataset', 'books')
+    compress = request.args.get('gzip', 'false').lower() in ('1', 'true')
     
-    return send_file(
-        output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'kdp_books_{datetime.now().strftime("%Y%m%d")}.csv'
+    try:
+        sql, params = export_query(dataset, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if dataset == 'watchlist':
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM watchlists WHERE id = ?', (params[0],))
+        if not cursor.fetchone():
+            return jsonify({'error': 'Watchlist not found'}), 404
+    
+    filename = f'kdp_{dataset}_{datetime.now().strftime("%Y%m%d")}.csv'
+    if compress:
+        filename += '.gz'
+    
+    return Response(
+        encode_stream(iter_csv(sql, params), compress=compress),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
-@app.route('/api/export/pdf', methods=['GET'])
+@bp.route('/api/export/pdf', methods=['GET'])
 def download_pdf():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT title, author, current_price, rating, category FROM books')
-    books = cursor.fetchall()
-    conn.close()
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    
-    elements = []
-    styles = getSampleStyleSheet()
+    conn = get_db()
+    pdf, version = get_books_report(conn)
     
-    title = Paragraph("KDP Books Price Tracker Report", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
+    response = send_file(
+        io.BytesIO(pdf),
+        mimetype='application/pdf',
+        as_attachment=not request.args.get('inline'),
+        download_name=f'kdp_books_{datetime.now().strftime("%Y%m%d")}.pdf',
+        etag=f'report-{version}',
+        conditional=True
+    )
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/api/exports', methods=['POST'])
+def create_export():
+    data = request.get_json(silent=True) or {}
+    conn = get_db()
     
-    date_para = Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal'])
-    elements.append(date_para)
-    elements.append(Spacer(1, 20))
+    if data.get('dataset') == 'watchlist' and data.get('watchlist_id'):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM watchlists WHERE id = ?', (data['watchlist_id'],))
+        if not cursor.fetchone():
+            return jsonify({'error': 'Watchlist not found'}), 404
     
-    data = [['Title', 'Author', 'Price', 'Rating', 'Category']]
+    try:
+        job, deduplicated = submit_export(conn, data)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), e.status
     
-    for book in books:
-        data.append([
-            book['title'][:30],
-            book['author'][:25],
-            f"${book['current_price']:.2f}" if book['current_price'] else 'N/A',
-            f"{book['rating']:.1f}" if book['rating'] else 'N/A',
-            book['category'][:20] if book['category'] else 'N/A'
-        ])
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
+    job['status_url'] = url_for('.get_export_status', job_id=job['id'])
+    return jsonify({'success': True, 'job': job, 'deduplicated': deduplicated}), 202
+
+@bp.route('/api/exports/<job_id>', methods=['GET'])
+def get_export_status(job_id):
+    job = get_export(get_db(), job_id)
+    if not job:
+        return jsonify({'error': 'Export not found'}), 404
+    
+    if job['status'] == 'done':
+        job['download_url'] = url_for('.download_export', job_id=job_id)
+    return jsonify(job)
+
+@bp.route('/api/exports/<job_id>/download', methods=['GET'])
+def download_export(job_id):
+    export = get_export_file(get_db(), job_id)
+    if not export or not os.path.exists(export['file_path']):
+        return jsonify({'error': 'Export not found or not finished'}), 404
     
     return send_file(
-        buffer,
-        mimetype='application/pdf',
+        export['file_path'],
+        mimetype=export['mimetype'],
         as_attachment=True,
-        download_name=f'kdp_books_{datetime.now().strftime("%Y%m%d")}.pdf'
+        download_name=export['filename']
     )
 
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
 def get_stats():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) as total_books FROM books')
-    total_books = cursor.fetchone()['total_books']
-    
-    cursor.execute('SELECT AVG(current_price) as avg_price FROM books WHERE current_price IS NOT NULL')
-    avg_price = cursor.fetchone()['avg_price'] or 0
-    
-    cursor.execute('SELECT AVG(rating) as avg_rating FROM books WHERE rating IS NOT NULL')
-    avg_rating = cursor.fetchone()['avg_rating'] or 0
-    
-    cursor.execute('SELECT COUNT(*) as unread_notifications FROM notifications WHERE is_read = 0')
-    unread_notifications = cursor.fetchone()['unread_notifications']
+    conn = get_db()
+    return jsonify(dashboard_stats(conn))
+
+@bp.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    # Counters, books, watchlists and notifications for the first paint,
+    # from one query; takes the same fields/limit as /api/books.
+    try:
+        columns = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn.close()
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
     
+    data = dashboard_data(get_db(), columns, limit)
+    data['books'], data['next_cursor'] = finish_page(data['books'], limit)
+    return jsonify(data)
+
+@bp.route('/api/events', methods=['GET'])
+def get_events():
+    # Each open stream holds a worker thread (not a database connection)
+    # until the client goes away; see EVENTS_* and GUNICORN_THREADS.
+    bus, subscription, snapshot = subscribe(get_db())
+    response = Response(stream(bus, subscription, snapshot), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
     return jsonify({
-        'total_books': total_books,
-        'avg_price': round(avg_price, 2),
-        'avg_rating': round(avg_rating, 2),
-        'unread_notifications': unread_notifications
+        'search': search_cache_stats(),
+        'outbound': outbound_stats(),
+        'reports': report_cache_stats()
     })
 
+def start_background_jobs(app):
+    """Start `app`'s configured schedulers, once per worker process.
+
+    Runs on a worker's first request rather than in create_app, since
+    threads started in a preloading gunicorn master don't survive fork().
+    Each worker's schedulers take turns through a lease in the database, so
+    a job runs in one process per deployment rather than once per worker.
+    The schedulers run without an app context, so they get the app's
+    database explicitly.
+    """
+    if app.extensions.get('background_pid') == os.getpid():
+        return
+    app.extensions['background_pid'] = os.getpid()
+    
+    config = app.config
+    if config['PRICE_REFRESH_INTERVAL']:
+        from refresh import start_scheduler
+        start_scheduler(float(config['PRICE_REFRESH_INTERVAL']), database=config['DATABASE'])
+    if config['HISTORY_COMPACT_INTERVAL']:
+        from compaction import start_scheduler as start_compaction
+        start_compaction(float(config['HISTORY_COMPACT_INTERVAL']), database=config['DATABASE'])
+
+def create_app(config=None):
+    """Build the app; `config` entries override the defaults and environment"""
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY=os.environ.get('SESSION_SECRET', os.urandom(24).hex()),
+        DATABASE=database.DATABASE_NAME,
+        PRICE_REFRESH_INTERVAL=os.environ.get('PRICE_REFRESH_INTERVAL'),
+        HISTORY_COMPACT_INTERVAL=os.environ.get('HISTORY_COMPACT_INTERVAL')
+    )
+    app.config.update(config or {})
+    
+    init_app(app)
+    init_db(app.config['DATABASE'])
+    app.register_blueprint(bp)
+    if app.config['PRICE_REFRESH_INTERVAL'] or app.config['HISTORY_COMPACT_INTERVAL']:
+        app.before_request(lambda: start_background_jobs(app))
+    return app
+
 if __name__ == '__main__':
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    create_app().run(host='0.0.0.0', port=5000, debug=debug_mode)
@@ -0,0 +1,141 @@
+"""Alert rule evaluation: 100k rules against 10k price updates.
+
+Seeds a catalog, watchlists and a mix of per-book, per-watchlist and
+catalog-wide rules, then times alerts.evaluate_alerts on one batch of
+changes and apply_price_updates end to end, and checks the fired alerts
+against a straightforward per-update Python evaluation.
+
+    python benchmarks/bench_alerts.py --books 10000 --rules 100000 --updates 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from alerts import RULE_TYPES, evaluate_alerts
+from bench_pricing_suggestion import seed
+from price_updates import apply_price_updates
+
+THRESHOLDS = {
+    'price_change': (0.1, 3.0),
+    'price_change_pct': (1.0, 40.0),
+    'price_below': (1.0, 15.0),
+    'rating_change': (0.1, 1.0),
+    'reviews_spike': (1, 200),
+}
+
+
+def seed_rules(conn, n_rules, n_watchlists, watchlist_size):
+    book_ids = [row[0] for row in conn.execute('SELECT id FROM books')]
+    conn.executemany('INSERT INTO watchlists (name) VALUES (?)',
+                     [(f'bench-{i}',) for i in range(n_watchlists)])
+    watchlist_ids = [row[0] for row in conn.execute('SELECT id FROM watchlists')]
+    conn.executemany('INSERT INTO watchlist_books (watchlist_id, book_id) VALUES (?, ?)',
+                     [(watchlist_id, book_id) for watchlist_id in watchlist_ids
+                      for book_id in random.sample(book_ids, watchlist_size)])
+    rules = []
+    for _ in range(n_rules):
+        rule_type = random.choice(RULE_TYPES)
+        low, high = THRESHOLDS[rule_type]
+        threshold = round(random.uniform(low, high), 2)
+        if random.random() < 0.7:
+            rules.append((rule_type, threshold, random.choice(book_ids), None))
+        else:
+            rules.append((rule_type, threshold, None, random.choice(watchlist_ids)))
+    conn.executemany('INSERT INTO alert_rules (rule_type, threshold, book_id, watchlist_id) VALUES (?, ?, ?, ?)',
+                     rules)
+    conn.execute("UPDATE books SET reviews_count = abs(random() % 1000)")
+    conn.commit()
+    return book_ids
+
+
+def make_changes(conn, book_ids, n_updates):
+    books = {row[0]: row[1:] for row in conn.execute('SELECT id, current_price, rating, reviews_count FROM books')}
+    changes = []
+    for seq, book_id in enumerate(random.choices(book_ids, k=n_updates)):
+        price, rating, reviews = books[book_id]
+        new = (round(max(price + random.gauss(0, 1.5), 0.99), 2),
+               round(min(max(rating + random.gauss(0, 0.3), 1), 5), 1),
+               reviews + random.randint(0, 250))
+        changes.append((seq, book_id, price, new[0], rating, new[1], reviews, new[2]))
+        books[book_id] = new
+    return changes
+
+
+def reference(conn, changes):
+    """The same alerts, evaluated one change and one rule at a time"""
+    by_book, by_watchlist, catalog = defaultdict(list), defaultdict(list), []
+    for rule in conn.execute('SELECT rule_type, threshold, book_id, watchlist_id FROM alert_rules'):
+        target = by_book[rule[2]] if rule[2] else by_watchlist[rule[3]] if rule[3] else catalog
+        target.append((rule[0], rule[1]))
+    memberships = defaultdict(list)
+    for watchlist_id, book_id in conn.execute('SELECT watchlist_id, book_id FROM watchlist_books'):
+        memberships[book_id].append(watchlist_id)
+
+    fired = set()
+    for seq, book_id, old_price, new_price, old_rating, new_rating, old_reviews, new_reviews in changes:
+        rules = by_book[book_id] + catalog + [r for w in memberships[book_id] for r in by_watchlist[w]]
+        for rule_type, threshold in rules:
+            if rule_type == 'price_change':
+                hit = old_price and new_price and round(abs(new_price - old_price), 6) > threshold
+            elif rule_type == 'price_change_pct':
+                hit = old_price and round(abs(new_price - old_price) * 100 / old_price, 6) > threshold
+            elif rule_type == 'price_below':
+                hit = new_price < threshold <= old_price
+            elif rule_type == 'rating_change':
+                hit = old_rating and new_rating and round(abs(new_rating - old_rating), 6) >= threshold
+            else:
+                hit = new_reviews > old_reviews and new_reviews - old_reviews > threshold
+            if hit:
+                fired.add((seq, rule_type, threshold if rule_type == 'price_below' else None))
+    return fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--rules', type=int, default=100000)
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--watchlists', type=int, default=500)
+    parser.add_argument('--watchlist-size', type=int, default=50)
+    args = parser.parse_args()
+
+    seed(os.path.join(tempfile.mkdtemp(), 'alerts.db'), args.books)
+    conn = database.get_db_connection()
+    book_ids = seed_rules(conn, args.rules, args.watchlists, args.watchlist_size)
+    changes = make_changes(conn, book_ids, args.updates)
+
+    started = time.perf_counter()
+    fired = evaluate_alerts(conn.cursor(), changes)
+    elapsed = time.perf_counter() - started
+    conn.rollback()
+    print(f"evaluate_alerts: {args.rules} rules x {len(changes)} changes -> {len(fired)} alerts "
+          f"in {elapsed * 1000:.0f} ms ({len(changes) / elapsed:,.0f} changes/sec)")
+
+    started = time.perf_counter()
+    expected = reference(conn, changes)
+    print(f"per-update Python reference: {(time.perf_counter() - started) * 1000:.0f} ms")
+    actual = {(seq, rule_type, float(message.split('$')[1].split()[0]) if rule_type == 'price_below' else None)
+              for seq, _, rule_type, message in fired}
+    print('fired alerts match the reference' if actual == expected else
+          f'MISMATCH: {len(actual - expected)} unexpected, {len(expected - actual)} missing')
+
+    updates = [{'book_id': c[1], 'price': c[3], 'rating': c[5], 'reviews_count': c[7]} for c in changes]
+    started = time.perf_counter()
+    results = apply_price_updates(conn, updates)
+    elapsed = time.perf_counter() - started
+    print(f"apply_price_updates: {len(updates)} updates in {elapsed * 1000:.0f} ms "
+          f"({len(updates) / elapsed:,.0f} updates/sec), "
+          f"{sum(len(r['notifications']) for r in results)} notifications")
+    conn.close()
+    sys.exit(0 if actual == expected else 1)
+
+
+if __name__ == '__main__':
+    main()
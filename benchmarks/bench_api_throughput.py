@@ -0,0 +1,88 @@
+"""Requests/sec for /api/books and /api/update-price/<id> under concurrent load.
+
+Run once with --pool-size 0 (fresh connection per request, the old behaviour)
+and once with the default pool to compare:
+
+    python benchmarks/bench_api_throughput.py --pool-size 0
+    python benchmarks/bench_api_throughput.py
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from category_stats import rebuild_category_stats
+
+
+def seed(conn, n_books):
+    conn.executemany('''
+        INSERT INTO books (isbn, title, author, current_price, rating, reviews_count, page_count, category)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(f'bench-{i}', f'Book {i}', f'Author {i % 50}', 4.99, 4.2, 100, 250, 'Fiction')
+          for i in range(n_books)])
+    # Raw inserts skip the category aggregates the app keeps up to date.
+    rebuild_category_stats(conn)
+    conn.commit()
+
+
+def run(client_factory, method, path_fn, body_fn, threads, duration):
+    deadline = time.perf_counter() + duration
+
+    def worker(_):
+        client = client_factory()
+        done = errors = 0
+        while time.perf_counter() < deadline:
+            response = client.open(path_fn(), method=method, json=body_fn())
+            if response.status_code != 200:
+                errors += 1
+            done += 1
+        return done, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(worker, range(threads)))
+    total = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return total / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--pool-size', type=int, default=database.POOL_SIZE)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    database.DATABASE_NAME = os.path.join(tmpdir, 'bench.db')
+    database.POOL_SIZE = args.pool_size
+
+    from main import app
+
+    conn = database.get_db_connection()
+    seed(conn, args.books)
+    conn.close()
+
+    print(f'books={args.books} threads={args.threads} pool_size={args.pool_size}')
+
+    rps, errors = run(app.test_client, 'GET', lambda: '/api/books', lambda: None,
+                      args.threads, args.duration)
+    print(f'GET  /api/books              {rps:9.1f} req/s  errors={errors}')
+
+    rps, errors = run(app.test_client, 'POST',
+                      lambda: f'/api/update-price/{random.randint(1, args.books)}',
+                      lambda: {'price': round(random.uniform(0.99, 9.99), 2),
+                               'rating': round(random.uniform(3, 5), 1),
+                               'reviews_count': random.randint(0, 1000)},
+                      args.threads, args.duration)
+    print(f'POST /api/update-price/<id>  {rps:9.1f} req/s  errors={errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Peak Python memory of the streaming CSV export as row count grows.
+
+Compares /api/export/csv?dataset=price_history with the old approach of
+building a DataFrame and writing it to a BytesIO:
+
+    python benchmarks/bench_csv_export.py --rows 10000 100000 1000000
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import database
+from app import create_app
+
+
+def seed(rows):
+    path = os.path.join(tempfile.mkdtemp(), f'export-{rows}.db')
+    database.init_db(path)
+    conn = database.get_db_connection(path)
+    conn.executemany('INSERT INTO books (isbn, title, author) VALUES (?, ?, ?)',
+                     [(str(i), f'Book {i}', 'Author') for i in range(100)])
+    conn.executemany('INSERT INTO price_history (book_id, price, rating, reviews_count) VALUES (?, ?, ?, ?)',
+                     ((i % 100 + 1, 4.99 + i % 7, 4.1, i) for i in range(rows)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    def streaming():
+        response = client.get('/api/export/csv?dataset=price_history', buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def dataframe():
+        conn = database.get_db_connection(path)
+        df = pd.read_sql_query('SELECT * FROM price_history', conn)
+        conn.close()
+        output = io.BytesIO()
+        df.to_csv(output, index=False)
+        return output.tell()
+
+    for rows in args.rows:
+        path = seed(rows)
+        client = create_app({'DATABASE': path}).test_client()
+        for name, fn in [('streaming', streaming), ('dataframe', dataframe)]:
+            peak, elapsed, size = measure(fn)
+            print(f'{rows:>9} rows  {name:9}  peak {peak:8.2f} MiB  {elapsed:6.2f}s  {size / 1024 / 1024:7.1f} MiB csv')
+
+
+if __name__ == '__main__':
+    main()
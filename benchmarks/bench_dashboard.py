@@ -0,0 +1,103 @@
+"""Dashboard stats from the counter table versus full-table aggregates.
+
+For each catalog size, times the four aggregate queries /api/stats used to
+run, the dashboard_counters read that replaced them, and /api/dashboard
+end to end. Then it applies a random mix of inserts, price updates,
+deletes and notification reads, and checks the counters against a
+rebuild from scratch.
+
+    python benchmarks/bench_dashboard.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+from bench_pricing_suggestion import seed
+from dashboard import dashboard_stats, rebuild_dashboard_counters
+from price_updates import apply_price_updates
+
+AGGREGATES = [
+    'SELECT COUNT(*) FROM books',
+    'SELECT AVG(current_price) FROM books WHERE current_price IS NOT NULL',
+    'SELECT AVG(rating) FROM books WHERE rating IS NOT NULL',
+    'SELECT COUNT(*) FROM notifications WHERE is_read = 0',
+]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def churn(conn, operations):
+    """Random writes of every kind the counters have to follow"""
+    book_ids = [row[0] for row in conn.execute('SELECT id FROM books')]
+    for i in range(operations):
+        kind = random.random()
+        if kind < 0.2:
+            conn.execute('INSERT INTO books (title, author, current_price, rating) VALUES (?, ?, ?, ?)',
+                         (f'Churn {i}', 'Author', random.choice([None, round(random.uniform(0.99, 14.99), 2)]),
+                          random.choice([None, round(random.uniform(1, 5), 1)])))
+        elif kind < 0.3 and book_ids:
+            conn.execute('DELETE FROM books WHERE id = ?', (book_ids.pop(random.randrange(len(book_ids))),))
+        elif kind < 0.8 and book_ids:
+            apply_price_updates(conn, [{'book_id': random.choice(book_ids),
+                                        'price': round(random.uniform(0.99, 14.99), 2),
+                                        'rating': round(random.uniform(1, 5), 1),
+                                        'reviews_count': random.randint(0, 1000)}])
+        else:
+            conn.execute('UPDATE notifications SET is_read = 1 - is_read WHERE id = ?',
+                         (random.randint(1, i + 1),))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--churn', type=int, default=5000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+
+    consistent = True
+    for size in args.sizes:
+        seed(os.path.join(tmpdir, f'catalog-{size}.db'), size)
+        client = create_app({'DATABASE': database.DATABASE_NAME}).test_client()
+        conn = database.get_db_connection()
+        conn.executemany('INSERT INTO notifications (book_id, message, is_read) VALUES (?, ?, ?)',
+                         [(random.randint(1, size), 'bench', random.randint(0, 1)) for _ in range(size // 10)])
+        conn.commit()
+        database.reset_pool()
+
+        aggregates = timed(lambda: [conn.execute(sql).fetchone() for sql in AGGREGATES], args.repeat)
+        counters = timed(lambda: dashboard_stats(conn), args.repeat)
+        endpoint = timed(lambda: client.get('/api/dashboard?limit=50'), args.repeat)
+        print(f"{size:>7} books: aggregates {aggregates:7.2f} ms, counters {counters:5.3f} ms, "
+              f"/api/dashboard?limit=50 {endpoint:6.2f} ms")
+
+        churn(conn, args.churn)
+        maintained = dashboard_stats(conn)
+        rebuild_dashboard_counters(conn)
+        rebuilt = dashboard_stats(conn)
+        conn.rollback()
+        if maintained != rebuilt:
+            consistent = False
+            print(f"  MISMATCH after {args.churn} writes: {maintained} != {rebuilt}")
+        conn.close()
+
+    print('counters match a rebuild after churn' if consistent else 'counters drifted')
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
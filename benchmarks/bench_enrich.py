@@ -0,0 +1,78 @@
+"""Batched ISBN enrichment against one Google Books query per ISBN.
+
+Queues ISBNS ISBNs against the local fake API (with a share of unknown
+ISBNs and failing requests) and enriches them with OR-ed batch queries,
+then a sample one ISBN per query, and reports requests made and ISBNs/sec.
+Finally it stops a run partway, resumes it, and checks that every ISBN
+ended up done or not found with no batch fetched twice.
+
+    python benchmarks/bench_enrich.py --isbns 5000 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import enrich
+from fake_google_books import start_server
+
+
+def reset(conn, isbns):
+    conn.execute('DELETE FROM enrichment_queue')
+    conn.commit()
+    enrich.enqueue_isbns(conn, isbns)
+
+
+def timed_run(server, label, count, **options):
+    before = server.RequestHandlerClass.requests_served
+    report = enrich.run_enrichment(**options)
+    served = server.RequestHandlerClass.requests_served - before
+    print(f"{label:24} {report['isbns_per_second']:8,.0f} ISBNs/sec  {report['requests']:5} queries "
+          f"({served} requests with retries) for {count} ISBNs, {report['not_found']} not found")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--isbns', type=int, default=5000)
+    parser.add_argument('--sample', type=int, default=500, help='ISBNs looked up one query each')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per fake API request')
+    parser.add_argument('--missing', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'enrich.db')
+    database.init_db()
+    conn = database.get_db_connection()
+    server, api_url = start_server(latency=args.latency, missing=args.missing, error_rate=args.error_rate)
+    options = dict(api_url=api_url, concurrency=args.concurrency, rate=0, backoff=0.05)
+    isbns = [f'979{i:010d}' for i in range(args.isbns)]
+
+    reset(conn, isbns)
+    timed_run(server, 'batched, 40 per query', args.isbns, **options)
+    reset(conn, isbns[:args.sample])
+    timed_run(server, 'one ISBN per query', args.sample, max_terms=1, **options)
+
+    reset(conn, isbns)
+    stop = threading.Event()
+    threading.Timer(args.latency * 5, stop.set).start()
+    first = enrich.run_enrichment(stop=stop, **options)
+    second = enrich.run_enrichment(**options)
+    counts = enrich.enrichment_status(conn)['counts']
+    print(f"stopped after {first['isbns']} ISBNs ({first['released']} put back), resumed with {second['isbns']}")
+    conn.close()
+
+    ok = (first['isbns'] + second['isbns'] == args.isbns
+          and counts['done'] + counts['not_found'] + counts['failed'] == args.isbns)
+    print(f"queue: {counts}")
+    print('resume covered every ISBN exactly once' if ok else 'resume lost or repeated ISBNs')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Fan-out of /api/events to many concurrent dashboards.
+
+Boots gunicorn in a scratch directory, opens SUBSCRIBERS event streams,
+then makes price updates one at a time and measures how long each update
+takes to reach every subscriber as a `notification` event. With more than
+one worker, subscribers on other workers hear about an update through the
+watcher, so expect up to EVENTS_WATCH_INTERVAL of extra latency there.
+
+    python benchmarks/bench_events.py --subscribers 500 --updates 20
+    python benchmarks/bench_events.py --workers 4 --threads 150
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def post(port, path, payload):
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+
+
+class Subscriber:
+    def __init__(self):
+        self.connected = asyncio.Event()
+        self.notifications = []  # arrival times
+        self.resyncs = 0
+
+    async def run(self, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 20)
+        # HTTP/1.0 keeps the body unchunked.
+        writer.write(b'GET /api/events HTTP/1.0\r\nAccept: text/event-stream\r\n\r\n')
+        await writer.drain()
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        event = None
+        try:
+            while line := await reader.readline():
+                line = line.decode().rstrip('\n')
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                elif not line and event:
+                    if event == 'stats':
+                        self.connected.set()
+                    elif event == 'notification':
+                        self.notifications.append(time.perf_counter())
+                    elif event == 'resync':
+                        self.resyncs += 1
+                    event = None
+        finally:
+            writer.close()
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def run(port, n_subscribers, n_updates, book_id):
+    subscribers = [Subscriber() for _ in range(n_subscribers)]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(s.run(port)) for s in subscribers]
+    await asyncio.wait_for(asyncio.gather(*(s.connected.wait() for s in subscribers)), 60)
+    print(f"{n_subscribers} subscribers connected in {time.perf_counter() - started:.2f}s")
+
+    latencies, missed = [], 0
+    loop = asyncio.get_running_loop()
+    for i in range(n_updates):
+        sent = time.perf_counter()
+        # A $1 move trips the catalog-wide price_change rule: one notification each.
+        await loop.run_in_executor(None, post, port, f'/api/update-price/{book_id}', {'price': 10.0 + i + 1})
+        if not await wait_until(lambda: all(len(s.notifications) > i for s in subscribers), 30):
+            missed += sum(1 for s in subscribers if len(s.notifications) <= i)
+        latencies.extend(s.notifications[i] - sent for s in subscribers if len(s.notifications) > i)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies, missed, sum(s.resyncs for s in subscribers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=300, help='gunicorn threads per worker')
+    parser.add_argument('--watch-interval', type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.workers * args.threads <= args.subscribers:
+        parser.error('workers x threads must exceed subscribers: each stream holds a thread')
+
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT, EVENTS_WATCH_INTERVAL=str(args.watch_interval))
+    # worker_connections = threads, so a full worker leaves new streams to the others.
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(args.workers),
+                               '--threads', str(args.threads), '--worker-connections', str(args.threads),
+                               '--bind', f'127.0.0.1:{port}', 'main:app'],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                book_id = post(port, '/api/add-book', {'title': 'Bench', 'author': 'Bench', 'price': 10.0})['book_id']
+                break
+            except OSError:
+                if time.time() > deadline or master.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+
+        latencies, missed, resyncs = asyncio.run(run(port, args.subscribers, args.updates, book_id))
+
+        with open(f'/proc/{master.pid}/task/{master.pid}/children') as f:
+            workers = [rss_kb(int(pid)) for pid in f.read().split()]
+    finally:
+        master.terminate()
+        master.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    print(f"{args.updates} updates -> {len(latencies)} deliveries, {missed} missed, {resyncs} resyncs")
+    if latencies:
+        print(f"delivery latency: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print('gunicorn worker RSS: ' + ', '.join(f'{kb / 1024:.1f} MB' for kb in workers))
+    sys.exit(1 if missed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Throughput of the vectorized trend fit (forecasting.fit_trends).
+
+Seeds a catalog with price history, fits every book, checks a sample of
+fits against np.polyfit on the same window, then times an incremental
+pass after a handful of books get new snapshots.
+
+    python benchmarks/bench_forecasting.py --books 20000 --snapshots 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from bench_pricing_suggestion import seed
+from forecasting import FORECAST_WINDOW_DAYS, fit_trends
+
+
+def seed_history(n_snapshots):
+    conn = database.get_db_connection()
+    book_ids = [row[0] for row in conn.execute('SELECT id FROM books')]
+    rows = []
+    for book_id in book_ids:
+        price, rating, slope = random.uniform(1, 10), random.uniform(3, 5), random.uniform(-0.02, 0.02)
+        day = 0.0
+        for _ in range(n_snapshots):
+            day += random.uniform(1, 4)
+            rows.append((book_id, round(price + slope * day + random.gauss(0, 0.2), 2),
+                         round(rating + random.gauss(0, 0.1), 1), '2024-01-01 00:00:00', f'+{day} days'))
+    conn.executemany('''
+        INSERT INTO price_history (book_id, price, rating, snapshot_date)
+        VALUES (?, ?, ?, datetime(?, ?))
+    ''', rows)
+    conn.commit()
+    return conn, book_ids
+
+
+def check(conn, book_ids, sample=200):
+    worst = 0.0
+    for book_id in random.sample(book_ids, min(sample, len(book_ids))):
+        days, prices = np.array(conn.execute(
+            'SELECT julianday(snapshot_date), price FROM price_history WHERE book_id = ?', (book_id,)
+        ).fetchall()).T
+        recent = days >= days.max() - FORECAST_WINDOW_DAYS
+        slope, level = np.polyfit(days[recent] - days.max(), prices[recent], 1)
+        trend = conn.execute('SELECT price_slope, price_level FROM price_trends WHERE book_id = ?',
+                             (book_id,)).fetchone()
+        worst = max(worst, abs(trend['price_slope'] - slope), abs(trend['price_level'] - level))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--snapshots', type=int, default=50)
+    args = parser.parse_args()
+
+    seed(os.path.join(tempfile.mkdtemp(), 'catalog.db'), args.books)
+    conn, book_ids = seed_history(args.snapshots)
+
+    report = fit_trends(conn, refit=True)
+    total = report['load_seconds'] + report['compute_seconds'] + report['write_seconds']
+    print(f"full fit: {report['books']} books / {report['snapshots']} snapshots in {total:.2f}s  "
+          f"(load {report['load_seconds']}s, compute {report['compute_seconds']}s, "
+          f"write {report['write_seconds']}s)  {report['books_per_second']} books/sec")
+    print(f"max difference from np.polyfit: {check(conn, book_ids):.2e}")
+
+    changed = random.sample(book_ids, min(100, len(book_ids)))
+    conn.executemany('INSERT INTO price_history (book_id, price, rating) VALUES (?, 4.99, 4.0)',
+                     [(book_id,) for book_id in changed])
+    conn.commit()
+    started = time.perf_counter()
+    report = fit_trends(conn)
+    print(f"incremental fit: {report['books']} books with new snapshots in "
+          f"{time.perf_counter() - started:.3f}s")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
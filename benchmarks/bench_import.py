@@ -0,0 +1,103 @@
+"""Bulk import throughput against one POST /api/add-book per title.
+
+Generates a backlist of ROWS titles and imports it into an empty catalog
+as CSV through /api/import, imports the same file again (every row
+matches an existing book and changes nothing), sends it once more as
+NDJSON, and compares rows/sec with adding a sample of the titles one
+request at a time.
+
+    python benchmarks/bench_import.py --rows 20000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from catalog_import import IMPORT_COLUMNS
+
+CATEGORIES = ['Fantasy', 'Fiction', 'Romance', 'Mystery, Thriller', 'Science Fiction', 'Biography']
+
+
+def backlist(n):
+    random.seed(n)
+    return [{
+        'isbn': f'979{i:010d}',
+        'title': f'Backlist Title {i}',
+        'author': f'Author {i % 500}',
+        'current_price': round(random.uniform(0.99, 19.99), 2),
+        'rating': round(random.uniform(2.5, 5), 1),
+        'reviews_count': random.randint(0, 5000),
+        'page_count': random.randint(80, 900),
+        'category': random.choice(CATEGORIES),
+        'publisher': 'Bench Press',
+        'published_date': f'20{random.randint(10, 24)}-0{random.randint(1, 9)}-1{random.randint(0, 9)}',
+        'description': 'A book. ' * 20,
+        'thumbnail_url': None,
+    } for i in range(n)]
+
+
+def as_csv(books):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, IMPORT_COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(books)
+    return buffer.getvalue().encode()
+
+
+def as_ndjson(books):
+    return ''.join(json.dumps(book) + '\n' for book in books).encode()
+
+
+def timed_import(client, body, content_type):
+    started = time.perf_counter()
+    response = client.post('/api/import', data=body, content_type=content_type)
+    elapsed = time.perf_counter() - started
+    report = response.get_json()
+    if response.status_code != 200 or report['failed']:
+        raise RuntimeError(f'import failed: {response.status_code} {report}')
+    return report, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--sample', type=int, default=500, help='titles added one request at a time')
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'import.db')
+    from main import app
+    client = app.test_client()
+    books = backlist(args.rows)
+    body = as_csv(books)
+    print(f"{args.rows} rows, {len(body) / 1e6:.1f} MB of CSV")
+
+    for label, data, content_type in [('csv, new titles', body, 'text/csv'),
+                                      ('csv, unchanged', body, 'text/csv'),
+                                      ('ndjson, unchanged', as_ndjson(books), 'application/x-ndjson')]:
+        report, elapsed = timed_import(client, data, content_type)
+        print(f"/api/import {label:20} {elapsed:6.2f}s  {args.rows / elapsed:9,.0f} rows/sec  "
+              f"({report['inserted']} new, {report['updated']} updated)")
+
+    started = time.perf_counter()
+    for book in backlist(args.sample):
+        book = dict(book, isbn='sample-' + book['isbn'], price=book.pop('current_price'))
+        client.post('/api/add-book', json=book)
+    elapsed = time.perf_counter() - started
+    print(f"/api/add-book one at a time       {args.sample / elapsed:9,.0f} rows/sec  (sample of {args.sample})")
+
+    conn = database.get_db_connection()
+    history = conn.execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+    conn.close()
+    print(f"price_history rows: {history} (one per new title; unchanged rows add none)")
+
+
+if __name__ == '__main__':
+    main()
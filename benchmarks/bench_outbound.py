@@ -0,0 +1,72 @@
+"""p50/p99 search latency at N concurrent users against the fake API.
+
+Compares a fresh requests.get per search (no keep-alive, no coalescing)
+with http_client.get_json (pooled session plus single-flight):
+
+    python benchmarks/bench_outbound.py --users 50 --queries 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import http_client
+from fake_google_books import start_server
+from refresh import percentile
+
+
+def run(search, users, searches_per_user, queries):
+    def user(_):
+        latencies = []
+        for _ in range(searches_per_user):
+            query = random.choice(queries)
+            started = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        latencies = [l for result in pool.map(user, range(users)) for l in result]
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--searches', type=int, default=20, help='searches per user')
+    parser.add_argument('--queries', type=int, default=10, help='distinct queries in the mix')
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, api_url = start_server(latency=args.latency)
+    queries = [f'isbn:978{i:010d}' for i in range(args.queries)]
+
+    def naive(query):
+        response = requests.get(api_url, params={'q': query, 'maxResults': 10}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def pooled(query):
+        return http_client.get_json(api_url, {'q': query, 'maxResults': 10})
+
+    print(f'users={args.users} searches/user={args.searches} distinct queries={args.queries} '
+          f'api latency={args.latency}s')
+    for name, search in [('requests.get', naive), ('http_client', pooled)]:
+        before = server.RequestHandlerClass.requests_served
+        latencies, elapsed = run(search, args.users, args.searches, queries)
+        served = server.RequestHandlerClass.requests_served - before
+        print(f'{name:13} p50={percentile(latencies, 50) * 1000:7.1f}ms '
+              f'p99={percentile(latencies, 99) * 1000:7.1f}ms '
+              f'{len(latencies) / elapsed:8.1f} searches/s  upstream requests={served}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Throughput of the catalog-wide pricing engine (pricing.reprice_catalog).
+
+    python benchmarks/bench_pricing_engine.py --books 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from bench_pricing_suggestion import seed
+from pricing import reprice_catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=100000)
+    args = parser.parse_args()
+
+    seed(os.path.join(tempfile.mkdtemp(), 'catalog.db'), args.books)
+    conn = database.get_db_connection()
+    report = reprice_catalog(conn)
+    conn.close()
+
+    total = report['load_seconds'] + report['compute_seconds'] + report['write_seconds']
+    print(f"{report['books']} books in {total:.2f}s  (load {report['load_seconds']}s, "
+          f"compute {report['compute_seconds']}s, write {report['write_seconds']}s)  "
+          f"{report['books_per_second']} books/sec")
+
+
+if __name__ == '__main__':
+    main()
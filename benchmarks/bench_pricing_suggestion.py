@@ -0,0 +1,60 @@
+"""Latency of /api/pricing-suggestion/<id> as the catalog grows.
+
+With category_stats the lookup should stay flat from 1k to 100k books:
+
+    python benchmarks/bench_pricing_suggestion.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+from category_stats import rebuild_category_stats
+
+CATEGORIES = ['Fiction', 'Fantasy, Fiction', 'Biography, History', 'Romance',
+              'Science Fiction, Dystopian', 'Self-Help', 'Business', 'Mystery, Thriller']
+
+
+def seed(path, n_books):
+    database.DATABASE_NAME = path
+    database.init_db()
+    conn = database.get_db_connection()
+    random.seed(n_books)
+    conn.executemany('''
+        INSERT INTO books (isbn, title, author, current_price, rating, page_count, category)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(f'bench-{i}', f'Book {i}', 'Author', round(random.uniform(0.99, 14.99), 2),
+           round(random.uniform(2.5, 5), 1), random.randint(80, 900), random.choice(CATEGORIES))
+          for i in range(n_books)])
+    rebuild_category_stats(conn)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+
+    for size in args.sizes:
+        seed(os.path.join(tmpdir, f'catalog-{size}.db'), size)
+        client = create_app({'DATABASE': database.DATABASE_NAME}).test_client()
+        ids = [random.randint(1, size) for _ in range(args.requests)]
+        started = time.perf_counter()
+        for book_id in ids:
+            assert client.get(f'/api/pricing-suggestion/{book_id}').status_code == 200
+        elapsed = time.perf_counter() - started
+        print(f'{size:>8} books  {elapsed / args.requests * 1000:7.3f} ms/request')
+
+
+if __name__ == '__main__':
+    main()
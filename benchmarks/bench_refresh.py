@@ -0,0 +1,43 @@
+"""Throughput and tail latency of refresh.refresh_books() against the fake API.
+
+    python benchmarks/bench_refresh.py --books 500 --concurrency 16 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import refresh
+from fake_google_books import start_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=refresh.DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=0)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    database.init_db()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (isbn, title, author, current_price, rating) VALUES (?, ?, ?, ?, ?)
+    ''', [(f'978{i:010d}', f'Book {i}', 'Author', 4.99, 4.0) for i in range(args.books)])
+    conn.commit()
+    conn.close()
+
+    server, api_url = start_server(latency=args.latency)
+    report = refresh.refresh_books(api_url=api_url, concurrency=args.concurrency, rate=args.rate)
+    server.shutdown()
+
+    print(f'books={args.books} concurrency={args.concurrency} rate={args.rate} latency={args.latency}s')
+    print(refresh.format_report(report))
+
+
+if __name__ == '__main__':
+    main()
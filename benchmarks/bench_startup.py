@@ -0,0 +1,140 @@
+"""Worker startup cost: `import main` time, RSS, and a regression budget.
+
+Imports main (which builds the app) in a fresh interpreter with -X importtime (in a scratch
+directory, so it gets its own kdp_tracker.db), then boots gunicorn and
+reads each worker's RSS after it has served `/`. Exits non-zero if the
+import time or RSS goes over budget, or if a heavy library that should
+only load on first use (pandas, numpy, reportlab, ...) is imported eagerly.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --workers 4 --max-import-ms 400 --max-rss-mb 50
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ['pandas', 'numpy', 'sklearn', 'reportlab', 'requests']
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+rss_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS:'))
+print(json.dumps({'seconds': elapsed, 'rss_kb': rss_kb,
+                  'loaded': [m for m in %r if m in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+
+def run_probe(workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=workdir,
+                            env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr):
+    """Self time in microseconds per top-level package"""
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_us)
+    return by_package
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+
+
+def worker_rss(workdir, workers):
+    """RSS in KB of each gunicorn worker after serving `/`"""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                               '--bind', f'127.0.0.1:{port}', 'main:app'],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                for _ in range(workers * 4):
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5).read()
+                break
+            except OSError:
+                if time.time() > deadline or master.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+        with open(f'/proc/{master.pid}/task/{master.pid}/children') as f:
+            children = [int(pid) for pid in f.read().split()]
+        return [rss_kb(pid) for pid in children]
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers to measure (0 to skip)')
+    parser.add_argument('--max-import-ms', type=float, default=500)
+    parser.add_argument('--max-rss-mb', type=float, default=60)
+    parser.add_argument('--top', type=int, default=10, help='packages to list by import time')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # The first import creates and migrates the database; time the second.
+        run_probe(workdir)
+        probe, stderr = run_probe(workdir)
+        import_ms = probe['seconds'] * 1000
+        print(f"import main: {import_ms:.0f} ms, RSS {probe['rss_kb'] / 1024:.1f} MB")
+        for package, self_us in sorted(parse_importtime(stderr).items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {package:24} {self_us / 1000:7.1f} ms")
+
+        workers = []
+        if args.workers:
+            if importlib.util.find_spec('gunicorn'):
+                workers = worker_rss(workdir, args.workers)
+                print('gunicorn worker RSS: ' + ', '.join(f'{kb / 1024:.1f} MB' for kb in workers))
+            else:
+                print('gunicorn not installed; skipping worker RSS')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f'import took {import_ms:.0f} ms (budget {args.max_import_ms:.0f} ms)')
+    for kb in [probe['rss_kb']] + workers:
+        if kb / 1024 > args.max_rss_mb:
+            failures.append(f'RSS {kb / 1024:.1f} MB (budget {args.max_rss_mb:.0f} MB)')
+    if probe['loaded']:
+        failures.append(f"imported eagerly: {', '.join(probe['loaded'])}")
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    if not failures:
+        print('ok   within budget')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
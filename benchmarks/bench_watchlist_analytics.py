@@ -0,0 +1,80 @@
+"""/api/watchlist/<id>/analytics against one /api/book/<id> call per member.
+
+Seeds a watchlist of MEMBERS books with SNAPSHOTS price snapshots each
+over the last 90 days, then times fetching every member's full history
+(what the page would need without the endpoint), the analytics endpoint
+with an empty cache, and again once cached. One member then gets a new
+price and the next call is timed too, since it has to recompute.
+
+    python benchmarks/bench_watchlist_analytics.py --members 1000 --snapshots 90
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def seed(conn, members, snapshots):
+    random.seed(members)
+    now = datetime.utcnow()
+    conn.executemany('INSERT INTO books (title, author, current_price) VALUES (?, ?, ?)',
+                     [(f'Book {i}', 'Author', 4.99) for i in range(members)])
+    conn.execute("INSERT INTO watchlists (name) VALUES ('Bench')")
+    conn.execute('INSERT INTO watchlist_books (watchlist_id, book_id) SELECT 1, id FROM books')
+    conn.executemany('INSERT INTO price_history (book_id, price, snapshot_date) VALUES (?, ?, ?)', [
+        (book_id, round(random.uniform(0.99, 9.99), 2),
+         (now - timedelta(days=90 * (snapshots - k) / snapshots)).strftime('%Y-%m-%d %H:%M:%S'))
+        for book_id in range(1, members + 1) for k in range(snapshots)
+    ])
+    conn.commit()
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=90, help='price snapshots per book')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'analytics.db')
+    from main import app
+    client = app.test_client()
+    conn = database.get_db_connection()
+    seed(conn, args.members, args.snapshots)
+    print(f"{args.members} members x {args.snapshots} snapshots")
+
+    per_book = timed(lambda: [client.get(f'/api/book/{book_id}') for book_id in range(1, args.members + 1)])
+    print(f"/api/book/<id> per member     {per_book:9.1f} ms")
+
+    def cold():
+        conn.execute('DELETE FROM watchlist_analytics')
+        conn.commit()
+        client.get('/api/watchlist/1/analytics')
+
+    print(f"analytics, computed           {timed(cold, args.repeat):9.1f} ms")
+    print(f"analytics, cached             {timed(lambda: client.get('/api/watchlist/1/analytics'), args.repeat):9.2f} ms")
+
+    client.post('/api/update-price/1', json={'price': 12.34})
+    changed = client.get('/api/watchlist/1/analytics').get_json()
+    ok = any(book['book_id'] == 1 and book['latest_price'] == 12.34 for book in changed['books'])
+    print('a new snapshot of a member refreshed the cached analytics' if ok else 'cached analytics went stale')
+    conn.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Bulk watchlist add/move/remove against one request per book.
+
+Seeds BOOKS books and WATCHLISTS watchlists, then times adding BATCH books
+to a watchlist with /api/watchlist/<id>/add-book per book and with one
+add-books call, moving and removing them in bulk, and finding which
+watchlists hold them with /api/watchlists/membership against fetching
+every watchlist's books. Finally it checks the watchlist counts add up.
+
+    python benchmarks/bench_watchlist_bulk.py --books 20000 --batch 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def seed(conn, books, watchlists):
+    conn.executemany('INSERT INTO books (title, author, current_price) VALUES (?, ?, ?)',
+                     [(f'Book {i}', 'Author', 4.99) for i in range(books)])
+    conn.executemany('INSERT INTO watchlists (name) VALUES (?)', [(f'List {i}',) for i in range(watchlists)])
+    # Every other watchlist already holds a slice of the catalog.
+    conn.executemany('INSERT INTO watchlist_books (watchlist_id, book_id) VALUES (?, ?)', [
+        (wid, book_id) for wid in range(3, watchlists + 1, 2) for book_id in range(wid, books + 1, watchlists)
+    ])
+    conn.commit()
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:34} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--watchlists', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=5000, help='books added, moved and removed')
+    parser.add_argument('--sample', type=int, default=500, help='books added one request each')
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'watchlists.db')
+    from main import app
+    client = app.test_client()
+    conn = database.get_db_connection()
+    seed(conn, args.books, args.watchlists)
+    book_ids = list(range(1, args.batch + 1))
+    print(f"{args.books} books, {args.watchlists} watchlists, batches of {args.batch}")
+
+    timed(f'add-book x {args.sample}', lambda: [
+        client.post('/api/watchlist/1/add-book', json={'book_id': book_id}) for book_id in book_ids[:args.sample]])
+    added = timed(f'add-books, {args.batch} ids', lambda: client.post(
+        '/api/watchlist/1/add-books', json={'book_ids': book_ids}).get_json())
+
+    timed(f'books of all {args.watchlists} watchlists', lambda: [
+        client.get(f'/api/watchlist/{wid}/books') for wid in range(1, args.watchlists + 1)])
+    membership = timed(f'membership, {args.batch} ids', lambda: client.post(
+        '/api/watchlists/membership', json={'book_ids': book_ids}).get_json())
+
+    moved = timed(f'move-books, {args.batch} ids', lambda: client.post(
+        '/api/watchlist/1/move-books', json={'book_ids': book_ids, 'to_watchlist_id': 2}).get_json())
+    removed = timed(f'remove-books, {args.batch} ids', lambda: client.post(
+        '/api/watchlist/2/remove-books', json={'book_ids': book_ids}).get_json())
+
+    counts = {wl['id']: wl['book_count'] for wl in client.get('/api/watchlists').get_json()['watchlists']}
+    conn.close()
+    ok = (added['added'] == args.batch - args.sample and added['already_in_watchlist'] == args.sample
+          and all(any(wl['id'] == 1 for wl in lists) for lists in membership['books'].values())
+          and moved['moved'] == removed['removed'] == args.batch
+          and counts[1] == counts[2] == 0)
+    print('bulk operations kept every count consistent' if ok else 'bulk operations lost or repeated books')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Fail if an alert rule fires on the wrong side of its threshold.
+
+Change rules fire only on a move larger than the threshold, except
+rating_change, which fires on a move equal to it too, so the default
+catalog-wide rules behave like the checks update_price made before rules
+existed (a price move of more than $0.50, a rating move of 0.3 or more).
+A price_below target fires once the price drops under it.
+
+    python benchmarks/check_alert_thresholds.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# (old and new price, rating, reviews_count), with the notifications expected.
+CASES = [
+    ((2.00, 4.0, 100), (2.50, 4.0, 100), []),
+    ((2.00, 4.0, 100), (2.51, 4.0, 100), ['price_change']),
+    ((3.00, 4.0, 100), (2.50, 4.0, 100), []),
+    ((2.00, 4.2, 100), (2.00, 4.4, 100), []),
+    ((2.00, 4.2, 100), (2.00, 4.5, 100), ['rating_change']),
+    ((2.00, 1.0, 100), (2.00, 1.3, 100), ['rating_change']),
+    ((2.00, 4.5, 100), (2.00, 4.2, 100), ['rating_change']),
+]
+
+# Per-book rules, each right at its threshold and then just past it.
+RULES = [
+    ({'rule_type': 'price_change_pct', 'threshold': 10}, (1.00, 4.0, 100), (1.10, 4.0, 100), []),
+    ({'rule_type': 'price_change_pct', 'threshold': 10}, (1.00, 4.0, 100), (1.11, 4.0, 100), ['price_change_pct']),
+    ({'rule_type': 'reviews_spike', 'threshold': 10}, (5.00, 4.0, 100), (5.00, 4.0, 110), []),
+    ({'rule_type': 'reviews_spike', 'threshold': 10}, (5.00, 4.0, 100), (5.00, 4.0, 111), ['reviews_spike']),
+    ({'rule_type': 'price_below', 'threshold': 3.0}, (3.00, 4.0, 100), (3.00, 4.0, 100), []),
+    ({'rule_type': 'price_below', 'threshold': 3.0}, (3.00, 4.0, 100), (2.99, 4.0, 100), ['price_below']),
+]
+
+
+def snapshot(book_id, values):
+    return {'book_id': book_id, 'price': values[0], 'rating': values[1], 'reviews_count': values[2]}
+
+
+def main():
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'alerts.db')
+    from main import app
+    client = app.test_client()
+
+    cases = [(None,) + case for case in CASES] + RULES
+    failures = []
+    for i, (rule, old, new, expected) in enumerate(cases):
+        book_id = client.post('/api/add-book', json={'title': f'Book {i}', 'author': 'Author'}).get_json()['book_id']
+        if rule:
+            client.post('/api/alert-rules', json=dict(rule, book_id=book_id))
+        client.post('/api/update-prices', json=[snapshot(book_id, old)])
+        result = client.post('/api/update-prices', json=[snapshot(book_id, new)]).get_json()['results'][0]
+        if result['notifications'] != expected:
+            failures.append(f"{rule or 'defaults'} {old} -> {new}: {result['notifications']}, expected {expected}")
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print('ok   alert thresholds' if not failures else f'{len(failures)} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Fail if a malformed price update breaks its batch or reports the wrong status.
+
+Sends /api/update-prices a batch mixing valid updates with bad book ids
+and values, and checks each bad one gets its own error while the valid
+ones are still applied; then checks /api/update-price/<id> answers 400
+for bad values and 404 only for an unknown book.
+
+    python benchmarks/check_price_updates.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+BATCH = [
+    ({'book_id': 1, 'price': 3.99, 'rating': 4.5, 'reviews_count': 10}, None),
+    ({'book_id': [1], 'price': 1.99}, 'book_id must be an integer'),
+    ({'book_id': True, 'price': 1.99}, 'book_id must be an integer'),
+    ({'book_id': '1', 'price': 1.99}, 'book_id must be an integer'),
+    ({'book_id': 1, 'price': 'abc'}, 'price must be a finite number or null'),
+    ({'book_id': 1, 'price': float('nan')}, 'price must be a finite number or null'),
+    ({'book_id': 1, 'price': 1.99, 'rating': False}, 'rating must be a finite number or null'),
+    ({'book_id': 1, 'price': 1.99, 'reviews_count': True}, 'reviews_count must be a whole number or null'),
+    ({'book_id': 1, 'price': 1.99, 'reviews_count': 2.5}, 'reviews_count must be a whole number or null'),
+    ({'book_id': 999, 'price': 1.99}, 'Book not found'),
+    ('not an object', 'Update must be an object'),
+    ({'book_id': 2, 'price': 5.49, 'rating': None, 'reviews_count': None}, None),
+]
+
+SINGLE = [
+    ('/api/update-price/1', {'price': 'abc'}, 400),
+    ('/api/update-price/1', {'price': 1.99, 'reviews_count': True}, 400),
+    ('/api/update-price/1', ['not', 'an', 'object'], 400),
+    ('/api/update-price/999', {'price': 1.99}, 404),
+    ('/api/update-price/1', {'price': 2.99, 'rating': 4.0, 'reviews_count': 12}, 200),
+]
+
+
+def main():
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'updates.db')
+    from main import app
+    client = app.test_client()
+    for i in range(3):
+        client.post('/api/add-book', json={'title': f'Book {i}', 'author': 'Author', 'price': 4.99,
+                                           'category': 'Fiction'})
+
+    failures = []
+    # The standard library's JSON encoder writes NaN, which the app's parser accepts.
+    results = client.post('/api/update-prices', json=[update for update, _ in BATCH]).get_json()['results']
+    for (update, expected), result in zip(BATCH, results):
+        if result.get('error') != expected or (expected is None) != bool(result.get('success')):
+            failures.append(f'update {update!r}: {result}')
+
+    prices = {book['id']: book['current_price'] for book in client.get('/api/books').get_json()['books']}
+    if prices != {1: 3.99, 2: 5.49, 3: 4.99}:
+        failures.append(f'valid updates in the batch were not applied: {prices}')
+
+    for path, body, status in SINGLE:
+        response = client.post(path, json=body)
+        if response.status_code != status:
+            failures.append(f'{path} {body!r}: {response.status_code}, expected {status}')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print('ok   price update validation' if not failures else f'{len(failures)} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
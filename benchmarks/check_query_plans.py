@@ -0,0 +1,98 @@
+"""Fail if any hot query falls back to a full table scan.
+
+EXPLAIN QUERY PLAN reports an index-ordered walk as "SCAN t USING INDEX ...",
+which is fine for ORDER BY ... LIMIT queries; a bare "SCAN t" is not.
+
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+HOT_QUERIES = {
+    'get_books': ('SELECT * FROM books ORDER BY added_date DESC', ()),
+    'get_book': ('SELECT * FROM price_history WHERE book_id = ? ORDER BY snapshot_date ASC', (1,)),
+    'get_book_history.raw': ('''
+        SELECT snapshot_date, price, rating, reviews_count FROM price_history
+        WHERE book_id = ? AND snapshot_date >= ? AND snapshot_date < ?
+        ORDER BY snapshot_date ASC, id ASC
+    ''', (1, '2024-01-01', '2024-02-01')),
+    'get_book_history.rollup': ('''
+        SELECT * FROM price_rollups
+        WHERE book_id = ? AND resolution = ? AND bucket >= date(?) AND bucket < ?
+        ORDER BY bucket ASC
+    ''', (1, 'day', '2024-01-01', '2024-02-01')),
+    'search_catalog': ('''
+        SELECT b.id, b.title, books_fts.rank AS _rank
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ?
+        ORDER BY books_fts.rank, books_fts.rowid LIMIT ?
+    ''', ('"dragon"*', 50)),
+    'get_notifications': ('''
+        SELECT n.*, b.title, b.author
+        FROM notifications n
+        JOIN books b ON n.book_id = b.id
+        ORDER BY n.created_date DESC, n.id DESC
+        LIMIT 50
+    ''', ()),
+    'get_stats': ('SELECT * FROM dashboard_counters WHERE id = 1', ()),
+    'get_watchlist_books': ('''
+        SELECT b.*, wb.added_date as watchlist_added_date
+        FROM books b
+        JOIN watchlist_books wb ON b.id = wb.book_id
+        WHERE wb.watchlist_id = ?
+        ORDER BY wb.added_date DESC
+    ''', (1,)),
+    'enrichment_claim': ("SELECT isbn FROM enrichment_queue WHERE status = 'pending' ORDER BY queued_at LIMIT ?",
+                         (2000,)),
+    'book_watchlists': ('''
+        SELECT wb.book_id, w.id, w.name
+        FROM watchlist_books wb
+        JOIN watchlists w ON w.id = wb.watchlist_id
+        WHERE wb.book_id IN (?, ?, ?)
+        ORDER BY wb.book_id, w.name
+    ''', (1, 2, 3)),
+    'move_books': ('''
+        SELECT ?, book_id FROM watchlist_books
+        WHERE watchlist_id = ? AND book_id IN (?, ?, ?)
+    ''', (2, 1, 1, 2, 3)),
+}
+
+
+def full_scans(conn, sql, params):
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row['detail'] for row in plan
+            if row['detail'].startswith('SCAN') and 'INDEX' not in row['detail']]
+
+
+def main():
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'plans.db')
+    database.init_db()
+    conn = database.get_db_connection()
+    # Give the planner statistics resembling a populated catalog.
+    conn.executemany('INSERT INTO books (isbn, title, author, current_price, rating) VALUES (?, ?, ?, ?, ?)',
+                     [(str(i), f'Book {i}', 'Author', 4.99, 4.0) for i in range(2000)])
+    conn.executemany('INSERT INTO price_history (book_id, price) VALUES (?, ?)',
+                     [(i % 2000 + 1, 4.99) for i in range(20000)])
+    conn.executemany('INSERT INTO notifications (book_id, message, is_read) VALUES (?, ?, ?)',
+                     [(i % 2000 + 1, 'msg', i % 2) for i in range(5000)])
+    conn.commit()
+    conn.execute('ANALYZE')
+
+    failures = 0
+    for name, (sql, params) in HOT_QUERIES.items():
+        scans = full_scans(conn, sql, params)
+        status = 'FAIL' if scans else 'ok'
+        print(f'{status:4} {name}' + (f'  {scans}' if scans else ''))
+        failures += bool(scans)
+    conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
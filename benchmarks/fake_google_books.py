@@ -0,0 +1,111 @@
+"""Local stand-in for the Google Books volumes API.
+
+Answers /volumes?q=isbn:... (including `isbn:A OR isbn:B` queries, cut
+to maxResults) and /volumes/<id> with a deterministic volume after an
+optional delay, so outbound code can be exercised without the network.
+A `missing` fraction of ISBNs is unknown, and an `error_rate` fraction
+of requests fails with 503 to exercise retries:
+
+    python benchmarks/fake_google_books.py --port 8765 --latency 0.05
+    python benchmarks/fake_google_books.py --missing 0.1 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def fake_volume(key):
+    seed = zlib.crc32(key.encode())
+    return {
+        'id': key,
+        'volumeInfo': {
+            'title': f'Fake Book {key}',
+            'authors': [f'Author {seed % 97}'],
+            'averageRating': round(3 + (seed % 20) / 10, 1),
+            'ratingsCount': seed % 5000,
+            'pageCount': 100 + seed % 600,
+            'categories': ['Fiction'],
+            'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': key}],
+        },
+        'saleInfo': {
+            'saleability': 'FOR_SALE',
+            'listPrice': {'amount': round(0.99 + (seed % 900) / 100, 2)},
+        },
+    }
+
+
+class FakeGoogleBooksHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    missing = 0.0
+    error_rate = 0.0
+    requests_served = 0
+    _lock = threading.Lock()
+
+    def known(self, key):
+        return zlib.crc32(key.encode()) % 1000 >= self.missing * 1000
+
+    def do_GET(self):
+        with self._lock:
+            type(self).requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        status = 200
+        if self.error_rate and random.random() < self.error_rate:
+            status, body = 503, {'error': {'code': 503, 'message': 'Backend Error'}}
+        elif parts and parts[-1] != 'volumes':
+            status, body = (200, fake_volume(parts[-1])) if self.known(parts[-1]) else (404, {'error': {'code': 404}})
+        else:
+            params = parse_qs(url.query)
+            query = params.get('q', [''])[0]
+            max_results = min(int(params.get('maxResults', ['10'])[0]), 40)
+            terms = [t.split(':', 1)[-1] for t in query.replace(' OR ', ' ').split() if t]
+            items = [fake_volume(t) for t in terms if self.known(t)]
+            body = {'kind': 'books#volumes', 'totalItems': len(items)}
+            if items:
+                body['items'] = items[:max_results]
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0, missing=0.0, error_rate=0.0):
+    """Start the fake API on a background thread; returns (server, base_url)"""
+    handler = type('Handler', (FakeGoogleBooksHandler,), {'latency': latency, 'missing': missing,
+                                                          'error_rate': error_rate, 'requests_served': 0})
+    server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 512})
+    server = server_class(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/books/v1/volumes'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Google Books API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--missing', type=float, default=0.0, help='fraction of ISBNs that are unknown')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.latency, args.missing, args.error_rate)
+    print(f'Serving fake Google Books API at {url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,77 @@
+"""Full-text search over the catalog.
+
+books_fts is an external-content FTS5 index over the searchable text
+columns of books; triggers keep it in step with every insert, delete and
+edit of those columns (price and rating refreshes don't touch it). The
+default rank is bm25 weighted towards the title and author, and every
+search term matches as a prefix, so partial words typed into the
+dashboard already find books.
+"""
+import re
+
+SEARCH_COLUMNS = ['title', 'author', 'category', 'publisher', 'description']
+
+# bm25 weights, in SEARCH_COLUMNS order.
+RANK_WEIGHTS = [10.0, 5.0, 2.0, 2.0, 1.0]
+
+MAX_TERMS = 8
+
+def fts_statements():
+    """Statements that create books_fts, its triggers and its rank function"""
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'NEW.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'OLD.{column}' for column in SEARCH_COLUMNS)
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    return [
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            {columns},
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''',
+        f"INSERT INTO books_fts (books_fts, rank) VALUES ('rank', 'bm25({weights})')",
+        f'''CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books
+        BEGIN
+            INSERT INTO books_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books
+        BEGIN
+            INSERT INTO books_fts (books_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF {columns} ON books
+        BEGIN
+            INSERT INTO books_fts (books_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO books_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END''',
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ]
+
+def match_query(text):
+    """An FTS5 query matching every word of `text` as a prefix, or None if it has no words.
+
+    Words are quoted, so FTS5 operators and column filters typed by the user
+    are searched for literally instead of being interpreted.
+    """
+    terms = re.findall(r'\w+', text)[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_books(conn, query, columns, limit, after=None):
+    """Rows of `columns` for books matching `query`, best first.
+
+    Each row also carries `_rank`; pass the last row's (_rank, id) as `after`
+    to get the next page.
+    """
+    sql = f'''
+        SELECT {", ".join(f"b.{column}" for column in columns)}, books_fts.rank AS _rank
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ?
+    '''
+    params = [query]
+    if after:
+        sql += ' AND (books_fts.rank, books_fts.rowid) > (?, ?)'
+        params.extend(after)
+    sql += ' ORDER BY books_fts.rank, books_fts.rowid LIMIT ?'
+    params.append(limit)
+    return [dict(row) for row in conn.execute(sql, params)]
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    With max_bytes set, values must support len() and the cache also
+    evicts least recently used entries until their total size fits.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, max_bytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _discard(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry[2]
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = len(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+            self._data[key] = (value, expires, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes and self.bytes > self.max_bytes):
+                self._discard(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._discard(key)[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+        if self.max_bytes:
+            stats.update({'bytes': self.bytes, 'max_bytes': self.max_bytes})
+        return stats
+
+class SQLiteCacheTier:
+    """JSON values in a key/value table, so cached entries survive restarts"""
+
+    def __init__(self, table, ttl=300):
+        self.table = table
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, key):
+        row = conn.execute(f'SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?',
+                           (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, conn, key, value):
+        conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), time.time() + self.ttl))
+        conn.commit()
+
+    def purge_expired(self, conn):
+        deleted = conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),)).rowcount
+        conn.commit()
+        return deleted
+
+    def stats(self):
+        return {'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in
+    flight wait and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {'done': threading.Event()}
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+    def stats(self):
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
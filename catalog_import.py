@@ -0,0 +1,313 @@
+"""Bulk catalog import from CSV or NDJSON.
+
+    python catalog_import.py backlist.csv
+    python catalog_import.py backlist.ndjson.gz --chunk-size 2000
+
+Takes the columns of the books CSV export (id, added_date and
+last_updated are ignored), so an export can be imported elsewhere as is.
+The input is parsed as a stream and written IMPORT_CHUNK_SIZE rows at a
+time, each chunk in its own transaction: books upsert on isbn with
+executemany, new books get their first price_history snapshot, updated
+ones one more if price, rating or reviews changed, and the category
+aggregates follow along. A blank cell or missing key keeps the book's
+current value. Invalid rows are skipped and reported with their line
+number; the rest of the file still goes in.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import math
+import time
+
+from category_stats import update_books_stats
+from database import init_db, get_db_connection
+from price_updates import LOOKUP_CHUNK_SIZE
+
+IMPORT_CHUNK_SIZE = 1000
+FORMATS = ['csv', 'ndjson']
+
+# Columns an import may set, in the order the export writes them.
+IMPORT_COLUMNS = ['isbn', 'title', 'author', 'current_price', 'rating', 'reviews_count',
+                  'page_count', 'category', 'publisher', 'published_date', 'description', 'thumbnail_url']
+IGNORED_COLUMNS = ['id', 'added_date', 'last_updated']
+NUMBER_COLUMNS = {
+    'current_price': (float, 0, None),
+    'rating': (float, 0, 5),
+    'reviews_count': (int, 0, None),
+    'page_count': (int, 0, None),
+}
+
+KNOWN_COLUMNS = frozenset(IMPORT_COLUMNS + IGNORED_COLUMNS)
+
+# Rows that would leave a book as it is aren't written at all: no
+# last_updated bump, no catalog version change, no search reindex.
+UPSERT_SQL = f'''
+    INSERT INTO books ({", ".join(IMPORT_COLUMNS)})
+    VALUES ({", ".join("?" * len(IMPORT_COLUMNS))})
+    ON CONFLICT (isbn) DO UPDATE SET
+        {", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in IMPORT_COLUMNS[1:])},
+        last_updated = CURRENT_TIMESTAMP
+    WHERE {" OR ".join(f"COALESCE(excluded.{c}, {c}) IS NOT {c}" for c in IMPORT_COLUMNS[1:])}
+'''
+
+class ImportFormatError(ValueError):
+    """The upload as a whole can't be read; nothing was imported"""
+
+def open_text(stream, compressed=False):
+    """A text stream over an uploaded binary one"""
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+def read_csv(text):
+    """(line, row) pairs from a CSV stream with a header row"""
+    reader = csv.DictReader(text)
+    try:
+        fieldnames = reader.fieldnames
+    except csv.Error as e:
+        raise ImportFormatError(f'Unreadable header row: {e}')
+    if fieldnames is None:
+        return
+    unknown = [c for c in fieldnames if c not in KNOWN_COLUMNS]
+    if unknown:
+        raise ImportFormatError(f"Unknown columns: {', '.join(unknown)}")
+    if 'title' not in fieldnames or 'author' not in fieldnames:
+        raise ImportFormatError('The title and author columns are required')
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader has moved past the bad record, whose first line
+            # isn't counted yet; report it like any other invalid row.
+            yield reader.line_num + 1, f'Unreadable CSV record: {e}'
+            continue
+        # Cells past the header end up under None; blank lines are skipped by the reader.
+        yield reader.line_num, row
+
+def read_ndjson(text):
+    """(line, row) pairs from one JSON object per line"""
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except ValueError:
+            yield line, 'Invalid JSON'
+
+def _number(column, value):
+    kind, low, high = NUMBER_COLUMNS[column]
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{column} must be a number')
+    if not math.isfinite(number) or (kind is int and not number.is_integer()):
+        raise ValueError(f'{column} must be {"a whole" if kind is int else "a finite"} number')
+    if number < low or (high is not None and number > high):
+        raise ValueError(f'{column} must be between {low} and {high}' if high is not None
+                         else f'{column} must not be negative')
+    return kind(number)
+
+def validate_row(row):
+    """Values for IMPORT_COLUMNS from a parsed row; raises ValueError"""
+    if isinstance(row, str):
+        raise ValueError(row)
+    if not isinstance(row, dict):
+        raise ValueError('Expected a JSON object')
+    if None in row:
+        raise ValueError('More cells than columns')
+    unknown = [key for key in row if key not in KNOWN_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    book = {}
+    for column in IMPORT_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if value is None:
+            pass
+        elif column in NUMBER_COLUMNS:
+            value = _number(column, value)
+        elif isinstance(value, (dict, list)):
+            raise ValueError(f'{column} must be text')
+        else:
+            value = str(value)
+        book[column] = value
+
+    if book['title'] is None or book['author'] is None:
+        raise ValueError('title and author are required')
+    return [book[column] for column in IMPORT_COLUMNS]
+
+def _lookup(cursor, isbns):
+    books = {}
+    for start in range(0, len(isbns), LOOKUP_CHUNK_SIZE):
+        chunk = isbns[start:start + LOOKUP_CHUNK_SIZE]
+        cursor.execute(f'''
+            SELECT id, {", ".join(IMPORT_COLUMNS)}
+            FROM books WHERE isbn IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        for row in cursor.fetchall():
+            books[row['isbn']] = dict(row)
+    return books
+
+def upsert_books(conn, rows):
+    """Upsert validated rows inside the caller's write transaction.
+
+    Returns (inserted, updated, ids) where `updated` counts existing books
+    that actually changed and `ids` maps each isbn to its book id. Start
+    the transaction with BEGIN IMMEDIATE, so the rows looked up first
+    can't change before the upsert.
+    """
+    cursor = conn.cursor()
+    isbns = list({values[0] for values in rows if values[0] is not None})
+    originals = _lookup(cursor, isbns)
+
+    # Several rows with one isbn apply in order, like separate imports would.
+    final = {}
+    for values in rows:
+        if values[0] is None:
+            continue
+        previous = final.get(values[0]) or originals.get(values[0])
+        merged = dict(zip(IMPORT_COLUMNS, values))
+        if previous:
+            merged = {c: merged[c] if merged[c] is not None else previous.get(c) for c in IMPORT_COLUMNS}
+        final[values[0]] = merged
+
+    cursor.executemany(UPSERT_SQL, [values for values in rows if values[0] is not None])
+    without_isbn = [values for values in rows if values[0] is None]
+    cursor.executemany(UPSERT_SQL, without_isbn)
+    if without_isbn:
+        # One transaction holding the write lock, so their ids are consecutive.
+        last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+        first_id = last_id - len(without_isbn) + 1
+    ids = {isbn: row['id'] for isbn, row in _lookup(cursor, isbns).items()}
+
+    changes = []
+    history_rows = []
+    for isbn, row in final.items():
+        original = originals.get(isbn)
+        changes.append((ids[isbn], original, row))
+        snapshot = (row['current_price'], row['rating'], row['reviews_count'])
+        if row['current_price'] is not None and (
+                original is None or
+                snapshot != (original['current_price'], original['rating'], original['reviews_count'])):
+            history_rows.append((ids[isbn],) + snapshot)
+    for offset, values in enumerate(without_isbn):
+        row = dict(zip(IMPORT_COLUMNS, values))
+        changes.append((first_id + offset, None, row))
+        if row['current_price'] is not None:
+            history_rows.append((first_id + offset, row['current_price'], row['rating'], row['reviews_count']))
+
+    cursor.executemany('''
+        INSERT INTO price_history (book_id, price, rating, reviews_count)
+        VALUES (?, ?, ?, ?)
+    ''', history_rows)
+    update_books_stats(conn, changes)
+
+    inserted = len(without_isbn) + sum(1 for isbn in final if isbn not in originals)
+    # Like UPSERT_SQL, a book whose values all stay the same isn't an update.
+    updated = sum(1 for isbn, row in final.items()
+                  if isbn in originals and any(row[c] != originals[isbn][c] for c in IMPORT_COLUMNS))
+    return inserted, updated, ids
+
+def _write_chunk(conn, rows):
+    """Upsert one chunk of validated rows in its own transaction; returns (inserted, updated)"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        inserted, updated, _ = upsert_books(conn, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted, updated
+
+def import_books(conn, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import (line, row) pairs from read_csv/read_ndjson; returns a report.
+
+    Chunks already written stay written if a later one fails.
+    """
+    started = time.perf_counter()
+    inserted = updated = processed = 0
+    errors = []
+    chunk = []
+
+    def flush():
+        nonlocal inserted, updated
+        if chunk:
+            added, changed = _write_chunk(conn, chunk)
+            inserted += added
+            updated += changed
+            chunk.clear()
+
+    for line, row in rows:
+        processed += 1
+        try:
+            chunk.append(validate_row(row))
+        except ValueError as e:
+            errors.append({'line': line, 'error': str(e)})
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': processed,
+        'inserted': inserted,
+        'updated': updated,
+        'failed': len(errors),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(processed / elapsed, 1) if elapsed else 0.0
+    }
+
+def read_rows(text, fmt):
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"format must be one of: {', '.join(FORMATS)}")
+    return read_csv(text) if fmt == 'csv' else read_ndjson(text)
+
+def detect_format(name):
+    """'csv' or 'ndjson' from a file name, or None"""
+    name = (name or '').lower().removesuffix('.gz')
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+def format_report(report):
+    return (f"Imported {report['rows']} rows: {report['inserted']} new, {report['updated']} updated, "
+            f"{report['failed']} failed in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/sec)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Import books from a CSV or NDJSON file')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error('can\'t tell the format from the file name; pass --format')
+
+    init_db()
+    conn = get_db_connection()
+    try:
+        with open(args.path, 'rb') as f:
+            report = import_books(conn, read_rows(open_text(f, args.path.endswith('.gz')), fmt),
+                                  chunk_size=args.chunk_size)
+    except ImportFormatError as e:
+        parser.exit(1, f"{args.path}: {e}\n")
+    finally:
+        conn.close()
+    print(format_report(report))
+    for error in report['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Running aggregates of price, rating and page count per category.
+
+A book belongs to every comma-separated term of its `category` column
+(kept in book_categories) and, when it has any category at all, to the
+catch-all ALL_CATEGORIES bucket. Only priced books count, and zero or
+missing ratings and page counts are left out, matching the competitor
+set that get_pricing_suggestion has always used.
+"""
+
+ALL_CATEGORIES = ''
+
+STATS = [('price', 'current_price'), ('rating', 'rating'), ('pages', 'page_count')]
+
+def split_categories(category):
+    if category is None:
+        return []
+    terms = [term.strip() for term in category.split(',') if term.strip()]
+    return list(dict.fromkeys(terms))
+
+def primary_category(category):
+    terms = split_categories(category)
+    return terms[0] if terms else ALL_CATEGORIES
+
+def stat_keys(category):
+    if category is None:
+        return []
+    return [ALL_CATEGORIES] + split_categories(category)
+
+def book_values(row):
+    if row is None or row['current_price'] is None:
+        return None
+    return {
+        'price': row['current_price'],
+        'rating': row['rating'] or None,
+        'pages': row['page_count'] or None
+    }
+
+def _empty_stats(category):
+    stats = {'category': category, 'book_count': 0}
+    for name, _ in STATS:
+        stats.update({f'{name}_count': 0, f'{name}_sum': 0.0, f'{name}_sumsq': 0.0,
+                      f'{name}_min': None, f'{name}_max': None})
+    return stats
+
+def _stored(cursor, category):
+    cursor.execute('SELECT * FROM category_stats WHERE category = ?', (category,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+def _load(cursor, category):
+    return _stored(cursor, category) or _empty_stats(category)
+
+def _save(cursor, stats):
+    columns = list(stats)
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO category_stats ({", ".join(columns)})
+        VALUES ({", ".join("?" * len(columns))})
+    ''', [stats[c] for c in columns])
+
+def _add(stats, values):
+    stats['book_count'] += 1
+    for name, _ in STATS:
+        value = values[name]
+        if value is None:
+            continue
+        stats[f'{name}_count'] += 1
+        stats[f'{name}_sum'] += value
+        stats[f'{name}_sumsq'] += value * value
+        if stats[f'{name}_min'] is None or value < stats[f'{name}_min']:
+            stats[f'{name}_min'] = value
+        if stats[f'{name}_max'] is None or value > stats[f'{name}_max']:
+            stats[f'{name}_max'] = value
+
+def _remove(stats, values):
+    """Subtract a contribution; False if the result can't be trusted without a recompute.
+
+    That is when the value was the min or max, or when the stored row
+    never counted the book (written outside update_books_stats).
+    """
+    stats['book_count'] -= 1
+    exact = stats['book_count'] >= 0
+    for name, _ in STATS:
+        value = values[name]
+        if value is None:
+            continue
+        stats[f'{name}_count'] -= 1
+        stats[f'{name}_sum'] -= value
+        stats[f'{name}_sumsq'] -= value * value
+        low, high = stats[f'{name}_min'], stats[f'{name}_max']
+        if stats[f'{name}_count'] <= 0:
+            exact = exact and stats[f'{name}_count'] == 0
+            stats[f'{name}_min'] = stats[f'{name}_max'] = None
+        elif low is None or high is None or value <= low or value >= high:
+            exact = False
+    return exact
+
+def _member_query(category):
+    if category == ALL_CATEGORIES:
+        return '''
+            SELECT id, current_price, rating, page_count FROM books
+            WHERE category IS NOT NULL AND current_price IS NOT NULL
+        ''', ()
+    return '''
+        SELECT b.id, b.current_price, b.rating, b.page_count
+        FROM book_categories bc
+        JOIN books b ON b.id = bc.book_id
+        WHERE bc.category = ? AND b.current_price IS NOT NULL
+    ''', (category,)
+
+def recompute_category(cursor, category):
+    member_sql, params = _member_query(category)
+    selects = ['COUNT(*) AS book_count']
+    for name, _ in STATS:
+        selects.append(f'COUNT({name}) AS {name}_count, COALESCE(SUM({name}), 0.0) AS {name}_sum, '
+                       f'COALESCE(SUM({name} * {name}), 0.0) AS {name}_sumsq, '
+                       f'MIN({name}) AS {name}_min, MAX({name}) AS {name}_max')
+    cursor.execute(f'''
+        SELECT ? AS category, {", ".join(selects)}
+        FROM (
+            SELECT current_price AS price, NULLIF(rating, 0) AS rating, NULLIF(page_count, 0) AS pages
+            FROM ({member_sql})
+        )
+    ''', (category,) + tuple(params))
+    stats = dict(cursor.fetchone())
+    if stats['book_count']:
+        _save(cursor, stats)
+    else:
+        cursor.execute('DELETE FROM category_stats WHERE category = ?', (category,))
+
+def update_book_stats(conn, book_id, old_row, new_row):
+    """Move one book's contribution from old_row to new_row.
+
+    Either row may be None (insert / delete). Call after the books table
+    has been written, inside the same transaction.
+    """
+    update_books_stats(conn, [(book_id, old_row, new_row)])
+
+def update_books_stats(conn, changes):
+    """Apply a batch of (book_id, old_row, new_row) changes to the aggregates.
+
+    Categories whose min or max can't be maintained incrementally, or
+    that have no stored row to start from, are recomputed from the books
+    table once, after the whole batch.
+    """
+    cursor = conn.cursor()
+    recompute = set()
+    touched = {}
+
+    def load(key):
+        if key not in touched:
+            stats = _stored(cursor, key)
+            if stats is None:
+                recompute.add(key)
+            touched[key] = stats or _empty_stats(key)
+        return touched[key]
+
+    for book_id, old_row, new_row in changes:
+        old_category = old_row['category'] if old_row else None
+        new_category = new_row['category'] if new_row else None
+        old_values, new_values = book_values(old_row), book_values(new_row)
+
+        if old_category != new_category:
+            cursor.execute('DELETE FROM book_categories WHERE book_id = ?', (book_id,))
+            cursor.executemany('INSERT OR IGNORE INTO book_categories (category, book_id) VALUES (?, ?)',
+                               [(term, book_id) for term in split_categories(new_category)])
+        elif old_values == new_values:
+            continue
+
+        if old_values:
+            for key in stat_keys(old_category):
+                stats = load(key)
+                if key not in recompute and not _remove(stats, old_values):
+                    recompute.add(key)
+        if new_values:
+            for key in stat_keys(new_category):
+                stats = load(key)
+                if key not in recompute:
+                    _add(stats, new_values)
+
+    for key, stats in touched.items():
+        if key in recompute:
+            recompute_category(cursor, key)
+        elif stats['book_count'] > 0:
+            _save(cursor, stats)
+        else:
+            cursor.execute('DELETE FROM category_stats WHERE category = ?', (key,))
+
+def rebuild_category_stats(conn):
+    """Repopulate book_categories and category_stats from the books table"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM book_categories')
+    cursor.execute('DELETE FROM category_stats')
+    cursor.execute('SELECT id, category FROM books WHERE category IS NOT NULL')
+    cursor.executemany('INSERT OR IGNORE INTO book_categories (category, book_id) VALUES (?, ?)',
+                       [(term, row['id']) for row in cursor.fetchall()
+                        for term in split_categories(row['category'])])
+    cursor.execute('SELECT DISTINCT category FROM book_categories')
+    categories = [ALL_CATEGORIES] + [row['category'] for row in cursor.fetchall()]
+    for category in categories:
+        recompute_category(cursor, category)
+
+def competitor_stats(conn, category, book):
+    """Aggregates for `category` with `book` itself left out"""
+    cursor = conn.cursor()
+    stats = _load(cursor, category)
+    values = book_values(book)
+    if values and category in stat_keys(book['category']):
+        if not _remove(stats, values):
+            # The book holds the category's min or max price, rating or page
+            # count; only the price range is reported, so look that up.
+            member_sql, params = _member_query(category)
+            cursor.execute(f'SELECT MIN(current_price), MAX(current_price) FROM ({member_sql}) WHERE id != ?',
+                           tuple(params) + (book['id'],))
+            stats['price_min'], stats['price_max'] = cursor.fetchone()
+    return stats
@@ -0,0 +1,201 @@
+"""Retention and compaction for price_history.
+
+    python compaction.py                   # one pass with the default retention
+    python compaction.py --raw-days 30     # thin raw snapshots older than 30 days
+    python compaction.py --interval 86400  # keep compacting once a day
+    python compaction.py --full-vacuum     # one-off: switch an existing database to incremental auto_vacuum
+
+New snapshots are deduplicated at write time (see apply_price_updates);
+this removes repeats recorded before that, and thins snapshots older than
+the retention window to the last one per book and day. The daily and
+weekly rollups were built from every snapshot as it arrived, so charts of
+old periods keep their first/last/min/max. Books are processed a batch at
+a time in short write transactions, so the app keeps serving requests
+while it runs; freed pages are then returned to the filesystem with
+incremental_vacuum, a few at a time.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import claim_lease, init_db, get_db_connection
+
+HISTORY_RAW_DAYS = int(os.environ.get('HISTORY_RAW_DAYS', 90))
+BOOKS_PER_BATCH = 200
+VACUUM_STEP_PAGES = 512
+
+# Stay well under SQLite's host parameter limit.
+DELETE_CHUNK_SIZE = 500
+
+def _page_stats(conn):
+    return {
+        'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+        'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+        'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0]
+    }
+
+def duplicate_snapshots(conn, book_ids):
+    """Ids of snapshots that repeat the previous price, rating and review count"""
+    placeholders = ', '.join('?' * len(book_ids))
+    rows = conn.execute(f'''
+        SELECT id FROM (
+            SELECT id, price, rating, reviews_count,
+                   LAG(id) OVER by_time AS previous_id,
+                   LAG(price) OVER by_time AS previous_price,
+                   LAG(rating) OVER by_time AS previous_rating,
+                   LAG(reviews_count) OVER by_time AS previous_reviews
+            FROM price_history
+            WHERE book_id IN ({placeholders})
+            WINDOW by_time AS (PARTITION BY book_id ORDER BY snapshot_date, id)
+        )
+        WHERE previous_id IS NOT NULL
+          AND price IS previous_price
+          AND rating IS previous_rating
+          AND reviews_count IS previous_reviews
+    ''', book_ids).fetchall()
+    return [row[0] for row in rows]
+
+def thinned_snapshots(conn, book_ids, cutoff):
+    """Ids of snapshots before `cutoff` that aren't the last of their book and day"""
+    placeholders = ', '.join('?' * len(book_ids))
+    rows = conn.execute(f'''
+        SELECT id FROM (
+            SELECT id, snapshot_date,
+                   ROW_NUMBER() OVER (PARTITION BY book_id, date(snapshot_date)
+                                      ORDER BY snapshot_date DESC, id DESC) AS day_rank
+            FROM price_history
+            WHERE book_id IN ({placeholders}) AND snapshot_date < ?
+        )
+        WHERE day_rank > 1
+    ''', book_ids + [cutoff]).fetchall()
+    return [row[0] for row in rows]
+
+def _delete_snapshots(cursor, ids):
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        cursor.execute(f"DELETE FROM price_history WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES):
+    """Release free pages a step at a time; returns the number released"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0
+    released = 0
+    while True:
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not free:
+            return released
+        # Each step is its own short write transaction.
+        conn.execute(f'PRAGMA incremental_vacuum({min(free, step_pages)})').fetchall()
+        released += free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+def compact_history(conn, raw_days=HISTORY_RAW_DAYS, books_per_batch=BOOKS_PER_BATCH,
+                    full_vacuum=False):
+    """Deduplicate and thin price_history, then reclaim space; returns a report"""
+    started = time.perf_counter()
+    cutoff = (datetime.utcnow() - timedelta(days=raw_days)).strftime('%Y-%m-%d')
+    before = _page_stats(conn)
+    rows_before = conn.execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+
+    book_ids = [row[0] for row in conn.execute('SELECT DISTINCT book_id FROM price_history ORDER BY book_id')]
+    duplicates_removed = thinned = 0
+    cursor = conn.cursor()
+    for start in range(0, len(book_ids), books_per_batch):
+        batch = book_ids[start:start + books_per_batch]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Thin after deduplicating, so a day never loses its only change point.
+            duplicates = duplicate_snapshots(conn, batch)
+            _delete_snapshots(cursor, duplicates)
+            old = thinned_snapshots(conn, batch, cutoff)
+            _delete_snapshots(cursor, old)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        duplicates_removed += len(duplicates)
+        thinned += len(old)
+
+    if duplicates_removed or thinned:
+        # Removed snapshots can move a low, high or volatility; rebuilt on next read.
+        conn.execute('DELETE FROM watchlist_analytics')
+        conn.commit()
+
+    if full_vacuum:
+        # Rewrites the whole file under an exclusive lock; only needed once.
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    incremental_vacuum(conn)
+    conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+    after = _page_stats(conn)
+
+    auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    return {
+        'rows_before': rows_before,
+        'rows_after': rows_before - duplicates_removed - thinned,
+        'duplicates_removed': duplicates_removed,
+        'thinned': thinned,
+        'rows_reclaimed': duplicates_removed + thinned,
+        'bytes_reclaimed': (before['page_count'] - after['page_count']) * after['page_size'],
+        'bytes_reusable': after['freelist_count'] * after['page_size'],
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}[auto_vacuum],
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+def format_report(report):
+    text = (f"Compacted price_history: {report['rows_reclaimed']} rows removed "
+            f"({report['duplicates_removed']} duplicates, {report['thinned']} thinned), "
+            f"{report['rows_after']} left; {report['bytes_reclaimed']} bytes reclaimed "
+            f"in {report['elapsed_seconds']}s")
+    if report['auto_vacuum'] != 'incremental' and report['bytes_reusable']:
+        text += (f"; {report['bytes_reusable']} bytes free inside the file "
+                 f"(run once with --full-vacuum to return them)")
+    return text
+
+def start_scheduler(interval, database=None, **options):
+    """Run compact_history() on `database` every `interval` seconds on a daemon thread.
+
+    Like the price refresh, only the process holding the scheduler lease
+    compacts; the other workers' schedulers stand by.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            conn = get_db_connection(database)
+            try:
+                if claim_lease(conn, 'history-compaction', interval * 2):
+                    print(format_report(compact_history(conn, **options)))
+            except Exception as e:
+                print(f"History compaction failed: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='history-compaction', daemon=True)
+    thread.start()
+    return stop
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicate and thin price_history, then reclaim space')
+    parser.add_argument('--raw-days', type=int, default=HISTORY_RAW_DAYS,
+                        help='keep every change point for this many days')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='rewrite the database file (locks out writers while it runs)')
+    parser.add_argument('--interval', type=float,
+                        help='keep running, compacting every INTERVAL seconds')
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    full_vacuum = args.full_vacuum
+    while True:
+        print(format_report(compact_history(conn, raw_days=args.raw_days, full_vacuum=full_vacuum)))
+        full_vacuum = False
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+    conn.close()
+
+if __name__ == '__main__':
+    main()
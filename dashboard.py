@@ -0,0 +1,168 @@
+"""Queries behind the dashboard's counters and notification panel.
+
+The counters live in the single-row dashboard_counters table, kept current
+by triggers on books and notifications, so reading them costs the same
+for ten books as for a million. Averages are stored as a sum and a count;
+the sums are integers in millionths, so adding and removing the same
+values any number of times never drifts.
+"""
+
+import json
+
+NOTIFICATIONS_LIMIT = 50
+SUM_SCALE = 1000000
+
+def _counter_changes(columns, add=None, remove=None):
+    # SET clause adding the contribution of row `add` (NEW) and removing that of `remove` (OLD).
+    changes = []
+    for name, expr in columns:
+        change = name
+        if add:
+            change += f' + {expr.format(row=add)}'
+        if remove:
+            change += f' - {expr.format(row=remove)}'
+        changes.append(f'{name} = {change}')
+    return ', '.join(changes)
+
+BOOK_COUNTERS = [
+    ('book_count', '1'),
+    ('price_count', '({row}.current_price IS NOT NULL)'),
+    ('price_sum', f'CAST(round(COALESCE({{row}}.current_price, 0) * {SUM_SCALE}) AS INTEGER)'),
+    ('rating_count', '({row}.rating IS NOT NULL)'),
+    ('rating_sum', f'CAST(round(COALESCE({{row}}.rating, 0) * {SUM_SCALE}) AS INTEGER)'),
+]
+NOTIFICATION_COUNTERS = [
+    ('unread_count', '({row}.is_read = 0)'),
+]
+
+def dashboard_counter_statements():
+    """Statements that create dashboard_counters and the triggers maintaining it"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS dashboard_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            book_count INTEGER NOT NULL DEFAULT 0,
+            price_count INTEGER NOT NULL DEFAULT 0,
+            price_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            unread_count INTEGER NOT NULL DEFAULT 0
+        )''',
+        'INSERT OR IGNORE INTO dashboard_counters (id) VALUES (1)',
+        f'''CREATE TRIGGER IF NOT EXISTS books_counters_insert AFTER INSERT ON books
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(BOOK_COUNTERS, add='NEW')} WHERE id = 1;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS books_counters_delete AFTER DELETE ON books
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(BOOK_COUNTERS, remove='OLD')} WHERE id = 1;
+        END''',
+        # Snapshots that leave price and rating as they were skip the update.
+        f'''CREATE TRIGGER IF NOT EXISTS books_counters_update AFTER UPDATE OF current_price, rating ON books
+        WHEN OLD.current_price IS NOT NEW.current_price OR OLD.rating IS NOT NEW.rating
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(BOOK_COUNTERS[1:], add='NEW', remove='OLD')} WHERE id = 1;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS notifications_counters_insert AFTER INSERT ON notifications
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(NOTIFICATION_COUNTERS, add='NEW')} WHERE id = 1;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS notifications_counters_delete AFTER DELETE ON notifications
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(NOTIFICATION_COUNTERS, remove='OLD')} WHERE id = 1;
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS notifications_counters_update AFTER UPDATE OF is_read ON notifications
+        WHEN OLD.is_read IS NOT NEW.is_read
+        BEGIN
+            UPDATE dashboard_counters SET {_counter_changes(NOTIFICATION_COUNTERS, add='NEW', remove='OLD')} WHERE id = 1;
+        END''',
+        rebuild_dashboard_counters,
+    ]
+
+def rebuild_dashboard_counters(conn):
+    """Recompute dashboard_counters from the books and notifications tables"""
+    conn.execute(f'''
+        UPDATE dashboard_counters SET
+            (book_count, price_count, price_sum, rating_count, rating_sum) = (
+                SELECT COUNT(*), COUNT(current_price),
+                       COALESCE(SUM(CAST(round(current_price * {SUM_SCALE}) AS INTEGER)), 0),
+                       COUNT(rating),
+                       COALESCE(SUM(CAST(round(rating * {SUM_SCALE}) AS INTEGER)), 0)
+                FROM books
+            ),
+            unread_count = (SELECT COUNT(*) FROM notifications WHERE is_read = 0)
+        WHERE id = 1
+    ''')
+
+def _average(total, count, places=2):
+    # Exact, rounding halves up: an average of 8.245 shows as 8.25.
+    if not count:
+        return 0
+    units, divisor = 10 ** places, count * SUM_SCALE
+    return (2 * total * units + divisor) // (2 * divisor) / units
+
+def _stats(row):
+    return {
+        'total_books': row['book_count'],
+        'avg_price': _average(row['price_sum'], row['price_count']),
+        'avg_rating': _average(row['rating_sum'], row['rating_count']),
+        'unread_notifications': row['unread_count']
+    }
+
+def dashboard_stats(conn):
+    row = conn.execute('SELECT * FROM dashboard_counters WHERE id = 1').fetchone()
+    return _stats(row)
+
+NOTIFICATION_FROM = 'FROM notifications n JOIN books b ON n.book_id = b.id'
+NOTIFICATION_ORDER = 'ORDER BY n.created_date DESC, n.id DESC LIMIT ?'
+NOTIFICATION_COLUMNS = ['id', 'book_id', 'message', 'notification_type', 'is_read', 'created_date']
+
+def recent_notifications(conn, after_id=None, limit=NOTIFICATIONS_LIMIT):
+    """Newest notifications first, with the book's title and author"""
+    sql = f'SELECT n.*, b.title, b.author {NOTIFICATION_FROM}'
+    params = []
+    if after_id is not None:
+        sql += ' WHERE n.id > ?'
+        params.append(after_id)
+    sql += f' {NOTIFICATION_ORDER}'
+    params.append(limit)
+    return [dict(row) for row in conn.execute(sql, params)]
+
+def _json_object(fields):
+    return 'json_object(' + ', '.join(f"'{key}', {expr}" for key, expr in fields) + ')'
+
+def _json_array(select):
+    # Subquery columns lose their JSON subtype, hence json() around each item.
+    return f'(SELECT json_group_array(json(item)) FROM ({select}))'
+
+def dashboard_data(conn, book_columns, books_limit=None):
+    """Counters, the newest books, watchlists and notifications in one query.
+
+    Books come newest first with `book_columns` and `_added_date` for
+    paging; with `books_limit`, one extra book is returned so the caller
+    can tell whether there is a next page.
+    """
+    book = _json_object([(name, f'b.{name}') for name in book_columns] + [('_added_date', 'b.added_date')])
+    watchlist = _json_object([(name, f'w.{name}') for name in ('id', 'name', 'description', 'created_date')]
+                             + [('book_count', 'COUNT(wb.book_id)')])
+    notification = _json_object([(name, f'n.{name}') for name in NOTIFICATION_COLUMNS]
+                                + [('title', 'b.title'), ('author', 'b.author')])
+    row = conn.execute(f'''
+        SELECT c.*,
+            {_json_array(f"SELECT {book} AS item FROM books b ORDER BY b.added_date DESC, b.id DESC LIMIT ?")} AS books,
+            {_json_array(f"""
+                SELECT {watchlist} AS item
+                FROM watchlists w
+                LEFT JOIN watchlist_books wb ON w.id = wb.watchlist_id
+                GROUP BY w.id
+                ORDER BY w.created_date DESC
+            """)} AS watchlists,
+            {_json_array(f"SELECT {notification} AS item {NOTIFICATION_FROM} {NOTIFICATION_ORDER}")} AS notifications
+        FROM dashboard_counters c
+        WHERE c.id = 1
+    ''', (books_limit + 1 if books_limit else -1, NOTIFICATIONS_LIMIT)).fetchone()
+    return {
+        'stats': _stats(row),
+        'books': json.loads(row['books']),
+        'watchlists': json.loads(row['watchlists']),
+        'notifications': json.loads(row['notifications']),
+    }
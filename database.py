@@ -1,15 +1,146 @@
+import os
+import queue
+import socket
 import sqlite3
+import threading
+import time
 from datetime import datetime
+from flask import current_app, g, has_app_context
+from category_stats import rebuild_category_stats
+from price_rollups import rollup_triggers, rebuild_price_rollups
+from book_search import fts_statements
+from alerts import alert_rules_statements
+from dashboard import dashboard_counter_statements
+from watchlist_analytics import watchlist_analytics_statements
 
 DATABASE_NAME = 'kdp_tracker.db'
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_NAME)
+# Connections are kept per worker process and handed out per request, so the
+# pragmas below only have to be applied once per connection.
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+    'PRAGMA temp_store = MEMORY',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+]
+
+def database_path(database=None):
+    """`database`, else the current app's DATABASE, else DATABASE_NAME (CLIs and scripts)"""
+    if database:
+        return database
+    if has_app_context():
+        return current_app.config['DATABASE']
+    return DATABASE_NAME
+
+def get_db_connection(database=None):
+    conn = sqlite3.connect(database_path(database),
+                           timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Lets compaction.py hand freed pages back with incremental_vacuum. Only
+    # set on a new file: the pragma takes the write lock, and a connection
+    # opening mid-transaction would make other writers fail with "database
+    # is locked". Existing files switch at a full VACUUM.
+    if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = get_db_connection()
+class ConnectionPool:
+    """LIFO pool of SQLite connections owned by a single worker process"""
+
+    def __init__(self, database, size=None):
+        self.database = database
+        self.size = POOL_SIZE if size is None else size
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=max(self.size, 1))
+
+    def acquire(self):
+        if self.size > 0:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return get_db_connection(self.database)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self.size > 0:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+# One pool per database file, so apps built with different DATABASE
+# settings in one process don't hand each other connections.
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+def get_pool(database=None):
+    global _pools, _pools_pid
+    database = database_path(database)
+    with _pools_lock:
+        # Pools inherited across fork() must not be reused: SQLite handles are
+        # not safe to share between processes, so each worker builds its own.
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        if database not in _pools:
+            _pools[database] = ConnectionPool(database)
+        return _pools[database]
+
+def reset_pool():
+    global _pools
+    with _pools_lock:
+        if _pools_pid == os.getpid():
+            for pool in _pools.values():
+                pool.close_all()
+        _pools = {}
+
+def get_db():
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+def init_app(app):
+    app.config.setdefault('DATABASE', DATABASE_NAME)
+    app.teardown_appcontext(close_db)
+
+# Databases this process has already brought up to date.
+_initialized = set()
+
+def init_db(database=None):
+    """Create and migrate the schema; safe to call from every worker"""
+    database = database_path(database)
+    if database in _initialized:
+        return
+    conn = get_db_connection(database)
+    # A database at the latest version needs none of the work below.
+    if get_schema_version(conn) == len(MIGRATIONS):
+        conn.close()
+        _initialized.add(database)
+        return
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -78,8 +209,238 @@ def init_db():
     ''')
     
     conn.commit()
+    migrate(conn)
     conn.close()
+    _initialized.add(database)
+
+# Each entry upgrades the schema by one version; PRAGMA user_version records
+# how many have been applied. Append new migrations, never edit old ones.
+# A step is either SQL or a callable taking the connection (for backfills).
+MIGRATIONS = [
+    # 1: indexes for the dashboard, book detail and notification queries
+    [
+        'CREATE INDEX IF NOT EXISTS idx_price_history_book_date ON price_history (book_id, snapshot_date)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_created_date ON notifications (created_date)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_is_read ON notifications (is_read)',
+        'CREATE INDEX IF NOT EXISTS idx_books_category ON books (category)',
+        'CREATE INDEX IF NOT EXISTS idx_books_added_date ON books (added_date)',
+        'CREATE INDEX IF NOT EXISTS idx_books_current_price ON books (current_price)',
+        'CREATE INDEX IF NOT EXISTS idx_books_rating ON books (rating)',
+        'CREATE INDEX IF NOT EXISTS idx_watchlist_books_watchlist_added ON watchlist_books (watchlist_id, added_date)',
+    ],
+    # 2: persistent tier of the Google Books search cache
+    [
+        '''CREATE TABLE IF NOT EXISTS search_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )''',
+    ],
+    # 3: a counter bumped on every write to books, used for catalog ETags
+    [
+        '''CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )''',
+        'INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)',
+        '''CREATE TRIGGER IF NOT EXISTS books_version_insert AFTER INSERT ON books
+        BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS books_version_update AFTER UPDATE ON books
+        BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS books_version_delete AFTER DELETE ON books
+        BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END''',
+        'CREATE INDEX IF NOT EXISTS idx_books_last_updated ON books (last_updated)',
+    ],
+    # 4: normalized categories and per-category aggregates for pricing suggestions
+    [
+        '''CREATE TABLE IF NOT EXISTS book_categories (
+            category TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            PRIMARY KEY (category, book_id)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_book_categories_book ON book_categories (book_id)',
+        '''CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            book_count INTEGER NOT NULL,
+            price_count INTEGER NOT NULL, price_sum REAL NOT NULL, price_sumsq REAL NOT NULL,
+            price_min REAL, price_max REAL,
+            rating_count INTEGER NOT NULL, rating_sum REAL NOT NULL, rating_sumsq REAL NOT NULL,
+            rating_min REAL, rating_max REAL,
+            pages_count INTEGER NOT NULL, pages_sum REAL NOT NULL, pages_sumsq REAL NOT NULL,
+            pages_min REAL, pages_max REAL
+        )''',
+        rebuild_category_stats,
+    ],
+    # 5: nightly catalog-wide pricing suggestions
+    [
+        '''CREATE TABLE IF NOT EXISTS pricing_suggestions (
+            book_id INTEGER PRIMARY KEY,
+            suggested_price REAL NOT NULL,
+            min_price REAL NOT NULL,
+            max_price REAL NOT NULL,
+            competitor_count INTEGER NOT NULL,
+            avg_competitor_price REAL,
+            avg_competitor_rating REAL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ],
+    # 6: background export jobs, shared by all worker processes
+    [
+        '''CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            job_key TEXT NOT NULL,
+            format TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            rows_total INTEGER,
+            worker_pid INTEGER NOT NULL,
+            file_path TEXT,
+            filename TEXT,
+            mimetype TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL,
+            expires_at REAL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs (status)',
+        'CREATE INDEX IF NOT EXISTS idx_export_jobs_expires ON export_jobs (expires_at)',
+    ],
+    # 7: daily and weekly price_history rollups for charts
+    [
+        '''CREATE TABLE IF NOT EXISTS price_rollups (
+            book_id INTEGER NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            first_price REAL,
+            first_at TIMESTAMP NOT NULL,
+            last_price REAL,
+            last_at TIMESTAMP NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            rating_sum REAL,
+            rating_count INTEGER NOT NULL,
+            max_reviews INTEGER,
+            PRIMARY KEY (book_id, resolution, bucket)
+        ) WITHOUT ROWID''',
+        *rollup_triggers(),
+        rebuild_price_rollups,
+    ],
+    # 8: fitted price/rating trends, dropped when a book gets a new snapshot
+    [
+        '''CREATE TABLE IF NOT EXISTS price_trends (
+            book_id INTEGER PRIMARY KEY,
+            last_snapshot_id INTEGER NOT NULL,
+            anchor_day REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            price_slope REAL,
+            price_level REAL,
+            rating_slope REAL,
+            rating_level REAL,
+            fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS price_history_trend_stale AFTER INSERT ON price_history
+        BEGIN
+            DELETE FROM price_trends WHERE book_id = NEW.book_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS books_delete_trend AFTER DELETE ON books
+        BEGIN
+            DELETE FROM price_trends WHERE book_id = OLD.id;
+        END''',
+    ],
+    # 9: full-text search index over the catalog
+    fts_statements(),
+    # 10: per-book, per-watchlist and catalog-wide alert rules
+    alert_rules_statements(),
+    # 11: dashboard counters kept current by triggers
+    dashboard_counter_statements(),
+    # 12: ISBNs waiting for enrichment from Google Books, with their outcome
+    [
+        '''CREATE TABLE IF NOT EXISTS enrichment_queue (
+            isbn TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker_pid INTEGER,
+            book_id INTEGER,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            queued_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_enrichment_queue_status ON enrichment_queue (status, queued_at)',
+    ],
+    # 13: cached watchlist analytics, cleared when a member changes
+    watchlist_analytics_statements(),
+    # 14: which process runs each background scheduler, and until when
+    [
+        '''CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )''',
+    ],
+]
+
+def claim_lease(conn, name, seconds):
+    """Take or renew the `name` lease for this process; True if it holds it.
+
+    Every worker runs the same schedulers, and only the one holding a job's
+    lease does the work. The holder renews it on each run; if the holder
+    dies, another process takes over once `seconds` have passed.
+    """
+    holder = f'{socket.gethostname()}:{os.getpid()}'
+    now = time.time()
+    cursor = conn.execute('''
+        INSERT INTO scheduler_leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE scheduler_leases.holder = excluded.holder OR scheduler_leases.expires_at < ?
+    ''', (name, holder, now + seconds, now))
+    conn.commit()
+    return cursor.rowcount == 1
+
+def get_catalog_version(conn):
+    """Version counter of the books table and the time of its latest change"""
+    row = conn.execute('''
+        SELECT (SELECT version FROM catalog_version WHERE id = 1) AS version,
+               (SELECT MAX(last_updated) FROM books) AS last_updated
+    ''').fetchone()
+    return row['version'], row['last_updated']
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction"""
+    while True:
+        # BEGIN IMMEDIATE serializes workers that start up at the same time;
+        # the version is re-read under the lock so nothing is applied twice.
+        conn.execute('BEGIN IMMEDIATE')
+        version = get_schema_version(conn)
+        if version >= len(MIGRATIONS):
+            conn.rollback()
+            return version
+        try:
+            for step in MIGRATIONS[version]:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 if __name__ == '__main__':
     init_db()
-    print("Database initialized successfully!")
+    conn = get_db_connection()
+    print(f"Database initialized successfully! (schema version {get_schema_version(conn)})")
+    conn.close()
@@ -0,0 +1,374 @@
+"""Add books to the catalog from a list of ISBNs, looked up on Google Books in bulk.
+
+    python enrich.py isbns.txt            # queue the ISBNs and enrich them
+    python enrich.py                      # finish whatever is still queued
+    python enrich.py --retry-failed       # queue failed ISBNs again, then run
+
+ISBNs wait in the enrichment_queue table. A run claims ROUND_SIZE of them
+at a time and packs them into `isbn:A OR isbn:B OR ...` queries of up to
+MAX_QUERY_TERMS terms, fetched concurrently with the retries and rate
+limit of refresh.py. Volumes are parsed with parse_volume() and upserted
+like a catalog import, WRITE_BATCH_SIZE ISBNs per transaction, and the
+same transaction marks those ISBNs done in the queue: that is the
+checkpoint. ISBNs a run claimed but didn't write go back to pending when
+it stops, or on the next run if its process died.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from catalog_import import IMPORT_COLUMNS, upsert_books, validate_row
+from database import get_db_connection, init_db
+from export_jobs import pid_alive
+from google_books import GOOGLE_BOOKS_API, parse_volume
+from http_client import create_session
+from refresh import (DEFAULT_BACKOFF, DEFAULT_CONCURRENCY, DEFAULT_RATE, DEFAULT_RETRIES, DEFAULT_TIMEOUT,
+                     ISBN_PATTERN, RateLimiter, fetch_volume, percentile, request_json)
+
+# Google Books returns at most 40 volumes per request, so more terms than
+# that can't all be answered; the length cap keeps URLs well short of 2 KB.
+MAX_QUERY_TERMS = 40
+MAX_QUERY_LENGTH = 1000
+ROUND_SIZE = 2000
+WRITE_BATCH_SIZE = 200
+FAILURES_LIMIT = 20
+
+STATUSES = ['pending', 'claimed', 'done', 'not_found', 'failed']
+
+def normalize_isbn(value):
+    """The ISBN without hyphens or spaces, or None if it isn't one"""
+    isbn = str(value).replace('-', '').replace(' ', '').upper()
+    return isbn if ISBN_PATTERN.match(isbn) else None
+
+def enqueue_isbns(conn, values):
+    """Queue ISBNs for enrichment; returns how many were queued and the invalid values.
+
+    ISBNs already done or not found stay as they are, so a list can be
+    submitted again after an interruption; failed ones are retried.
+    """
+    isbns, invalid = {}, []
+    for value in values:
+        isbn = normalize_isbn(value)
+        if isbn is None:
+            invalid.append(value)
+        else:
+            isbns.setdefault(isbn)
+
+    now = time.time()
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT INTO enrichment_queue (isbn, queued_at, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (isbn) DO UPDATE SET
+            status = 'pending', error = NULL, queued_at = excluded.queued_at, updated_at = excluded.updated_at
+        WHERE status = 'failed'
+    ''', [(isbn, now, now) for isbn in isbns])
+    queued = conn.total_changes - before
+    conn.commit()
+    return {'submitted': len(isbns), 'queued': queued, 'invalid': invalid}
+
+def requeue_failed(conn):
+    now = time.time()
+    count = conn.execute('''
+        UPDATE enrichment_queue SET status = 'pending', error = NULL, queued_at = ?, updated_at = ?
+        WHERE status = 'failed'
+    ''', (now, now)).rowcount
+    conn.commit()
+    return count
+
+def enrichment_status(conn):
+    """ISBN counts by status and the latest failures"""
+    counts = dict.fromkeys(STATUSES, 0)
+    for status, count in conn.execute('SELECT status, COUNT(*) FROM enrichment_queue GROUP BY status'):
+        counts[status] = count
+    failures = conn.execute('''
+        SELECT isbn, error, attempts FROM enrichment_queue
+        WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?
+    ''', (FAILURES_LIMIT,)).fetchall()
+    return {'counts': counts, 'recent_failures': [dict(row) for row in failures]}
+
+def release_orphans(conn):
+    """Put ISBNs claimed by processes that have exited back in the queue"""
+    pids = [row[0] for row in conn.execute(
+        "SELECT DISTINCT worker_pid FROM enrichment_queue WHERE status = 'claimed'")]
+    conn.executemany('''
+        UPDATE enrichment_queue SET status = 'pending', worker_pid = NULL
+        WHERE status = 'claimed' AND worker_pid = ?
+    ''', [(pid,) for pid in pids if not pid_alive(pid)])
+    conn.commit()
+
+def _claim(conn, limit):
+    rows = conn.execute('''
+        UPDATE enrichment_queue
+        SET status = 'claimed', worker_pid = ?, attempts = attempts + 1, updated_at = ?
+        WHERE isbn IN (
+            SELECT isbn FROM enrichment_queue WHERE status = 'pending' ORDER BY queued_at LIMIT ?
+        )
+        RETURNING isbn
+    ''', (os.getpid(), time.time(), limit)).fetchall()
+    conn.commit()
+    return [row[0] for row in rows]
+
+def _release(conn, isbns):
+    conn.executemany('''
+        UPDATE enrichment_queue SET status = 'pending', worker_pid = NULL
+        WHERE isbn = ? AND status = 'claimed'
+    ''', [(isbn,) for isbn in isbns])
+    conn.commit()
+
+def pack_queries(isbns, max_terms=MAX_QUERY_TERMS, max_length=MAX_QUERY_LENGTH):
+    """Split ISBNs into groups whose OR-ed `isbn:` query stays within the limits"""
+    group, length = [], 0
+    for isbn in isbns:
+        term = len(f'isbn:{isbn}')
+        if group and (len(group) >= max_terms or length + len(' OR ') + term > max_length):
+            yield group
+            group, length = [], 0
+        length += term + (len(' OR ') if group else 0)
+        group.append(isbn)
+    if group:
+        yield group
+
+def batch_query(isbns):
+    return ' OR '.join(f'isbn:{isbn}' for isbn in isbns)
+
+def fetch_batch(session, limiter, api_url, isbns, **options):
+    """Look up a group of ISBNs with one query.
+
+    Returns ((isbn, volume, error) for each ISBN, number of requests made);
+    volume is None for ISBNs Google doesn't know.
+    """
+    try:
+        data = request_json(session, limiter, api_url,
+                            {'q': batch_query(isbns), 'maxResults': MAX_QUERY_TERMS}, **options)
+    except Exception as e:
+        return [(isbn, None, str(e)) for isbn in isbns], 1
+
+    items = data.get('items') or []
+    found = {}
+    for item in items:
+        for identifier in item.get('volumeInfo', {}).get('industryIdentifiers', []):
+            found.setdefault(identifier.get('identifier', '').upper(), item)
+
+    # A term matching several editions can push other ISBNs past
+    # maxResults; only then is a missing ISBN worth a query of its own.
+    truncated = len(isbns) > 1 and (data.get('totalItems') or 0) > len(items)
+    results, requests_made = [], 1
+    for isbn in isbns:
+        if isbn in found:
+            results.append((isbn, parse_volume(found[isbn]), None))
+        elif truncated:
+            requests_made += 1
+            try:
+                results.append((isbn, fetch_volume(session, limiter, api_url, isbn, **options), None))
+            except Exception as e:
+                results.append((isbn, None, str(e)))
+        else:
+            results.append((isbn, None, None))
+    return results, requests_made
+
+def _book_row(isbn, volume):
+    # Stored under the ISBN that was asked for, whichever one Google lists first.
+    row = {column: volume.get(column) for column in IMPORT_COLUMNS}
+    row.update(isbn=isbn, current_price=volume['price'])
+    return validate_row(row)
+
+def _record(conn, results):
+    """Write fetched books and their queue outcomes in one transaction; returns (inserted, updated)"""
+    rows, outcomes = [], []
+    for isbn, volume, error in results:
+        if volume is not None:
+            try:
+                rows.append(_book_row(isbn, volume))
+                continue
+            except ValueError as e:
+                error = f'Invalid volume: {e}'
+        outcomes.append(('failed' if error else 'not_found', error, isbn))
+
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        inserted, updated, ids = upsert_books(conn, rows)
+        conn.executemany('''
+            UPDATE enrichment_queue
+            SET status = 'done', book_id = ?, error = NULL, worker_pid = NULL, updated_at = ?
+            WHERE isbn = ?
+        ''', [(ids[row[0]], now, row[0]) for row in rows])
+        conn.executemany('''
+            UPDATE enrichment_queue SET status = ?, error = ?, worker_pid = NULL, updated_at = ?
+            WHERE isbn = ?
+        ''', [(status, error, now, isbn) for status, error, isbn in outcomes])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted, updated
+
+def run_enrichment(api_url=GOOGLE_BOOKS_API, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                   retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT,
+                   max_terms=MAX_QUERY_TERMS, stop=None, database=None):
+    """Enrich queued ISBNs until the queue is empty or `stop` is set; returns a report"""
+    conn = get_db_connection(database)
+    session = create_session(pool_size=concurrency)
+    limiter = RateLimiter(rate)
+    options = dict(retries=retries, backoff=backoff, timeout=timeout)
+
+    totals = dict.fromkeys(['isbns', 'found', 'not_found', 'failed', 'inserted', 'updated', 'requests'], 0)
+    errors = {}
+    latencies = []
+    unwritten = set()
+    pending = []
+
+    def fetch(group):
+        fetch_started = time.perf_counter()
+        results, requests_made = fetch_batch(session, limiter, api_url, group, **options)
+        return results, requests_made, time.perf_counter() - fetch_started
+
+    def flush():
+        inserted, updated = _record(conn, pending)
+        totals['inserted'] += inserted
+        totals['updated'] += updated
+        for isbn, volume, error in pending:
+            unwritten.discard(isbn)
+            totals['isbns'] += 1
+            if error:
+                totals['failed'] += 1
+                errors[isbn] = error
+            else:
+                totals['found' if volume else 'not_found'] += 1
+        pending.clear()
+
+    started = time.perf_counter()
+    try:
+        release_orphans(conn)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not (stop and stop.is_set()):
+                claimed = _claim(conn, ROUND_SIZE)
+                if not claimed:
+                    break
+                unwritten.update(claimed)
+                futures = [pool.submit(fetch, group) for group in pack_queries(claimed, max_terms)]
+                for future in as_completed(futures):
+                    results, requests_made, latency = future.result()
+                    totals['requests'] += requests_made
+                    latencies.append(latency)
+                    pending.extend(results)
+                    if len(pending) >= WRITE_BATCH_SIZE:
+                        flush()
+                    if stop and stop.is_set():
+                        for other in futures:
+                            other.cancel()
+                        break
+                if pending:
+                    flush()
+    finally:
+        if unwritten:
+            conn.rollback()
+            _release(conn, unwritten)
+        session.close()
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    totals.update(
+        failed_isbns=errors,
+        released=len(unwritten),
+        elapsed_seconds=round(elapsed, 3),
+        isbns_per_second=round(totals['isbns'] / elapsed, 1) if elapsed else 0.0,
+        latency_ms={
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'max': round(max(latencies, default=0) * 1000, 1)
+        }
+    )
+    return totals
+
+def format_report(report):
+    return (f"Enriched {report['isbns']} ISBNs with {report['requests']} requests in "
+            f"{report['elapsed_seconds']}s ({report['isbns_per_second']} ISBNs/sec): "
+            f"{report['found']} found ({report['inserted']} new, {report['updated']} updated), "
+            f"{report['not_found']} not found, {report['failed']} failed")
+
+_runner = None
+_runner_pid = None
+_runner_lock = threading.Lock()
+_wake = threading.Event()
+
+def start_enrichment(**options):
+    """Run run_enrichment() on a daemon thread, once per worker process.
+
+    If this process already has a run going, it makes one more pass when
+    it finishes, so ISBNs queued meanwhile aren't left waiting.
+    """
+    global _runner, _runner_pid
+
+    def loop():
+        global _runner
+        while True:
+            _wake.clear()
+            try:
+                print(format_report(run_enrichment(**options)))
+            except Exception as e:
+                print(f"Enrichment failed: {e}")
+            with _runner_lock:
+                if not _wake.is_set():
+                    _runner = None
+                    return
+
+    with _runner_lock:
+        if _runner is not None and _runner_pid == os.getpid():
+            _wake.set()
+            return
+        _runner = threading.Thread(target=loop, name='isbn-enrichment', daemon=True)
+        _runner_pid = os.getpid()
+        _runner.start()
+
+def enrichment_running():
+    return _runner is not None and _runner_pid == os.getpid()
+
+def read_isbns(lines):
+    """ISBNs from text with one or more per line, separated by whitespace or commas"""
+    for line in lines:
+        yield from line.replace(',', ' ').split()
+
+def main():
+    parser = argparse.ArgumentParser(description='Add books to the catalog from a list of ISBNs')
+    parser.add_argument('path', nargs='?', help="file of ISBNs, or - for stdin; without it, resume the queue")
+    parser.add_argument('--retry-failed', action='store_true', help='queue ISBNs that failed before again')
+    parser.add_argument('--api-url', default=GOOGLE_BOOKS_API)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help='maximum requests per second per host (0 for unlimited)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--batch-size', type=int, default=MAX_QUERY_TERMS,
+                        help=f'ISBNs per query (at most {MAX_QUERY_TERMS})')
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_QUERY_TERMS:
+        parser.error(f'--batch-size must be between 1 and {MAX_QUERY_TERMS}')
+
+    init_db()
+    conn = get_db_connection()
+    try:
+        if args.path:
+            with (open(args.path) if args.path != '-' else sys.stdin) as f:
+                queued = enqueue_isbns(conn, read_isbns(f))
+            print(f"Queued {queued['queued']} of {queued['submitted']} ISBNs")
+            for value in queued['invalid']:
+                print(f"  not an ISBN: {value}")
+        if args.retry_failed:
+            print(f"Queued {requeue_failed(conn)} failed ISBNs again")
+    finally:
+        conn.close()
+
+    try:
+        report = run_enrichment(api_url=args.api_url, concurrency=args.concurrency, rate=args.rate,
+                                retries=args.retries, max_terms=args.batch_size)
+    except KeyboardInterrupt:
+        parser.exit(130, "Interrupted; run again to pick up where it stopped\n")
+    print(format_report(report))
+    for isbn, error in report['failed_isbns'].items():
+        print(f"  {isbn}: {error}")
+
+if __name__ == '__main__':
+    main()
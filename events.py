@@ -0,0 +1,219 @@
+"""Server-sent events for the dashboard: new notifications and changed counters.
+
+Each worker process has one EventBus per database. Every /api/events
+connection subscribes with its own bounded buffer. A subscriber that
+falls EVENTS_BUFFER events behind loses its buffer and gets a single
+`resync` event instead, which tells the client to refetch; publishers
+never block on a slow client.
+
+The ChangeFeed compares the database with what it last published and
+publishes the difference: one `notification` event per new notification
+and a `stats` event carrying only the counters that changed. Routes that
+write call notify_changes() so their own changes go out at once. While
+anyone is subscribed, a watcher thread also checks PRAGMA data_version
+every EVENTS_WATCH_INTERVAL seconds, which picks up writes made by other
+workers, refresh.py and the other CLIs. Either way, the cost is a few
+queries per change per process rather than a poll per open dashboard.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from dashboard import dashboard_stats, recent_notifications
+from database import database_path, get_db_connection
+
+EVENTS_BUFFER = int(os.environ.get('EVENTS_BUFFER', 100))
+EVENTS_WATCH_INTERVAL = float(os.environ.get('EVENTS_WATCH_INTERVAL', 0.25))
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+RESYNC = format_event('resync', {})
+
+class Subscription:
+    """A subscriber's buffer of formatted events, at most `maxsize` long"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._events = deque()
+        self._overflowed = False
+        self._ready = threading.Condition()
+
+    def put(self, message):
+        with self._ready:
+            if self._overflowed:
+                self.dropped += 1
+                return
+            if len(self._events) >= self.maxsize:
+                self.dropped += len(self._events) + 1
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(message)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """The next message, RESYNC after an overflow, or None on timeout"""
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._events or self._overflowed, timeout):
+                return None
+            if self._overflowed:
+                self._overflowed = False
+                return RESYNC
+            return self._events.popleft()
+
+class EventBus:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.published = 0
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, maxsize=EVENTS_BUFFER):
+        subscription = Subscription(maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        # Formatted once and shared by every subscriber.
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+class ChangeFeed:
+    """Publishes the difference between the database and what was last published"""
+
+    def __init__(self, bus, database):
+        self.bus = bus
+        self.database = database
+        self._lock = threading.Lock()
+        self._marker = None
+        self._last_notification_id = None
+        self._stats = None
+
+    def _read_marker(self, conn):
+        # Cheap checks that change whenever a counter or the notification list could.
+        return (
+            conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0],
+            conn.execute('SELECT COALESCE(MAX(id), 0) FROM notifications').fetchone()[0],
+            conn.execute('SELECT unread_count FROM dashboard_counters WHERE id = 1').fetchone()[0],
+        )
+
+    def publish_changes(self, conn):
+        with self._lock:
+            self._publish_changes(conn)
+
+    def subscribe(self, conn, maxsize=EVENTS_BUFFER):
+        """A new subscription and the stats it starts from"""
+        with self._lock:
+            # Catch up first, so the new subscriber only gets later changes.
+            self._publish_changes(conn)
+            return self.bus.subscribe(maxsize), dict(self._stats)
+
+    def _publish_changes(self, conn):
+        marker = self._read_marker(conn)
+        if marker == self._marker:
+            return
+        last_id = marker[1]
+        if self._last_notification_id is not None:
+            # Only the newest page; that is all the panel shows.
+            new = recent_notifications(conn, after_id=self._last_notification_id)
+            for notification in reversed(new):
+                self.bus.publish('notification', notification)
+                last_id = max(last_id, notification['id'])
+        stats = dashboard_stats(conn)
+        if self._stats is not None:
+            changed = {key: value for key, value in stats.items() if self._stats.get(key) != value}
+            if changed:
+                self.bus.publish('stats', changed)
+        self._marker = marker
+        self._last_notification_id = last_id
+        self._stats = stats
+
+    def watch(self, interval):
+        """Publish changes every `interval` seconds while anyone is subscribed"""
+        conn = get_db_connection(self.database)
+        data_version = None
+        while True:
+            time.sleep(interval)
+            if not len(self.bus):
+                continue
+            try:
+                # Changes only when another connection commits, and costs no I/O.
+                current = conn.execute('PRAGMA data_version').fetchone()[0]
+                if current == data_version:
+                    continue
+                data_version = current
+                self.publish_changes(conn)
+            except Exception as e:
+                print(f"Event watcher failed: {e}")
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+
+_feeds = {}
+_feed_lock = threading.Lock()
+
+def _current_feed(database):
+    feed = _feeds.get(database)
+    # Like the connection pool, state inherited across fork() is not reused,
+    # and the watcher thread doesn't survive it anyway.
+    return feed if feed is not None and feed.bus.pid == os.getpid() else None
+
+def get_feed(database=None):
+    """This process's feed for `database` (the current app's by default)"""
+    database = database_path(database)
+    feed = _current_feed(database)
+    if feed is None:
+        with _feed_lock:
+            feed = _current_feed(database)
+            if feed is None:
+                feed = _feeds[database] = ChangeFeed(EventBus(), database)
+                threading.Thread(target=feed.watch, args=(EVENTS_WATCH_INTERVAL,),
+                                 name='event-watcher', daemon=True).start()
+    return feed
+
+def subscribe(conn, maxsize=EVENTS_BUFFER):
+    """The current app's bus, a new subscription to it and the current stats"""
+    feed = get_feed()
+    subscription, snapshot = feed.subscribe(conn, maxsize)
+    return feed.bus, subscription, snapshot
+
+def notify_changes(conn):
+    """Publish whatever `conn`'s committed writes changed; a no-op with no subscribers"""
+    feed = _current_feed(database_path())
+    if feed is not None and len(feed.bus):
+        feed.publish_changes(conn)
+
+def stream(bus, subscription, snapshot, heartbeat=HEARTBEAT_SECONDS):
+    """SSE body: the current stats, then events as they arrive.
+
+    Runs after the request's app context is gone, so it unsubscribes from
+    the bus it was given rather than looking the feed up again.
+    """
+    try:
+        yield f'retry: {RETRY_MS}\n'
+        yield format_event('stats', snapshot)
+        while True:
+            message = subscription.get(heartbeat)
+            # Comments keep proxies from timing out and surface closed connections.
+            yield message if message is not None else ': keep-alive\n\n'
+    finally:
+        bus.unsubscribe(subscription)
@@ -0,0 +1,227 @@
+"""Background export jobs.
+
+Job state lives in the export_jobs table rather than in memory, so any
+worker process can answer progress polls and serve the finished file;
+only the process that accepted a job runs it, on a small thread pool.
+Each job records that process's pid, so jobs orphaned by a worker that
+exited are failed instead of being waited on forever.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import database_path, get_pool
+from exports import export_query, iter_csv, encode_stream
+from reports import get_books_report
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'kdp_exports'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_MAX_PENDING = int(os.environ.get('EXPORT_MAX_PENDING', 20))
+EXPORT_RESULT_TTL = int(os.environ.get('EXPORT_RESULT_TTL', 3600))
+
+PROGRESS_INTERVAL = 0.5
+
+EXPORT_PARAMS = ['dataset', 'book_id', 'from', 'to', 'watchlist_id', 'gzip']
+
+class ExportError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+                _executor_pid = os.getpid()
+    return _executor
+
+def normalize_request(data):
+    export_format = data.get('format', 'csv')
+    if export_format not in ('csv', 'pdf'):
+        raise ExportError(f'Unknown format: {export_format}')
+    params = {}
+    if export_format == 'csv':
+        params = {k: str(data[k]) for k in EXPORT_PARAMS if data.get(k) not in (None, '')}
+        params.setdefault('dataset', 'books')
+        try:
+            export_query(params['dataset'], params)
+        except ValueError as e:
+            raise ExportError(str(e))
+    return export_format, params
+
+def _job_dict(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    for private in ('job_key', 'file_path', 'worker_pid'):
+        del job[private]
+    return job
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _in_flight(conn):
+    rows = conn.execute("SELECT * FROM export_jobs WHERE status IN ('queued', 'running')").fetchall()
+    return [row for row in rows if pid_alive(row['worker_pid'])]
+
+def expire_jobs(conn):
+    """Fail orphaned jobs and delete expired ones along with their files"""
+    now = time.time()
+    orphaned = [row['id'] for row in conn.execute(
+        "SELECT id, worker_pid FROM export_jobs WHERE status IN ('queued', 'running')"
+    ).fetchall() if not pid_alive(row['worker_pid'])]
+    conn.executemany('''
+        UPDATE export_jobs
+        SET status = 'failed', error = 'Export worker exited', finished_at = ?, expires_at = ?
+        WHERE id = ?
+    ''', [(now, now + EXPORT_RESULT_TTL, job_id) for job_id in orphaned])
+    conn.commit()
+    rows = conn.execute('SELECT id, file_path FROM export_jobs WHERE expires_at <= ?', (now,)).fetchall()
+    for row in rows:
+        if row['file_path'] and os.path.exists(row['file_path']):
+            os.remove(row['file_path'])
+    if rows:
+        conn.execute('DELETE FROM export_jobs WHERE expires_at <= ?', (now,))
+        conn.commit()
+
+def submit_export(conn, data):
+    """Queue an export, or return the identical one already in flight.
+
+    Returns (job, deduplicated).
+    """
+    export_format, params = normalize_request(data)
+    job_key = json.dumps([export_format, sorted(params.items())])
+
+    expire_jobs(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        in_flight = _in_flight(conn)
+        for row in in_flight:
+            if row['job_key'] == job_key:
+                conn.rollback()
+                return _job_dict(row), True
+
+        if len(in_flight) >= EXPORT_MAX_PENDING:
+            raise ExportError('Too many exports in progress, try again later', status=429)
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute('''
+            INSERT INTO export_jobs (id, job_key, format, params, status, progress, worker_pid,
+                                     created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)
+        ''', (job_id, job_key, export_format, json.dumps(params), os.getpid(), now, now))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # The job runs outside the app context, on this app's database.
+    get_executor().submit(run_export, job_id, export_format, params, database_path())
+    return get_export(conn, job_id), False
+
+def get_export(conn, job_id):
+    row = conn.execute('SELECT * FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+def get_export_file(conn, job_id):
+    row = conn.execute('''
+        SELECT file_path, filename, mimetype FROM export_jobs WHERE id = ? AND status = 'done'
+    ''', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+class _Progress:
+    """Throttled progress writer for one job"""
+
+    def __init__(self, conn, job_id, total):
+        self.conn = conn
+        self.job_id = job_id
+        self.total = total
+        self.done = 0
+        self._last_write = 0.0
+
+    def advance(self, rows):
+        self.done += rows
+        now = time.time()
+        if now - self._last_write >= PROGRESS_INTERVAL:
+            self._last_write = now
+            progress = min(self.done / self.total, 0.99) if self.total else 0.0
+            self.conn.execute('''
+                UPDATE export_jobs SET progress = ?, rows_done = ?, updated_at = ? WHERE id = ?
+            ''', (progress, self.done, now, self.job_id))
+            self.conn.commit()
+
+def run_export(job_id, export_format, params, database=None):
+    pool = get_pool(database)
+    conn = pool.acquire()
+    stamp = datetime.now().strftime('%Y%m%d')
+    path = None
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        if export_format == 'pdf':
+            sql, sql_params = 'SELECT id FROM books', []
+            filename, mimetype = f'kdp_books_{stamp}.pdf', 'application/pdf'
+        else:
+            sql, sql_params = export_query(params['dataset'], params)
+            compress = params.get('gzip', 'false').lower() in ('1', 'true')
+            filename = f"kdp_{params['dataset']}_{stamp}.csv" + ('.gz' if compress else '')
+            mimetype = 'application/gzip' if compress else 'text/csv'
+
+        total = conn.execute(f'SELECT COUNT(*) FROM ({sql})', sql_params).fetchone()[0]
+        conn.execute('''
+            UPDATE export_jobs SET status = 'running', rows_total = ?, updated_at = ? WHERE id = ?
+        ''', (total, time.time(), job_id))
+        conn.commit()
+        progress = _Progress(conn, job_id, total)
+
+        path = os.path.join(EXPORT_DIR, f'{job_id}{os.path.splitext(filename)[1]}')
+        with open(path + '.part', 'wb') as f:
+            if export_format == 'pdf':
+                # The same cached report /api/export/pdf serves; a cache hit
+                # covers every book without reading them again.
+                pdf, _ = get_books_report(conn, on_rows=progress.advance)
+                f.write(pdf)
+                progress.done = total
+            else:
+                rows = iter_csv(sql, sql_params, on_rows=progress.advance, database=database)
+                for chunk in encode_stream(rows, compress):
+                    f.write(chunk)
+        os.replace(path + '.part', path)
+
+        now = time.time()
+        conn.execute('''
+            UPDATE export_jobs
+            SET status = 'done', progress = 1, rows_done = ?, file_path = ?, filename = ?,
+                mimetype = ?, updated_at = ?, finished_at = ?, expires_at = ?
+            WHERE id = ?
+        ''', (progress.done, path, filename, mimetype, now, now, now + EXPORT_RESULT_TTL, job_id))
+        conn.commit()
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        if path and os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        now = time.time()
+        conn.execute('''
+            UPDATE export_jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ?, expires_at = ?
+            WHERE id = ?
+        ''', (str(e), now, now, now + EXPORT_RESULT_TTL, job_id))
+        conn.commit()
+    finally:
+        pool.release(conn)
@@ -0,0 +1,94 @@
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta
+
+from database import get_pool
+
+EXPORT_CHUNK_SIZE = 1000
+
+def export_query(dataset, args):
+    """SQL and parameters for a CSV export dataset, or raise ValueError"""
+    if dataset == 'books':
+        return 'SELECT * FROM books ORDER BY id', []
+
+    if dataset == 'price_history':
+        sql = '''
+            SELECT ph.id, ph.book_id, b.isbn, b.title, ph.price, ph.rating,
+                   ph.reviews_count, ph.snapshot_date
+            FROM price_history ph
+            JOIN books b ON b.id = ph.book_id
+        '''
+        conditions, params = [], []
+        if args.get('book_id'):
+            conditions.append('ph.book_id = ?')
+            params.append(int(args['book_id']))
+        # from/to are inclusive YYYY-MM-DD dates
+        if args.get('from'):
+            conditions.append('ph.snapshot_date >= ?')
+            params.append(datetime.strptime(args['from'], '%Y-%m-%d').strftime('%Y-%m-%d'))
+        if args.get('to'):
+            conditions.append('ph.snapshot_date < ?')
+            end = datetime.strptime(args['to'], '%Y-%m-%d') + timedelta(days=1)
+            params.append(end.strftime('%Y-%m-%d'))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return sql + ' ORDER BY ph.id', params
+
+    if dataset == 'watchlist':
+        if not args.get('watchlist_id'):
+            raise ValueError('watchlist_id is required')
+        return '''
+            SELECT b.*, wb.added_date AS watchlist_added_date
+            FROM watchlist_books wb
+            JOIN books b ON b.id = wb.book_id
+            WHERE wb.watchlist_id = ?
+            ORDER BY wb.id
+        ''', [int(args['watchlist_id'])]
+
+    raise ValueError(f'Unknown dataset: {dataset}')
+
+def iter_csv(sql, params, chunk_size=EXPORT_CHUNK_SIZE, on_rows=None, database=None):
+    """CSV text a chunk of rows at a time.
+
+    Runs on its own pooled connection rather than the request's, since the
+    response body is produced after the view function has returned; the
+    pool is picked now, while the caller's app context is still there.
+    on_rows, if given, is called with the size of each chunk written.
+    """
+    return _iter_csv(get_pool(database), sql, params, chunk_size, on_rows)
+
+def _iter_csv(pool, sql, params, chunk_size, on_rows):
+    conn = pool.acquire()
+    try:
+        cursor = conn.execute(sql, params)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            if on_rows:
+                on_rows(len(rows))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.getvalue():
+            yield buffer.getvalue()
+    finally:
+        pool.release(conn)
+
+def encode_stream(chunks, compress=False):
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,200 @@
+"""Per-book price and rating trends, fitted for the whole catalog at once.
+
+Each book gets an ordinary least-squares line through its recent
+snapshots (the last FORECAST_WINDOW_DAYS before its latest one). The
+sums the closed-form solution needs are accumulated per book with
+np.bincount, so every book is fitted in a handful of array operations
+instead of one model fit per book. Fits are stored in price_trends and a
+trigger on price_history drops a book's fit when a new snapshot arrives,
+so only those books are refitted. A fit is only stored if no snapshot
+newer than the ones it was fitted on arrived in the meantime.
+
+    python forecasting.py          # fit books without a current trend
+    python forecasting.py --all    # refit every book
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+FORECAST_WINDOW_DAYS = int(os.environ.get('FORECAST_WINDOW_DAYS', 90))
+MAX_HORIZON_DAYS = 365
+
+# Stay well under SQLite's host parameter limit when loading books by id.
+LOOKUP_CHUNK_SIZE = 500
+
+def fit_line(groups, x, y, n_groups):
+    """Least-squares slope and level at x = 0 for each group, ignoring NaN y.
+
+    Returns (slope, level, samples); slope is 0 for groups with fewer than
+    two distinct x values and level is NaN for groups with no samples.
+    """
+    mask = ~np.isnan(y)
+    groups, x, y = groups[mask], x[mask], y[mask]
+    samples = np.bincount(groups, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.bincount(groups, x, n_groups) / samples
+        mean_y = np.bincount(groups, y, n_groups) / samples
+        # Centering first keeps the sums well conditioned.
+        dx = x - mean_x[groups]
+        sxx = np.bincount(groups, dx * dx, n_groups)
+        sxy = np.bincount(groups, dx * (y - mean_y[groups]), n_groups)
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+    level = mean_y - slope * mean_x
+    return slope, level, samples
+
+def compute_trends(history):
+    """Trend rows for a frame of id, book_id, price, rating and day (Julian day)"""
+    if history.empty:
+        return pd.DataFrame(columns=['book_id', 'last_snapshot_id', 'anchor_day', 'samples',
+                                     'price_slope', 'price_level', 'rating_slope', 'rating_level'])
+
+    book_ids, groups = np.unique(history['book_id'].to_numpy(), return_inverse=True)
+    day = history['day'].to_numpy(dtype=float)
+    anchor = np.full(len(book_ids), -np.inf)
+    np.maximum.at(anchor, groups, day)
+    last_id = np.zeros(len(book_ids), dtype=np.int64)
+    np.maximum.at(last_id, groups, history['id'].to_numpy(dtype=np.int64))
+
+    recent = day >= anchor[groups] - FORECAST_WINDOW_DAYS
+    groups, x = groups[recent], day[recent] - anchor[groups[recent]]
+    price = history['price'].to_numpy(dtype=float)[recent]
+    rating = history['rating'].to_numpy(dtype=float)[recent]
+
+    price_slope, price_level, samples = fit_line(groups, x, price, len(book_ids))
+    rating_slope, rating_level, _ = fit_line(groups, x, rating, len(book_ids))
+
+    return pd.DataFrame({
+        'book_id': book_ids,
+        'last_snapshot_id': last_id,
+        'anchor_day': anchor,
+        'samples': samples,
+        'price_slope': price_slope,
+        'price_level': price_level,
+        'rating_slope': rating_slope,
+        'rating_level': rating_level
+    })
+
+HISTORY_SQL = '''
+    WITH latest AS (
+        SELECT book_id, datetime(MAX(snapshot_date), '-{window} days') AS since
+        FROM price_history
+        WHERE book_id IN ({books})
+        GROUP BY book_id
+    )
+    SELECT h.id, h.book_id, h.price, h.rating, julianday(h.snapshot_date) AS day
+    FROM latest
+    JOIN price_history h ON h.book_id = latest.book_id AND h.snapshot_date >= latest.since
+'''
+
+HISTORY_COLUMNS = ['id', 'book_id', 'price', 'rating', 'day']
+
+def _read_history(conn, sql, params=()):
+    # Plain tuples are much cheaper to build than sqlite3.Row for large loads.
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return pd.DataFrame.from_records(cursor.execute(sql, params).fetchall(), columns=HISTORY_COLUMNS)
+
+def load_history(conn, book_ids=None, refit=False):
+    """Snapshots inside each book's fitting window.
+
+    Without book_ids, loads every book that needs a fit (all of them when
+    refitting) in one query.
+    """
+    if book_ids is None:
+        books = 'SELECT id FROM books'
+        if not refit:
+            books += ' WHERE id NOT IN (SELECT book_id FROM price_trends)'
+        return _read_history(conn, HISTORY_SQL.format(books=books, window=FORECAST_WINDOW_DAYS))
+
+    frames = [pd.DataFrame(columns=HISTORY_COLUMNS)]
+    for start in range(0, len(book_ids), LOOKUP_CHUNK_SIZE):
+        chunk = book_ids[start:start + LOOKUP_CHUNK_SIZE]
+        sql = HISTORY_SQL.format(books=', '.join('?' * len(chunk)), window=FORECAST_WINDOW_DAYS)
+        frames.append(_read_history(conn, sql, chunk))
+    return pd.concat(frames, ignore_index=True)
+
+def fit_trends(conn, refit=False, book_ids=None):
+    """Fit and store trends for books without a current one; returns a timing report"""
+    started = time.perf_counter()
+    # Snapshots past this id arrived after loading began; books that got one
+    # keep no fit and are picked up by the next run.
+    watermark = conn.execute('SELECT COALESCE(MAX(id), 0) FROM price_history').fetchone()[0]
+    history = load_history(conn, None if book_ids is None else list(book_ids), refit)
+    loaded = time.perf_counter()
+
+    trends = compute_trends(history)
+    computed = time.perf_counter()
+
+    rows = [row + (watermark,) for row in
+            trends.astype(object).where(trends.notna(), None).itertuples(index=False, name=None)]
+    try:
+        if refit:
+            conn.execute('DELETE FROM price_trends')
+        conn.executemany('''
+            INSERT OR REPLACE INTO price_trends (book_id, last_snapshot_id, anchor_day, samples,
+                                                 price_slope, price_level, rating_slope, rating_level)
+            SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8
+            WHERE NOT EXISTS (SELECT 1 FROM price_history WHERE book_id = ?1 AND id > ?9)
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finished = time.perf_counter()
+
+    return {
+        'books': len(trends),
+        'snapshots': len(history),
+        'load_seconds': round(loaded - started, 3),
+        'compute_seconds': round(computed - loaded, 3),
+        'write_seconds': round(finished - computed, 3),
+        'books_per_second': round(len(trends) / (finished - started), 1) if len(trends) else 0.0
+    }
+
+def get_trend(conn, book_id):
+    """The stored trend for a book, fitting it first if it is missing"""
+    row = conn.execute('SELECT * FROM price_trends WHERE book_id = ?', (book_id,)).fetchone()
+    if row is None:
+        fit_trends(conn, book_ids=[book_id])
+        row = conn.execute('SELECT * FROM price_trends WHERE book_id = ?', (book_id,)).fetchone()
+    return dict(row) if row else None
+
+def project(trend, days):
+    """Price and rating `days` after the book's latest snapshot"""
+    price = rating = None
+    if trend['price_level'] is not None:
+        price = round(max(trend['price_level'] + trend['price_slope'] * days, 0.0), 2)
+    if trend['rating_level'] is not None:
+        rating = round(min(max(trend['rating_level'] + trend['rating_slope'] * days, 0.0), 5.0), 2)
+    return price, rating
+
+def forecast(trend, horizon):
+    """Daily forecast points for 1..horizon days after the latest snapshot"""
+    anchor = pd.to_datetime(trend['anchor_day'], unit='D', origin='julian')
+    points = []
+    for days in range(1, horizon + 1):
+        price, rating = project(trend, days)
+        points.append({
+            'date': (anchor + pd.Timedelta(days=days)).strftime('%Y-%m-%d'),
+            'price': price,
+            'rating': rating
+        })
+    return points
+
+if __name__ == '__main__':
+    from database import init_db, get_db_connection
+    parser = argparse.ArgumentParser(description='Fit price and rating trends for tracked books')
+    parser.add_argument('--all', action='store_true', help='refit every book, not just stale ones')
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    report = fit_trends(conn, refit=args.all)
+    conn.close()
+    print(f"Fitted {report['books']} books from {report['snapshots']} snapshots in "
+          f"{report['load_seconds'] + report['compute_seconds'] + report['write_seconds']:.2f}s "
+          f"(load {report['load_seconds']}s, compute {report['compute_seconds']}s, "
+          f"write {report['write_seconds']}s, {report['books_per_second']} books/sec)")
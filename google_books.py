@@ -0,0 +1,78 @@
+import os
+from cache import TTLCache, SQLiteCacheTier
+from http_client import get_json
+
+GOOGLE_BOOKS_API = os.environ.get('GOOGLE_BOOKS_API', "https://www.googleapis.com/books/v1/volumes")
+
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 512))
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 3600))
+SEARCH_CACHE_PERSISTENT = os.environ.get('SEARCH_CACHE_PERSISTENT', 'False').lower() == 'true'
+
+# Parsed results are cached, not raw responses, so a hit skips parsing too.
+search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+persistent_search_cache = SQLiteCacheTier('search_cache', ttl=SEARCH_CACHE_TTL)
+
+def parse_volume(item):
+    """Flatten a Google Books volume into the fields stored on a book"""
+    volume_info = item.get('volumeInfo', {})
+    sale_info = item.get('saleInfo', {})
+    
+    isbn = None
+    if 'industryIdentifiers' in volume_info:
+        for identifier in volume_info['industryIdentifiers']:
+            if identifier['type'] in ['ISBN_13', 'ISBN_10']:
+                isbn = identifier['identifier']
+                break
+    
+    price = None
+    if sale_info.get('saleability') == 'FOR_SALE':
+        price = sale_info.get('listPrice', {}).get('amount')
+    
+    return {
+        'isbn': isbn or item.get('id'),
+        'title': volume_info.get('title', 'Unknown Title'),
+        'author': ', '.join(volume_info.get('authors', ['Unknown Author'])),
+        'price': price,
+        'rating': volume_info.get('averageRating'),
+        'reviews_count': volume_info.get('ratingsCount'),
+        'page_count': volume_info.get('pageCount'),
+        'category': ', '.join(volume_info.get('categories', [])),
+        'publisher': volume_info.get('publisher'),
+        'published_date': volume_info.get('publishedDate'),
+        'description': volume_info.get('description', ''),
+        'thumbnail_url': volume_info.get('imageLinks', {}).get('thumbnail')
+    }
+
+def parse_volumes(books_data):
+    return [parse_volume(item) for item in books_data.get('items', [])]
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+def search_volumes(query, conn=None):
+    """Search Google Books, answering repeated queries from the cache"""
+    key = normalize_query(query)
+    
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+    
+    persistent = SEARCH_CACHE_PERSISTENT and conn is not None
+    if persistent:
+        results = persistent_search_cache.get(conn, key)
+        if results is not None:
+            search_cache.set(key, results)
+            return results
+    
+    params = {'q': key, 'maxResults': 10}
+    results = parse_volumes(get_json(GOOGLE_BOOKS_API, params))
+    search_cache.set(key, results)
+    if persistent:
+        persistent_search_cache.set(conn, key, results)
+    return results
+
+def search_cache_stats():
+    stats = search_cache.stats()
+    if SEARCH_CACHE_PERSISTENT:
+        stats['persistent'] = persistent_search_cache.stats()
+    return stats
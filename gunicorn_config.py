@@ -0,0 +1,36 @@
+"""gunicorn settings for production:
+
+    gunicorn -c gunicorn_config.py main:app
+
+The app is preloaded in the master, so the schema is initialized once and
+workers share the imported code copy-on-write. Nothing that holds a SQLite
+handle may cross fork(): the master closes its pool before forking and
+each worker starts with an empty one.
+
+Not loaded automatically (the dev workflow's --reload can't work with a
+preloaded app); pass it with -c.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Each open /api/events stream occupies a thread for as long as the
+# dashboard stays open, so allow plenty per worker.
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# Stop accepting at capacity, so new streams go to a worker with a free thread.
+worker_connections = threads
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+def pre_fork(server, worker):
+    from database import reset_pool
+    reset_pool()
+    # Move everything loaded so far out of the collector's reach, so its
+    # passes in the workers don't write to (and un-share) those pages.
+    gc.freeze()
+
+def post_fork(server, worker):
+    from database import reset_pool
+    reset_pool()
@@ -0,0 +1,52 @@
+import os
+import threading
+
+from cache import SingleFlight
+
+OUTBOUND_POOL_SIZE = int(os.environ.get('OUTBOUND_POOL_SIZE', 20))
+OUTBOUND_CONNECT_TIMEOUT = float(os.environ.get('OUTBOUND_CONNECT_TIMEOUT', 3.05))
+OUTBOUND_READ_TIMEOUT = float(os.environ.get('OUTBOUND_READ_TIMEOUT', 10))
+
+def create_session(pool_size=None):
+    """A requests.Session that keeps up to `pool_size` connections alive per host"""
+    # requests is only needed once a worker makes its first outbound call.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = pool_size or OUTBOUND_POOL_SIZE
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session, _session_pid
+    # Like the DB pool, sockets inherited across fork() are not reused.
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = create_session()
+                _session_pid = os.getpid()
+    return _session
+
+_flights = SingleFlight()
+
+def get_json(url, params=None, timeout=None):
+    """GET a JSON document over the shared session, coalescing identical requests"""
+    timeout = timeout or (OUTBOUND_CONNECT_TIMEOUT, OUTBOUND_READ_TIMEOUT)
+    key = (url, tuple(sorted((params or {}).items())))
+
+    def fetch():
+        response = get_session().get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return _flights.do(key, fetch)
+
+def outbound_stats():
+    return _flights.stats()
@@ -0,0 +1,185 @@
+"""Daily and weekly rollups of price_history, and downsampling for charts.
+
+price_rollups holds one row per book, resolution and bucket with the
+first/last/min/max price, rating sum and count, and the highest review
+count seen in the bucket. Triggers on price_history keep it current as
+snapshots arrive, so every write path is covered; rebuild_price_rollups()
+recomputes it from scratch. Rollups are left in place when raw snapshots
+are deleted and only go away with the book.
+"""
+from datetime import datetime, timedelta
+
+# Bucket start for a snapshot_date, as a SQL expression over `column`.
+# Weeks start on Monday.
+RESOLUTIONS = {
+    'day': 'date({column})',
+    'week': "date({column}, '-6 days', 'weekday 1')",
+}
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+def rollup_triggers():
+    """CREATE TRIGGER statements that maintain price_rollups"""
+    statements = []
+    for resolution, bucket in RESOLUTIONS.items():
+        bucket = bucket.format(column='NEW.snapshot_date')
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS price_history_rollup_{resolution}
+        AFTER INSERT ON price_history
+        BEGIN
+            INSERT INTO price_rollups (book_id, resolution, bucket, samples,
+                                       first_price, first_at, last_price, last_at,
+                                       min_price, max_price, rating_sum, rating_count, max_reviews)
+            VALUES (NEW.book_id, '{resolution}', {bucket}, 1,
+                    NEW.price, NEW.snapshot_date, NEW.price, NEW.snapshot_date,
+                    NEW.price, NEW.price, NEW.rating, NEW.rating IS NOT NULL, NEW.reviews_count)
+            ON CONFLICT (book_id, resolution, bucket) DO UPDATE SET
+                samples = samples + 1,
+                first_price = CASE WHEN excluded.first_at < first_at THEN excluded.first_price ELSE first_price END,
+                first_at = min(first_at, excluded.first_at),
+                last_price = CASE WHEN excluded.last_at >= last_at THEN excluded.last_price ELSE last_price END,
+                last_at = max(last_at, excluded.last_at),
+                min_price = coalesce(min(min_price, excluded.min_price), min_price, excluded.min_price),
+                max_price = coalesce(max(max_price, excluded.max_price), max_price, excluded.max_price),
+                rating_sum = coalesce(rating_sum + excluded.rating_sum, rating_sum, excluded.rating_sum),
+                rating_count = rating_count + excluded.rating_count,
+                max_reviews = coalesce(max(max_reviews, excluded.max_reviews), max_reviews, excluded.max_reviews);
+        END''')
+    statements.append('''CREATE TRIGGER IF NOT EXISTS books_delete_rollups AFTER DELETE ON books
+        BEGIN
+            DELETE FROM price_rollups WHERE book_id = OLD.id;
+        END''')
+    return statements
+
+def rebuild_price_rollups(conn):
+    """Recompute every rollup from the raw snapshots"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM price_rollups')
+    for resolution, bucket in RESOLUTIONS.items():
+        bucket = bucket.format(column='snapshot_date')
+        cursor.execute(f'''
+            INSERT INTO price_rollups (book_id, resolution, bucket, samples,
+                                       first_price, first_at, last_price, last_at,
+                                       min_price, max_price, rating_sum, rating_count, max_reviews)
+            SELECT book_id, ?, bucket, COUNT(*),
+                   MAX(CASE WHEN first_rank = 1 THEN price END), MIN(snapshot_date),
+                   MAX(CASE WHEN last_rank = 1 THEN price END), MAX(snapshot_date),
+                   MIN(price), MAX(price), SUM(rating), COUNT(rating), MAX(reviews_count)
+            FROM (
+                SELECT book_id, bucket, price, rating, reviews_count, snapshot_date,
+                       ROW_NUMBER() OVER (PARTITION BY book_id, bucket ORDER BY snapshot_date, id) AS first_rank,
+                       ROW_NUMBER() OVER (PARTITION BY book_id, bucket ORDER BY snapshot_date DESC, id DESC) AS last_rank
+                FROM (SELECT *, {bucket} AS bucket FROM price_history)
+            )
+            GROUP BY book_id, bucket
+        ''', (resolution,))
+
+def parse_range(args):
+    """(start, end) snapshot_date bounds for inclusive YYYY-MM-DD from/to; raises ValueError"""
+    start = end = None
+    if args.get('from'):
+        start = datetime.strptime(args['from'], '%Y-%m-%d').strftime('%Y-%m-%d')
+    if args.get('to'):
+        end = (datetime.strptime(args['to'], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return start, end
+
+def _range_sql(column, start, end, start_expr='?'):
+    conditions, params = [], []
+    if start:
+        conditions.append(f'{column} >= {start_expr}')
+        params.append(start)
+    if end:
+        conditions.append(f'{column} < ?')
+        params.append(end)
+    return ''.join(f' AND {c}' for c in conditions), params
+
+def count_points(conn, book_id, resolution, start=None, end=None):
+    if resolution == 'raw':
+        where, params = _range_sql('snapshot_date', start, end)
+        sql = f'SELECT COUNT(*) FROM price_history WHERE book_id = ?{where}'
+        return conn.execute(sql, [book_id] + params).fetchone()[0]
+    where, params = _range_sql('bucket', start, end, RESOLUTIONS[resolution].format(column='?'))
+    sql = f'SELECT COUNT(*) FROM price_rollups WHERE book_id = ? AND resolution = ?{where}'
+    return conn.execute(sql, [book_id, resolution] + params).fetchone()[0]
+
+def fetch_points(conn, book_id, resolution, start=None, end=None):
+    """Chart points in time order.
+
+    Raw snapshots and rollup buckets share snapshot_date, price and rating
+    so either can be plotted the same way; a rollup's price is its closing
+    price and its rating the bucket average.
+    """
+    if resolution == 'raw':
+        where, params = _range_sql('snapshot_date', start, end)
+        rows = conn.execute(f'''
+            SELECT snapshot_date, price, rating, reviews_count
+            FROM price_history
+            WHERE book_id = ?{where}
+            ORDER BY snapshot_date ASC, id ASC
+        ''', [book_id] + params).fetchall()
+        return [dict(row) for row in rows]
+
+    # Include the bucket that contains `start`.
+    where, params = _range_sql('bucket', start, end, RESOLUTIONS[resolution].format(column='?'))
+    rows = conn.execute(f'''
+        SELECT bucket, samples, first_price, last_price, min_price, max_price,
+               rating_sum, rating_count, max_reviews
+        FROM price_rollups
+        WHERE book_id = ? AND resolution = ?{where}
+        ORDER BY bucket ASC
+    ''', [book_id, resolution] + params).fetchall()
+    return [{
+        'snapshot_date': row['bucket'],
+        'price': row['last_price'],
+        'rating': round(row['rating_sum'] / row['rating_count'], 2) if row['rating_count'] else None,
+        'reviews_count': row['max_reviews'],
+        'open': row['first_price'],
+        'high': row['max_price'],
+        'low': row['min_price'],
+        'close': row['last_price'],
+        'samples': row['samples']
+    } for row in rows]
+
+def choose_resolution(conn, book_id, points, start=None, end=None):
+    """The finest resolution with no more than `points` points, else weekly"""
+    for resolution in ('raw', 'day'):
+        if count_points(conn, book_id, resolution, start, end) <= points:
+            return resolution
+    return 'week'
+
+def _timestamp(value):
+    return datetime.fromisoformat(value).timestamp()
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of chart points by price.
+
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    xs = [_timestamp(p['snapshot_date']) for p in points]
+    ys = [p['price'] or 0 for p in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
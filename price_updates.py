@@ -0,0 +1,136 @@
+import math
+
+from alerts import evaluate_alerts
+from category_stats import update_books_stats
+
+# Stay well under SQLite's host parameter limit when looking up books by id.
+LOOKUP_CHUNK_SIZE = 500
+
+def fetch_books(cursor, book_ids):
+    book_ids = list(book_ids)
+    books = {}
+    for start in range(0, len(book_ids), LOOKUP_CHUNK_SIZE):
+        chunk = book_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT id, current_price, rating, reviews_count, page_count, category
+            FROM books WHERE id IN ({placeholders})
+        ''', chunk)
+        for row in cursor.fetchall():
+            books[row['id']] = dict(row)
+    return books
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _invalid(update):
+    """Why an update can't be applied, or None"""
+    if not isinstance(update, dict):
+        return 'Update must be an object'
+    if not _is_id(update.get('book_id')):
+        return 'book_id must be an integer'
+    for field in ('price', 'rating'):
+        value = update.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or not math.isfinite(value)):
+            return f'{field} must be a finite number or null'
+    reviews = update.get('reviews_count')
+    if reviews is not None and not _is_id(reviews):
+        return 'reviews_count must be a whole number or null'
+    return None
+
+def apply_price_updates(conn, updates):
+    """Apply a batch of price/rating snapshots in a single transaction.
+
+    Each update is a dict with book_id, price, rating and reviews_count.
+    Returns one result dict per update, in order; invalid updates and
+    unknown books get an `error` instead and don't stop the rest.
+
+    price_history only stores change points: a snapshot identical to the
+    book's current price, rating and review count still bumps last_updated
+    but adds no history row.
+    """
+    # Books are read and then written; taking the write lock up front keeps
+    # another writer from committing in between, which WAL would refuse.
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    cursor = conn.cursor()
+
+    book_ids = {u['book_id'] for u in updates if _invalid(u) is None}
+    originals = fetch_books(cursor, book_ids)
+    current = {book_id: (row['current_price'], row['rating'], row['reviews_count'])
+               for book_id, row in originals.items()}
+
+    results = []
+    book_rows = []
+    history_rows = []
+    changes = []
+
+    for index, update in enumerate(updates):
+        error = _invalid(update)
+        if error:
+            results.append({'index': index, 'error': error})
+            continue
+
+        book_id = update.get('book_id')
+        if book_id not in current:
+            results.append({'index': index, 'book_id': book_id, 'error': 'Book not found'})
+            continue
+
+        new_price = update.get('price')
+        new_rating = update.get('rating')
+        new_reviews = update.get('reviews_count')
+        old_price, old_rating, old_reviews = current[book_id]
+        changed = (new_price, new_rating, new_reviews) != (old_price, old_rating, old_reviews)
+
+        book_rows.append((new_price, new_rating, new_reviews, book_id))
+        if changed:
+            history_rows.append((book_id, new_price, new_rating, new_reviews))
+            changes.append((len(results), book_id, old_price, new_price,
+                            old_rating, new_rating, old_reviews, new_reviews))
+
+        # Later updates for the same book in this batch compare against this one.
+        current[book_id] = (new_price, new_rating, new_reviews)
+        results.append({
+            'index': index,
+            'book_id': book_id,
+            'success': True,
+            'recorded': changed,
+            'notifications': []
+        })
+
+    try:
+        # Every alert rule is checked against the whole batch at once.
+        notification_rows = []
+        for seq, book_id, notification_type, message in evaluate_alerts(cursor, changes):
+            results[seq]['notifications'].append(notification_type)
+            notification_rows.append((book_id, message, notification_type))
+
+        cursor.executemany('''
+            UPDATE books
+            SET current_price = ?, rating = ?, reviews_count = ?, last_updated = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', book_rows)
+
+        cursor.executemany('''
+            INSERT INTO price_history (book_id, price, rating, reviews_count)
+            VALUES (?, ?, ?, ?)
+        ''', history_rows)
+
+        cursor.executemany('''
+            INSERT INTO notifications (book_id, message, notification_type)
+            VALUES (?, ?, ?)
+        ''', notification_rows)
+
+        update_books_stats(conn, [
+            (book_id, originals[book_id],
+             dict(originals[book_id], current_price=current[book_id][0], rating=current[book_id][1]))
+            for book_id in {row[3] for row in book_rows}
+        ])
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return results
@@ -0,0 +1,129 @@
+"""Catalog-wide pricing suggestions, computed in one vectorized pass.
+
+Applies the same competitor rules as /api/pricing-suggestion/<id>: the
+competitors of a book are the other priced books sharing its first
+category, and its price is nudged by rating and page count relative to
+them. Per-category sums are computed once with a group-by and each book's
+own contribution is subtracted, instead of scanning competitors per book.
+
+    python pricing.py        # recompute and store suggestions for every book
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from category_stats import stat_keys, primary_category
+
+def compute_suggestions(books):
+    """Suggestions for a frame with id, current_price, rating, page_count and category"""
+    books = books.reset_index(drop=True)
+    # All-NULL columns load as object dtype; make the numeric ones float.
+    books = books.astype({'current_price': float, 'rating': float, 'page_count': float})
+    # pandas represents NULL categories as NaN, so normalize before splitting
+    categories = [c if isinstance(c, str) else None for c in books['category']]
+    priced = books['current_price'].notna()
+    rating = books['rating'].where(books['rating'] != 0)
+    pages = books['page_count'].where(books['page_count'] != 0)
+
+    members = pd.DataFrame({
+        'term': [stat_keys(c) for c in categories],
+        'price': books['current_price'],
+        'rating': rating,
+        'pages': pages
+    })[priced].explode('term').dropna(subset=['term'])
+    totals = members.groupby('term').agg(
+        count=('price', 'size'),
+        price_sum=('price', 'sum'),
+        rating_count=('rating', 'count'),
+        rating_sum=('rating', 'sum'),
+        pages_count=('pages', 'count'),
+        pages_sum=('pages', 'sum')
+    )
+
+    primary = [primary_category(c) for c in categories]
+    group = totals.reindex(primary).reset_index(drop=True).fillna(0)
+
+    # Leave the book itself out of its own competitor set.
+    is_member = priced.to_numpy() & np.array([c is not None for c in categories], dtype=bool)
+    own_rating = is_member & rating.notna().to_numpy()
+    own_pages = is_member & pages.notna().to_numpy()
+    count = group['count'].to_numpy() - is_member
+    price_sum = group['price_sum'].to_numpy() - np.where(is_member, books['current_price'].fillna(0), 0)
+    rating_count = group['rating_count'].to_numpy() - own_rating
+    rating_sum = group['rating_sum'].to_numpy() - np.where(own_rating, rating.fillna(0), 0)
+    pages_count = group['pages_count'].to_numpy() - own_pages
+    pages_sum = group['pages_sum'].to_numpy() - np.where(own_pages, pages.fillna(0), 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_price = np.where(count > 0, price_sum / count, np.nan)
+        avg_rating = np.where(rating_count > 0, rating_sum / rating_count, 4.0)
+        avg_pages = np.where(pages_count > 0, pages_sum / pages_count, np.nan)
+
+    book_rating = rating.fillna(0).to_numpy()
+    book_pages = pages.fillna(0).to_numpy()
+
+    suggested = avg_price.copy()
+    suggested *= np.where(book_rating > avg_rating + 0.5, 1.15,
+                          np.where((book_rating > 0) & (book_rating < avg_rating - 0.5), 0.90, 1.0))
+    has_pages = (book_pages > 0) & (pages_count > 0)
+    suggested *= np.where(has_pages & (book_pages > avg_pages * 1.3), 1.1,
+                          np.where(has_pages & (book_pages < avg_pages * 0.7), 0.95, 1.0))
+    suggested = np.clip(suggested, 0.99, 9.99)
+
+    # Without competitors, fall back to the page-count tiers.
+    base_price = np.select([book_pages > 500, book_pages > 300], [9.99, 4.99], 2.99)
+    no_competitors = count <= 0
+    suggested = np.where(no_competitors, base_price, suggested)
+
+    return pd.DataFrame({
+        'book_id': books['id'].to_numpy(),
+        'suggested_price': suggested.round(2),
+        'min_price': (suggested * np.where(no_competitors, 0.8, 0.85)).round(2),
+        'max_price': (suggested * np.where(no_competitors, 1.2, 1.15)).round(2),
+        'competitor_count': np.maximum(count, 0).astype(int),
+        'avg_competitor_price': np.where(no_competitors, np.nan, avg_price).round(2),
+        'avg_competitor_rating': np.where(no_competitors | (rating_count <= 0), np.nan, avg_rating).round(2)
+    })
+
+def reprice_catalog(conn):
+    """Recompute and store a suggestion for every book; returns a timing report"""
+    started = time.perf_counter()
+    books = pd.read_sql_query('SELECT id, current_price, rating, page_count, category FROM books', conn)
+    loaded = time.perf_counter()
+
+    suggestions = compute_suggestions(books)
+    computed = time.perf_counter()
+
+    rows = suggestions.astype(object).where(suggestions.notna(), None).itertuples(index=False, name=None)
+    try:
+        conn.execute('DELETE FROM pricing_suggestions')
+        conn.executemany('''
+            INSERT INTO pricing_suggestions (book_id, suggested_price, min_price, max_price,
+                                             competitor_count, avg_competitor_price, avg_competitor_rating)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finished = time.perf_counter()
+
+    return {
+        'books': len(suggestions),
+        'load_seconds': round(loaded - started, 3),
+        'compute_seconds': round(computed - loaded, 3),
+        'write_seconds': round(finished - computed, 3),
+        'books_per_second': round(len(suggestions) / (finished - started), 1) if len(suggestions) else 0.0
+    }
+
+if __name__ == '__main__':
+    from database import init_db, get_db_connection
+    init_db()
+    conn = get_db_connection()
+    report = reprice_catalog(conn)
+    conn.close()
+    print(f"Repriced {report['books']} books in "
+          f"{report['load_seconds'] + report['compute_seconds'] + report['write_seconds']:.2f}s "
+          f"(load {report['load_seconds']}s, compute {report['compute_seconds']}s, "
+          f"write {report['write_seconds']}s, {report['books_per_second']} books/sec)")
@@ -0,0 +1,227 @@
+"""Re-poll Google Books for every tracked book and record new price snapshots.
+
+    python refresh.py                     # one pass over the catalog
+    python refresh.py --interval 3600     # keep refreshing every hour
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+
+from database import claim_lease, get_db_connection, init_db
+from google_books import GOOGLE_BOOKS_API, parse_volume
+from http_client import create_session
+from price_updates import apply_price_updates
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 10.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 10
+WRITE_BATCH_SIZE = 200
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+ISBN_PATTERN = re.compile(r'^(\d{9}[\dXx]|\d{13})$')
+
+class RateLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def volume_request(api_url, isbn):
+    # search_book stores the Google volume id when a volume has no ISBN.
+    if ISBN_PATTERN.match(isbn):
+        return api_url, {'q': f'isbn:{isbn}', 'maxResults': 1}
+    return f'{api_url}/{isbn}', None
+
+def request_json(session, limiter, url, params=None, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+    """GET `url` and decode the JSON body, retrying connection errors and RETRY_STATUSES"""
+    host = urlsplit(url).netloc
+
+    for attempt in range(retries + 1):
+        limiter.wait(host)
+        delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                break
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = int(retry_after)
+        time.sleep(delay)
+
+    return response.json()
+
+def fetch_volume(session, limiter, api_url, isbn, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+    url, params = volume_request(api_url, isbn)
+    data = request_json(session, limiter, url, params, retries=retries, backoff=backoff, timeout=timeout)
+    if params is None:
+        return parse_volume(data)
+    items = data.get('items') or []
+    return parse_volume(items[0]) if items else None
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def refresh_books(api_url=GOOGLE_BOOKS_API, concurrency=DEFAULT_CONCURRENCY,
+                  rate=DEFAULT_RATE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                  timeout=DEFAULT_TIMEOUT, database=None):
+    """Fetch every tracked book concurrently and record the results.
+
+    Snapshots go through apply_price_updates(), so history rows and
+    notifications match what /api/update-price would produce. Returns a
+    report with throughput and latency percentiles for the run.
+    """
+    conn = get_db_connection(database)
+    books = conn.execute('''
+        SELECT id, isbn, current_price, rating, reviews_count
+        FROM books WHERE isbn IS NOT NULL
+    ''').fetchall()
+
+    session = create_session(pool_size=concurrency)
+    limiter = RateLimiter(rate)
+
+    def fetch(book):
+        started = time.perf_counter()
+        try:
+            volume = fetch_volume(session, limiter, api_url, book['isbn'],
+                                  retries=retries, backoff=backoff, timeout=timeout)
+            error = None if volume else 'Volume not found'
+        except Exception as e:
+            volume, error = None, str(e)
+        return book, volume, error, time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = []
+    errors = {}
+    pending = []
+    updated = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(fetch, book) for book in books]
+        for future in as_completed(futures):
+            book, volume, error, latency = future.result()
+            latencies.append(latency)
+            if error:
+                errors[book['id']] = error
+                continue
+
+            # A missing field means Google did not report it, not that it
+            # changed to nothing, so keep the stored value.
+            pending.append({
+                'book_id': book['id'],
+                'price': volume['price'] if volume['price'] is not None else book['current_price'],
+                'rating': volume['rating'] if volume['rating'] is not None else book['rating'],
+                'reviews_count': volume['reviews_count'] if volume['reviews_count'] is not None
+                                 else book['reviews_count']
+            })
+            if len(pending) >= WRITE_BATCH_SIZE:
+                updated += sum(1 for r in apply_price_updates(conn, pending) if r.get('success'))
+                pending = []
+
+    if pending:
+        updated += sum(1 for r in apply_price_updates(conn, pending) if r.get('success'))
+
+    session.close()
+    conn.close()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'books': len(books),
+        'updated': updated,
+        'failed': len(errors),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'books_per_second': round(len(books) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+            'max': round(max(latencies, default=0) * 1000, 1)
+        }
+    }
+
+def format_report(report):
+    latency = report['latency_ms']
+    return (f"Refreshed {report['updated']}/{report['books']} books "
+            f"({report['failed']} failed) in {report['elapsed_seconds']}s, "
+            f"{report['books_per_second']} books/sec, latency p50={latency['p50']}ms "
+            f"p95={latency['p95']}ms p99={latency['p99']}ms max={latency['max']}ms")
+
+def start_scheduler(interval, database=None, **options):
+    """Run refresh_books() on `database` every `interval` seconds on a daemon thread.
+
+    Every worker starts one; the scheduler lease makes sure only one
+    process in the deployment polls Google Books at a time.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            conn = get_db_connection(database)
+            try:
+                if claim_lease(conn, 'price-refresh', interval * 2):
+                    print(format_report(refresh_books(database=database, **options)))
+            except Exception as e:
+                print(f"Price refresh failed: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='price-refresh', daemon=True)
+    thread.start()
+    return stop
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh tracked book prices from Google Books')
+    parser.add_argument('--api-url', default=GOOGLE_BOOKS_API)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help='maximum requests per second per host (0 for unlimited)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--interval', type=float,
+                        help='keep running, refreshing every INTERVAL seconds')
+    args = parser.parse_args()
+
+    init_db()
+    options = dict(api_url=args.api_url, concurrency=args.concurrency,
+                   rate=args.rate, retries=args.retries)
+    while True:
+        report = refresh_books(**options)
+        print(format_report(report))
+        for book_id, error in report['errors'].items():
+            print(f"  book {book_id}: {error}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Books report PDF rendering, kept apart because reportlab is slow to import."""
+import io
+from datetime import datetime
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+
+# ReportLab lays out and splits one big Table row by row across pages,
+# which is slow and memory hungry for large catalogs; many small tables
+# with their own header flow onto pages much more cheaply.
+ROWS_PER_TABLE = 40
+
+HEADER = ['Title', 'Author', 'Price', 'Rating', 'Category']
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+def report_row(book):
+    return [
+        book['title'][:30],
+        book['author'][:25],
+        f"${book['current_price']:.2f}" if book['current_price'] else 'N/A',
+        f"{book['rating']:.1f}" if book['rating'] else 'N/A',
+        book['category'][:20] if book['category'] else 'N/A'
+    ]
+
+def render_books_report(cursor):
+    """Build the books PDF from a cursor over title, author, price, rating, category"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    elements.append(Paragraph("KDP Books Price Tracker Report", styles['Title']))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Fixed column widths keep the chunks aligned with each other.
+    col_widths = [140, 115, 55, 45, 110]
+    rows = cursor.fetchmany(ROWS_PER_TABLE)
+    while True:
+        table = Table([HEADER] + [report_row(book) for book in rows], colWidths=col_widths)
+        table.setStyle(TABLE_STYLE)
+        elements.append(table)
+        rows = cursor.fetchmany(ROWS_PER_TABLE)
+        if not rows:
+            break
+
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,51 @@
+import os
+
+from cache import TTLCache, SingleFlight
+from database import get_catalog_version
+
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Only the newest few catalog versions are ever requested, so the cache is
+# bounded by total PDF size rather than entry count.
+report_cache = TTLCache(maxsize=16, ttl=24 * 60 * 60, max_bytes=REPORT_CACHE_MAX_BYTES)
+_renders = SingleFlight()
+
+def report_version(conn):
+    version, _ = get_catalog_version(conn)
+    count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    return f'{version}-{count}'
+
+class _CountingCursor:
+    def __init__(self, cursor, on_rows):
+        self.cursor = cursor
+        self.on_rows = on_rows
+
+    def fetchmany(self, size):
+        rows = self.cursor.fetchmany(size)
+        self.on_rows(len(rows))
+        return rows
+
+def get_books_report(conn, on_rows=None):
+    """(pdf_bytes, version) for the current catalog, rendering at most once per version.
+
+    on_rows, if given, is called with the size of each chunk of books read
+    when this call does the rendering.
+    """
+    version = report_version(conn)
+    pdf = report_cache.get(version)
+    if pdf is not None:
+        return pdf, version
+
+    def render():
+        from report_pdf import render_books_report
+        cursor = conn.execute('SELECT title, author, current_price, rating, category FROM books')
+        if on_rows:
+            cursor = _CountingCursor(cursor, on_rows)
+        pdf = render_books_report(cursor)
+        report_cache.set(version, pdf)
+        return pdf
+
+    return _renders.do(version, render), version
+
+def report_cache_stats():
+    return report_cache.stats()
@@ -1,14 +1,42 @@
 let currentChart = null;
 
+// Only the columns a book card renders; the list endpoint omits the rest
+// (descriptions especially) and answers 304 while the catalog is unchanged.
+const BOOK_CARD_FIELDS = 'id,title,author,thumbnail_url,current_price,rating,page_count';
+
+// History charts ask for at most this many points; long histories come back
+// as daily/weekly rollups or downsampled.
+const HISTORY_CHART_POINTS = 300;
+
+// The dashboard filter waits for typing to pause, then fetches the best matches.
+const FILTER_DEBOUNCE_MS = 250;
+const FILTER_RESULTS_LIMIT = 100;
+
+// Matches the server's notification page size.
+const NOTIFICATIONS_SHOWN = 50;
+
+// Watchlists as last listed, by id; opening one only fetches the list when it isn't here.
+let watchlistsById = new Map();
+
+function cacheWatchlists(watchlists) {
+    watchlistsById = new Map(watchlists.map(wl => [wl.id, wl]));
+}
+
+async function getWatchlist(watchlistId) {
+    if (!watchlistsById.has(watchlistId)) {
+        const response = await fetch('/api/watchlists');
+        cacheWatchlists((await response.json()).watchlists);
+    }
+    return watchlistsById.get(watchlistId);
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     initApp();
 });
 
 function initApp() {
-    loadStats();
-    loadBooks();
-    loadWatchlists();
-    loadNotifications();
+    connectEvents();
+    loadDashboard();
     initEventListeners();
     initDarkMode();
     loadSampleBooks();
@@ -90,21 +118,19 @@ async function loadSampleBooks() {
 
     // Check if books already exist
     try {
-        const response = await fetch('/api/books');
+        const response = await fetch('/api/books?limit=1&fields=id');
         const data = await response.json();
 
         if (data.books.length === 0) {
-            // Add sample books
-            for (const book of sampleBooks) {
-                await fetch('/api/add-book', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(book)
-                });
-            }
+            // Add sample books, all in one import request
+            await fetch('/api/import?format=ndjson', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/x-ndjson' },
+                body: sampleBooks.map(({ price, ...book }) => JSON.stringify({ ...book, current_price: price })).join('\n')
+            });
             console.log('Sample books added successfully');
             loadBooks();
-            loadStats();
+            refreshStats();
         }
     } catch (error) {
         console.error('Error loading sample books:', error);
@@ -199,7 +225,7 @@ async function loadStats() {
 
 async function loadBooks() {
     try {
-        const response = await fetch('/api/books');
+        const response = await fetch(`/api/books?fields=${BOOK_CARD_FIELDS}`);
         const data = await response.json();
 
         displayBooks(data.books);
@@ -336,7 +362,7 @@ async function addBook(bookData) {
         if (response.ok) {
             showToast('Book added successfully!', 'success');
             loadBooks();
-            loadStats();
+            refreshStats();
         } else {
             const error = await response.json();
             showToast(error.error || 'Error adding book', 'error');
@@ -349,11 +375,15 @@ async function addBook(bookData) {
 
 async function viewBookDetails(bookId) {
     try {
-        const response = await fetch(`/api/book/${bookId}`);
+        const [response, historyResponse] = await Promise.all([
+            fetch(`/api/book/${bookId}?history=0`),
+            fetch(`/api/book/${bookId}/history?points=${HISTORY_CHART_POINTS}`)
+        ]);
         const data = await response.json();
+        const historyData = await historyResponse.json();
 
         const book = data.book;
-        const history = data.history;
+        const history = historyData.history || [];
 
         const pricingResponse = await fetch(`/api/pricing-suggestion/${bookId}`);
         const pricingData = await pricingResponse.json();
@@ -504,8 +534,8 @@ async function updateBookPrice(bookId) {
             showToast('Price updated successfully!', 'success');
             document.getElementById('bookModal').style.display = 'none';
             loadBooks();
-            loadStats();
-            loadNotifications();
+            refreshStats();
+            refreshNotifications();
         } else {
             showToast('Error updating price', 'error');
         }
@@ -528,6 +558,7 @@ async function loadWatchlists() {
 }
 
 function displayWatchlists(watchlists) {
+    cacheWatchlists(watchlists);
     const container = document.getElementById('watchlistsList');
 
     if (watchlists.length === 0) {
@@ -678,13 +709,16 @@ async function createWatchlist() {
 
 async function viewWatchlist(watchlistId) {
     try {
-        const response = await fetch(`/api/watchlist/${watchlistId}/books`);
+        const [response, analyticsResponse] = await Promise.all([
+            fetch(`/api/watchlist/${watchlistId}/books`),
+            fetch(`/api/watchlist/${watchlistId}/analytics`)
+        ]);
         const data = await response.json();
+        const analytics = analyticsResponse.ok ? await analyticsResponse.json() : null;
+        const movement = new Map((analytics?.books || []).map(book => [book.book_id, book]));
+        const formatChange = pct => pct == null ? '–' : `${pct > 0 ? '+' : ''}${pct.toFixed(1)}%`;
 
-        // Get watchlist info
-        const watchlistsResponse = await fetch('/api/watchlists');
-        const watchlistsData = await watchlistsResponse.json();
-        const watchlist = watchlistsData.watchlists.find(w => w.id === watchlistId);
+        const watchlist = await getWatchlist(watchlistId);
 
         // Calculate statistics
         const totalBooks = data.books.length;
@@ -719,6 +753,16 @@ async function viewWatchlist(watchlistId) {
                             <div class="stat-value">$${totalValue.toFixed(2)}</div>
                             <div class="stat-label">Total Value</div>
                         </div>
+                        ${analytics ? `
+                            <div class="stat-item">
+                                <div class="stat-value">${formatChange(analytics.summary.avg_change_7d_pct)}</div>
+                                <div class="stat-label">Avg 7-Day Change</div>
+                            </div>
+                            <div class="stat-item">
+                                <div class="stat-value">${formatChange(analytics.summary.avg_change_30d_pct)}</div>
+                                <div class="stat-label">Avg 30-Day Change</div>
+                            </div>
+                        ` : ''}
                     </div>
                 </div>
                 
@@ -750,6 +794,8 @@ async function viewWatchlist(watchlistId) {
                                         ${book.rating ? `<span class="rating-tag">⭐ ${book.rating.toFixed(1)}</span>` : ''}
                                         ${book.page_count ? `<span class="meta-item">📄 ${book.page_count} pages</span>` : ''}
                                         ${book.publisher ? `<span class="meta-item">📚 ${book.publisher}</span>` : ''}
+                                        ${movement.get(book.id)?.change_7d_pct != null ? `<span class="meta-item">📈 7d ${formatChange(movement.get(book.id).change_7d_pct)}</span>` : ''}
+                                        ${movement.get(book.id)?.change_30d_pct != null ? `<span class="meta-item">30d ${formatChange(movement.get(book.id).change_30d_pct)}</span>` : ''}
                                     </div>
 
                                     ${book.description ? `
@@ -980,63 +1026,150 @@ function openModal(modalId) {
 
 
 
+// The first paint comes from one request; the sections reload on their own afterwards.
+async function loadDashboard() {
+    const requestId = ++booksRequestId;
+    try {
+        const response = await fetch(`/api/dashboard?fields=${BOOK_CARD_FIELDS}`);
+        const data = await response.json();
+
+        renderStats(data.stats);
+        // Typing in the filter before this arrived already fetched its own list.
+        if (requestId === booksRequestId) renderBooks(data.books, '');
+        renderWatchlists(data.watchlists);
+        notificationItems = data.notifications;
+        renderNotifications();
+    } catch (error) {
+        console.error('Error loading dashboard:', error);
+    }
+}
+
 async function loadStats() {
     try {
         const response = await fetch('/api/stats');
         const data = await response.json();
 
-        document.getElementById('totalBooks').textContent = data.total_books;
-        document.getElementById('avgPrice').textContent = `$${data.avg_price.toFixed(2)}`;
-        document.getElementById('avgRating').textContent = data.avg_rating.toFixed(1);
-        document.getElementById('notificationBadge').textContent = data.unread_notifications;
+        renderStats(data);
     } catch (error) {
         console.error('Error loading stats:', error);
     }
 }
 
+// Updates the counters present in `stats`; stream events only carry the ones that changed.
+function renderStats(stats) {
+    if ('total_books' in stats) document.getElementById('totalBooks').textContent = stats.total_books;
+    if ('avg_price' in stats) document.getElementById('avgPrice').textContent = `$${stats.avg_price.toFixed(2)}`;
+    if ('avg_rating' in stats) document.getElementById('avgRating').textContent = stats.avg_rating.toFixed(1);
+    if ('unread_notifications' in stats) document.getElementById('notificationBadge').textContent = stats.unread_notifications;
+}
+
+// Counters and new notifications are pushed over /api/events instead of
+// being re-fetched after every change; the stream opens with the current
+// stats and reconnects on its own.
+let eventSource = null;
+
+function connectEvents() {
+    if (!window.EventSource) return;
+    eventSource = new EventSource('/api/events');
+    let opened = false;
+    eventSource.addEventListener('open', () => {
+        // Notifications made while disconnected were never pushed.
+        if (opened) loadNotifications();
+        opened = true;
+    });
+    eventSource.addEventListener('stats', (e) => renderStats(JSON.parse(e.data)));
+    eventSource.addEventListener('notification', (e) => {
+        const notification = JSON.parse(e.data);
+        if (notificationItems.some(n => n.id === notification.id)) return;
+        notificationItems = [notification, ...notificationItems].slice(0, NOTIFICATIONS_SHOWN);
+        renderNotifications();
+    });
+    // Sent when this client fell too far behind and events were dropped.
+    eventSource.addEventListener('resync', () => {
+        loadStats();
+        loadNotifications();
+    });
+}
+
+function eventsConnected() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
+
+function refreshStats() {
+    if (!eventsConnected()) loadStats();
+}
+
+function refreshNotifications() {
+    if (!eventsConnected()) loadNotifications();
+}
+
+let booksRequestId = 0;
+let filterTimer = null;
+
 async function loadBooks() {
+    const query = document.getElementById('filterInput')?.value.trim() || '';
+    const requestId = ++booksRequestId;
     try {
-        const response = await fetch('/api/books');
+        const url = query
+            ? `/api/books/search?q=${encodeURIComponent(query)}&fields=${BOOK_CARD_FIELDS}&limit=${FILTER_RESULTS_LIMIT}`
+            : `/api/books?fields=${BOOK_CARD_FIELDS}`;
+        const response = await fetch(url);
         const data = await response.json();
 
-        const booksList = document.getElementById('booksList');
+        // A newer keystroke has already started its own request.
+        if (requestId !== booksRequestId) return;
 
-        if (data.books.length === 0) {
-            booksList.innerHTML = `
-                <div class="empty-state">
-                    <p>📖 No books tracked yet</p>
-                    <p>Start by adding books from the "Add Book" tab</p>
-                </div>
-            `;
+        if (!response.ok) {
+            document.getElementById('booksList').innerHTML = `<div class="empty-state"><p>${data.error}</p></div>`;
             return;
         }
 
-        booksList.innerHTML = data.books.map(book => `
-            <div class="book-card" data-book-id="${book.id}">
-                <div class="book-header">
-                    ${book.thumbnail_url ? `<img src="${book.thumbnail_url}" alt="${book.title}" class="book-thumbnail">` : '<div class="book-thumbnail"></div>'}
-                    <div class="book-info">
-                        <div class="book-title">${book.title}</div>
-                        <div class="book-author">${book.author}</div>
-                    </div>
-                </div>
-                <div class="book-meta">
-                    ${book.current_price ? `<span class="price-tag">$${book.current_price.toFixed(2)}</span>` : ''}
-                    ${book.rating ? `<span class="rating-tag">⭐ ${book.rating.toFixed(1)}</span>` : ''}
-                    ${book.page_count ? `<span class="meta-item">${book.page_count} pages</span>` : ''}
-                </div>
-                <div class="book-actions">
-                    <button class="btn btn-primary btn-sm" onclick="event.stopPropagation(); getPricingSuggestion(${book.id})">💡 Price Suggestion</button>
-                    <button class="btn btn-success btn-sm" onclick="event.stopPropagation(); showAddToWatchlistModal(${book.id}, '${book.title.replace(/'/g, "\\'")}')">📋 Add to Watchlist</button>
-                    <button class="btn btn-secondary btn-sm" onclick="event.stopPropagation(); deleteBook(${book.id})">🗑️ Delete</button>
-                </div>
-            </div>
-        `).join('');
+        renderBooks(data.books, query);
     } catch (error) {
         console.error('Error loading books:', error);
     }
 }
 
+function renderBooks(books, query) {
+    const booksList = document.getElementById('booksList');
+
+    if (books.length === 0) {
+        booksList.innerHTML = query ? `
+            <div class="empty-state">
+                <p>🔍 No books match "${query}"</p>
+            </div>
+        ` : `
+            <div class="empty-state">
+                <p>📖 No books tracked yet</p>
+                <p>Start by adding books from the "Add Book" tab</p>
+            </div>
+        `;
+        return;
+    }
+
+    booksList.innerHTML = books.map(book => `
+        <div class="book-card" data-book-id="${book.id}">
+            <div class="book-header">
+                ${book.thumbnail_url ? `<img src="${book.thumbnail_url}" alt="${book.title}" class="book-thumbnail">` : '<div class="book-thumbnail"></div>'}
+                <div class="book-info">
+                    <div class="book-title">${book.title}</div>
+                    <div class="book-author">${book.author}</div>
+                </div>
+            </div>
+            <div class="book-meta">
+                ${book.current_price ? `<span class="price-tag">$${book.current_price.toFixed(2)}</span>` : ''}
+                ${book.rating ? `<span class="rating-tag">⭐ ${book.rating.toFixed(1)}</span>` : ''}
+                ${book.page_count ? `<span class="meta-item">${book.page_count} pages</span>` : ''}
+            </div>
+            <div class="book-actions">
+                <button class="btn btn-primary btn-sm" onclick="event.stopPropagation(); getPricingSuggestion(${book.id})">💡 Price Suggestion</button>
+                <button class="btn btn-success btn-sm" onclick="event.stopPropagation(); showAddToWatchlistModal(${book.id}, '${book.title.replace(/'/g, "\\'")}')">📋 Add to Watchlist</button>
+                <button class="btn btn-secondary btn-sm" onclick="event.stopPropagation(); deleteBook(${book.id})">🗑️ Delete</button>
+            </div>
+        </div>
+    `).join('');
+}
+
 async function searchBooks() {
     const query = document.getElementById('searchInput').value.trim();
 
@@ -1087,13 +1220,8 @@ async function searchBooks() {
 }
 
 function filterBooks() {
-    const filter = document.getElementById('filterInput').value.toLowerCase();
-    const bookCards = document.querySelectorAll('#booksList .book-card');
-
-    bookCards.forEach(card => {
-        const text = card.textContent.toLowerCase();
-        card.style.display = text.includes(filter) ? 'block' : 'none';
-    });
+    clearTimeout(filterTimer);
+    filterTimer = setTimeout(loadBooks, FILTER_DEBOUNCE_MS);
 }
 
 async function calculateProfit() {
@@ -1158,56 +1286,72 @@ async function loadWatchlists() {
         const response = await fetch('/api/watchlists');
         const data = await response.json();
 
-        const watchlistsList = document.getElementById('watchlistsList');
-
-        if (data.watchlists.length === 0) {
-            watchlistsList.innerHTML = '<p>No watchlists yet. Create one to organize your books!</p>';
-            return;
-        }
-
-        watchlistsList.innerHTML = data.watchlists.map(wl => `
-            <div class="book-card" onclick="viewWatchlist(${wl.id})">
-                <h3>${wl.name}</h3>
-                <p>${wl.description || 'No description'}</p>
-                <p><strong>${wl.book_count}</strong> books</p>
-            </div>
-        `).join('');
+        renderWatchlists(data.watchlists);
     } catch (error) {
         console.error('Error loading watchlists:', error);
     }
 }
 
+function renderWatchlists(watchlists) {
+    cacheWatchlists(watchlists);
+    const watchlistsList = document.getElementById('watchlistsList');
+
+    if (watchlists.length === 0) {
+        watchlistsList.innerHTML = '<p>No watchlists yet. Create one to organize your books!</p>';
+        return;
+    }
+
+    watchlistsList.innerHTML = watchlists.map(wl => `
+        <div class="book-card" onclick="viewWatchlist(${wl.id})">
+            <h3>${wl.name}</h3>
+            <p>${wl.description || 'No description'}</p>
+            <p><strong>${wl.book_count}</strong> books</p>
+        </div>
+    `).join('');
+}
+
+let notificationItems = [];
+
 async function loadNotifications() {
     try {
         const response = await fetch('/api/notifications');
         const data = await response.json();
 
-        const notificationList = document.getElementById('notificationList');
-
-        if (data.notifications.length === 0) {
-            notificationList.innerHTML = '<p>No notifications</p>';
-            return;
-        }
-
-        notificationList.innerHTML = data.notifications.map(notif => `
-            <div class="notification-item ${notif.is_read ? 'read' : 'unread'}" onclick="markNotificationRead(${notif.id})">
-                <p><strong>${notif.title}</strong> - ${notif.author}</p>
-                <p>${notif.message}</p>
-                <small>${new Date(notif.created_date).toLocaleDateString()}</small>
-            </div>
-        `).join('');
+        notificationItems = data.notifications;
+        renderNotifications();
     } catch (error) {
         console.error('Error loading notifications:', error);
     }
 }
 
+function renderNotifications() {
+    const notificationList = document.getElementById('notificationList');
+
+    if (notificationItems.length === 0) {
+        notificationList.innerHTML = '<p>No notifications</p>';
+        return;
+    }
+
+    notificationList.innerHTML = notificationItems.map(notif => `
+        <div class="notification-item ${notif.is_read ? 'read' : 'unread'}" onclick="markNotificationRead(${notif.id})">
+            <p><strong>${notif.title}</strong> - ${notif.author}</p>
+            <p>${notif.message}</p>
+            <small>${new Date(notif.created_date).toLocaleDateString()}</small>
+        </div>
+    `).join('');
+}
+
 async function viewBookDetails(bookId) {
     try {
-        const response = await fetch(`/api/book/${bookId}`);
+        const [response, historyResponse] = await Promise.all([
+            fetch(`/api/book/${bookId}?history=0`),
+            fetch(`/api/book/${bookId}/history?points=${HISTORY_CHART_POINTS}`)
+        ]);
         const data = await response.json();
+        const historyData = await historyResponse.json();
 
         const book = data.book;
-        const history = data.history;
+        const history = historyData.history || [];
 
         const modal = document.getElementById('bookModal');
         const details = document.getElementById('bookDetails');
@@ -1406,7 +1550,7 @@ async function confirmApplyPriceSuggestion(bookId, suggestedPrice) {
             showToast('Price updated successfully!', 'success');
             document.getElementById('bookModal').style.display = 'none';
             loadBooks();
-            loadStats();
+            refreshStats();
         } else {
             showToast('Error updating price', 'error');
         }
@@ -1479,7 +1623,7 @@ async function confirmDeleteBook(bookId) {
         await fetch(`/api/book/${bookId}`, { method: 'DELETE' });
         showToast('Book deleted successfully', 'success');
         loadBooks();
-        loadStats();
+        refreshStats();
     } catch (error) {
         console.error('Error deleting book:', error);
         showToast('Error deleting book', 'error');
@@ -1498,13 +1642,16 @@ function cancelDeleteBook(bookId) {
 
 async function viewWatchlist(watchlistId) {
     try {
-        const response = await fetch(`/api/watchlist/${watchlistId}/books`);
+        const [response, analyticsResponse] = await Promise.all([
+            fetch(`/api/watchlist/${watchlistId}/books`),
+            fetch(`/api/watchlist/${watchlistId}/analytics`)
+        ]);
         const data = await response.json();
+        const analytics = analyticsResponse.ok ? await analyticsResponse.json() : null;
+        const movement = new Map((analytics?.books || []).map(book => [book.book_id, book]));
+        const formatChange = pct => pct == null ? '–' : `${pct > 0 ? '+' : ''}${pct.toFixed(1)}%`;
 
-        // Get watchlist info
-        const watchlistsResponse = await fetch('/api/watchlists');
-        const watchlistsData = await watchlistsResponse.json();
-        const watchlist = watchlistsData.watchlists.find(w => w.id === watchlistId);
+        const watchlist = await getWatchlist(watchlistId);
 
         // Calculate statistics
         const totalBooks = data.books.length;
@@ -1539,6 +1686,16 @@ async function viewWatchlist(watchlistId) {
                             <div class="stat-value">$${totalValue.toFixed(2)}</div>
                             <div class="stat-label">Total Value</div>
                         </div>
+                        ${analytics ? `
+                            <div class="stat-item">
+                                <div class="stat-value">${formatChange(analytics.summary.avg_change_7d_pct)}</div>
+                                <div class="stat-label">Avg 7-Day Change</div>
+                            </div>
+                            <div class="stat-item">
+                                <div class="stat-value">${formatChange(analytics.summary.avg_change_30d_pct)}</div>
+                                <div class="stat-label">Avg 30-Day Change</div>
+                            </div>
+                        ` : ''}
                     </div>
                 </div>
                 
@@ -1570,6 +1727,8 @@ async function viewWatchlist(watchlistId) {
                                         ${book.rating ? `<span class="rating-tag">⭐ ${book.rating.toFixed(1)}</span>` : ''}
                                         ${book.page_count ? `<span class="meta-item">📄 ${book.page_count} pages</span>` : ''}
                                         ${book.publisher ? `<span class="meta-item">📚 ${book.publisher}</span>` : ''}
+                                        ${movement.get(book.id)?.change_7d_pct != null ? `<span class="meta-item">📈 7d ${formatChange(movement.get(book.id).change_7d_pct)}</span>` : ''}
+                                        ${movement.get(book.id)?.change_30d_pct != null ? `<span class="meta-item">30d ${formatChange(movement.get(book.id).change_30d_pct)}</span>` : ''}
                                     </div>
 
                                     ${book.description ? `
@@ -1609,7 +1768,7 @@ async function markNotificationRead(notificationId) {
     try {
         await fetch(`/api/notifications/${notificationId}/read`, { method: 'POST' });
         loadNotifications();
-        loadStats();
+        refreshStats();
     } catch (error) {
         console.error('Error marking notification as read:', error);
     }
@@ -1,4 +1,4 @@
-const CACHE_NAME = 'kdp-tracker-v1';
+const CACHE_NAME = 'kdp-tracker-v5';
 const urlsToCache = [
   '/',
   '/static/css/style.css',
@@ -17,6 +17,29 @@ self.addEventListener('install', event => {
 });
 
 self.addEventListener('fetch', event => {
+  const url = new URL(event.request.url);
+
+  // The event stream never ends, so it can't be cached or replayed.
+  if (url.pathname === '/api/events') {
+    return;
+  }
+
+  // API data goes to the network first; the cached copy is only for offline use.
+  if (url.pathname.startsWith('/api/') && event.request.method === 'GET') {
+    event.respondWith(
+      fetch(event.request)
+        .then(response => {
+          if (response.status === 200) {
+            const responseToCache = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(event.request, responseToCache));
+          }
+          return response;
+        })
+        .catch(() => caches.match(event.request))
+    );
+    return;
+  }
+
   event.respondWith(
     caches.match(event.request)
       .then(response => {
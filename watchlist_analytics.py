@@ -0,0 +1,189 @@
+"""Price movement of a watchlist's books, computed from price_history in SQL.
+
+One windowed query over the members' snapshots gives each book its latest
+price, the change since 7 and 30 days ago, its 30-day low and high and
+the volatility of its price steps. The result is cached per watchlist in
+watchlist_analytics until triggers clear it: a new snapshot of a member,
+a member added or removed, or a member renamed or deleted. Changes are
+measured against the clock, so the cache also only lasts for the day.
+"""
+import json
+import math
+import sqlite3
+from datetime import datetime, timedelta
+
+WINDOWS = {'7d': 7, '30d': 30}
+
+def _clear_for_book(book):
+    return f'''DELETE FROM watchlist_analytics
+            WHERE watchlist_id IN (SELECT watchlist_id FROM watchlist_books WHERE book_id = {book});'''
+
+def watchlist_analytics_statements():
+    """Statements that create the analytics cache and the triggers clearing it"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS watchlist_analytics (
+            watchlist_id INTEGER PRIMARY KEY,
+            computed_on DATE NOT NULL,
+            payload TEXT NOT NULL
+        )''',
+        f'''CREATE TRIGGER IF NOT EXISTS price_history_watchlist_analytics AFTER INSERT ON price_history
+        BEGIN
+            {_clear_for_book('NEW.book_id')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS books_delete_watchlist_analytics AFTER DELETE ON books
+        BEGIN
+            {_clear_for_book('OLD.id')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS books_rename_watchlist_analytics AFTER UPDATE OF title, author ON books
+        WHEN OLD.title IS NOT NEW.title OR OLD.author IS NOT NEW.author
+        BEGIN
+            {_clear_for_book('OLD.id')}
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS watchlist_books_insert_analytics AFTER INSERT ON watchlist_books
+        BEGIN
+            DELETE FROM watchlist_analytics WHERE watchlist_id = NEW.watchlist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS watchlist_books_delete_analytics AFTER DELETE ON watchlist_books
+        BEGIN
+            DELETE FROM watchlist_analytics WHERE watchlist_id = OLD.watchlist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS watchlists_delete_analytics AFTER DELETE ON watchlists
+        BEGIN
+            DELETE FROM watchlist_analytics WHERE watchlist_id = OLD.id;
+        END''',
+    ]
+
+def _snapshot_id(condition='', order='DESC'):
+    return f'''(SELECT id FROM price_history
+            WHERE book_id = wb.book_id AND price IS NOT NULL {condition}
+            ORDER BY snapshot_date {order}, id {order} LIMIT 1)'''
+
+# Each member's latest and first snapshot and the last one at or before
+# each cutoff (the baseline a change is measured from) are single seeks
+# on the (book_id, snapshot_date) index. The window pass only reads the
+# last 30 days plus that baseline, whose price was in effect when the
+# window opened, for the low, high and volatility of the price steps.
+MEMBERS_SQL = f'''
+    WITH members AS (
+        SELECT wb.book_id, wb.added_date,
+               {_snapshot_id()} AS latest_id,
+               {_snapshot_id(order='ASC')} AS first_id,
+               {_snapshot_id('AND snapshot_date <= :week')} AS week_id,
+               {_snapshot_id('AND snapshot_date <= :month')} AS month_id
+        FROM watchlist_books wb
+        WHERE wb.watchlist_id = :watchlist
+    ), recent AS (
+        SELECT ph.id, ph.book_id, ph.price, ph.snapshot_date
+        FROM members m
+        JOIN price_history ph ON ph.book_id = m.book_id AND ph.snapshot_date > :month
+        WHERE ph.price IS NOT NULL
+        UNION ALL
+        SELECT ph.id, ph.book_id, ph.price, ph.snapshot_date
+        FROM members m
+        JOIN price_history ph ON ph.id = m.month_id
+    ), steps AS (
+        SELECT book_id, price,
+               price / LAG(price) OVER (PARTITION BY book_id ORDER BY snapshot_date, id) - 1 AS step
+        FROM recent
+    ), movement AS (
+        SELECT book_id, MIN(price) AS min_price, MAX(price) AS max_price,
+               COUNT(step) AS step_count, SUM(step) AS step_sum, SUM(step * step) AS step_sumsq
+        FROM steps
+        GROUP BY book_id
+    )
+    SELECT b.id AS book_id, b.title, b.author,
+           latest.price AS latest_price, latest.snapshot_date AS latest_snapshot,
+           COALESCE(week.price, first.price) AS week_price,
+           COALESCE(month.price, first.price) AS month_price,
+           mv.min_price, mv.max_price, mv.step_count, mv.step_sum, mv.step_sumsq
+    FROM members m
+    JOIN books b ON b.id = m.book_id
+    LEFT JOIN price_history latest ON latest.id = m.latest_id
+    LEFT JOIN price_history first ON first.id = m.first_id
+    LEFT JOIN price_history week ON week.id = m.week_id
+    LEFT JOIN price_history month ON month.id = m.month_id
+    LEFT JOIN movement mv ON mv.book_id = m.book_id
+    ORDER BY m.added_date DESC
+'''
+
+def _change(latest, baseline):
+    if latest is None or baseline is None:
+        return None, None
+    return round(latest - baseline, 2), round((latest / baseline - 1) * 100, 2) if baseline else None
+
+def _volatility(count, total, sumsq):
+    # Standard deviation of the relative price steps, in percent.
+    if not count:
+        return None
+    mean = total / count
+    return round(math.sqrt(max(sumsq / count - mean * mean, 0)) * 100, 2)
+
+def _member(row):
+    # Books tracked for less than a window are measured from their first snapshot.
+    book = {'book_id': row['book_id'], 'title': row['title'], 'author': row['author'],
+            'latest_price': row['latest_price'], 'latest_snapshot': row['latest_snapshot']}
+    book['change_7d'], book['change_7d_pct'] = _change(row['latest_price'], row['week_price'])
+    book['change_30d'], book['change_30d_pct'] = _change(row['latest_price'], row['month_price'])
+    book['min_price_30d'] = row['min_price']
+    book['max_price_30d'] = row['max_price']
+    book['volatility_30d'] = _volatility(row['step_count'], row['step_sum'], row['step_sumsq'])
+    return book
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 2) if values else None
+
+def _summary(books):
+    priced = [book for book in books if book['latest_price'] is not None]
+    return {
+        'book_count': len(books),
+        'priced_count': len(priced),
+        'avg_price': _mean(book['latest_price'] for book in priced),
+        'total_value': round(sum(book['latest_price'] for book in priced), 2),
+        'avg_change_7d_pct': _mean(book['change_7d_pct'] for book in priced),
+        'avg_change_30d_pct': _mean(book['change_30d_pct'] for book in priced),
+        'risers_7d': sum(1 for book in priced if (book['change_7d'] or 0) > 0),
+        'fallers_7d': sum(1 for book in priced if (book['change_7d'] or 0) < 0),
+        'min_price_30d': min((book['min_price_30d'] for book in priced), default=None),
+        'max_price_30d': max((book['max_price_30d'] for book in priced), default=None),
+        'avg_volatility_30d': _mean(book['volatility_30d'] for book in priced),
+    }
+
+def compute_watchlist_analytics(conn, watchlist_id, now=None):
+    """Per-book price movement and the watchlist totals, without the cache"""
+    now = now or datetime.utcnow()
+    cutoffs = {name: (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S') for name, days in WINDOWS.items()}
+    rows = conn.execute(MEMBERS_SQL, {'watchlist': watchlist_id, 'week': cutoffs['7d'],
+                                      'month': cutoffs['30d']}).fetchall()
+    books = [_member(row) for row in rows]
+    return {
+        'watchlist_id': watchlist_id,
+        'computed_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'summary': _summary(books),
+        'books': books,
+    }
+
+def watchlist_analytics(conn, watchlist_id):
+    """Analytics for a watchlist, from the cache unless a member changed since"""
+    row = conn.execute('''
+        SELECT payload FROM watchlist_analytics WHERE watchlist_id = ? AND computed_on = date('now')
+    ''', (watchlist_id,)).fetchone()
+    if row:
+        return json.loads(row['payload'])
+
+    # Computed and stored in one transaction: if a snapshot was written after
+    # the read began, upgrading to a write fails instead of caching stale data.
+    analytics = None
+    conn.execute('BEGIN')
+    try:
+        analytics = compute_watchlist_analytics(conn, watchlist_id)
+        conn.execute('''
+            INSERT OR REPLACE INTO watchlist_analytics (watchlist_id, computed_on, payload)
+            VALUES (?, date('now'), ?)
+        ''', (watchlist_id, json.dumps(analytics)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        if analytics is None or not isinstance(e, sqlite3.OperationalError):
+            raise
+    return analytics
@@ -0,0 +1,120 @@
+"""Adding, removing and moving many watchlist books at once.
+
+Each operation takes a list of book ids and runs in one write
+transaction: members are inserted with INSERT OR IGNORE, so books already
+in the watchlist are counted rather than failing the batch. Counts come
+from the cursor's rowcount, which leaves out rows the watchlist_books
+triggers touch. book_watchlists answers which watchlists hold a set of
+books from the watchlist_books (book_id) index.
+"""
+from price_updates import LOOKUP_CHUNK_SIZE
+
+MAX_BULK_BOOKS = 10000
+
+def parse_book_ids(value):
+    """Unique book ids, in order, from a JSON list or a comma-separated string; raises ValueError"""
+    if isinstance(value, str):
+        try:
+            value = [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise ValueError('book_ids must be integers')
+    if not isinstance(value, list) or not value:
+        raise ValueError('book_ids must be a non-empty list')
+    if any(isinstance(book_id, bool) or not isinstance(book_id, int) for book_id in value):
+        raise ValueError('book_ids must be integers')
+    book_ids = list(dict.fromkeys(value))
+    if len(book_ids) > MAX_BULK_BOOKS:
+        raise ValueError(f'At most {MAX_BULK_BOOKS} book_ids per request')
+    return book_ids
+
+def _chunks(values):
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        yield chunk, ', '.join('?' * len(chunk))
+
+def _existing_books(cursor, book_ids):
+    found = set()
+    for chunk, placeholders in _chunks(book_ids):
+        cursor.execute(f'SELECT id FROM books WHERE id IN ({placeholders})', chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return [book_id for book_id in book_ids if book_id in found]
+
+def _write(conn, operation):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = operation(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+def add_books(conn, watchlist_id, book_ids):
+    """Add books to a watchlist; returns the added, already present and missing counts"""
+    def operation(cursor):
+        existing = _existing_books(cursor, book_ids)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO watchlist_books (watchlist_id, book_id)
+            VALUES (?, ?)
+        ''', [(watchlist_id, book_id) for book_id in existing])
+        added = max(cursor.rowcount, 0)
+        found = set(existing)
+        return {
+            'added': added,
+            'already_in_watchlist': len(existing) - added,
+            'missing': [book_id for book_id in book_ids if book_id not in found],
+        }
+    return _write(conn, operation)
+
+def remove_books(conn, watchlist_id, book_ids):
+    """Remove books from a watchlist; returns the removed and not found counts"""
+    def operation(cursor):
+        cursor.executemany('DELETE FROM watchlist_books WHERE watchlist_id = ? AND book_id = ?',
+                           [(watchlist_id, book_id) for book_id in book_ids])
+        removed = max(cursor.rowcount, 0)
+        return {'removed': removed, 'not_in_watchlist': len(book_ids) - removed}
+    return _write(conn, operation)
+
+def move_books(conn, source_id, target_id, book_ids):
+    """Move books from one watchlist to another.
+
+    Only books in the source move; those the target already holds are just
+    removed from the source. Returns moved, already_in_target and
+    not_in_watchlist counts.
+    """
+    def operation(cursor):
+        added = moved = 0
+        for chunk, placeholders in _chunks(book_ids):
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO watchlist_books (watchlist_id, book_id)
+                SELECT ?, book_id FROM watchlist_books
+                WHERE watchlist_id = ? AND book_id IN ({placeholders})
+            ''', [target_id, source_id] + chunk)
+            added += cursor.rowcount
+            cursor.execute(f'''
+                DELETE FROM watchlist_books
+                WHERE watchlist_id = ? AND book_id IN ({placeholders})
+            ''', [source_id] + chunk)
+            moved += cursor.rowcount
+        return {
+            'moved': moved,
+            'already_in_target': moved - added,
+            'not_in_watchlist': len(book_ids) - moved,
+        }
+    return _write(conn, operation)
+
+def book_watchlists(conn, book_ids):
+    """Map of each book id to the watchlists (id and name) holding it"""
+    memberships = {book_id: [] for book_id in book_ids}
+    cursor = conn.cursor()
+    for chunk, placeholders in _chunks(book_ids):
+        cursor.execute(f'''
+            SELECT wb.book_id, w.id, w.name
+            FROM watchlist_books wb
+            JOIN watchlists w ON w.id = wb.watchlist_id
+            WHERE wb.book_id IN ({placeholders})
+            ORDER BY wb.book_id, w.name
+        ''', chunk)
+        for row in cursor.fetchall():
+            memberships[row['book_id']].append({'id': row['id'], 'name': row['name']})
+    return memberships